@@ -0,0 +1,170 @@
+"""Generated credentials and sample data used by benchmarks."""
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+import datetime
+import os
+
+KEY_PASSWORD = "benchmark"
+
+
+def create_certificate(name, key, issuer_name, issuer_key, ca=False, dns_name=None):
+    """Return (x509.Certificate): certificate for key signed with issuer_key."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    builder = x509.CertificateBuilder() \
+        .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])) \
+        .issuer_name(issuer_name) \
+        .public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()) \
+        .not_valid_before(now - datetime.timedelta(days=1)) \
+        .not_valid_after(now + datetime.timedelta(days=365))
+    if ca:
+        builder = builder \
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), True) \
+            .add_extension(
+                x509.KeyUsage(True, False, False, False, False, True, True, False, False), True) \
+            .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), False)
+    else:
+        builder = builder \
+            .add_extension(
+                x509.KeyUsage(True, True, True, False, False, False, False, False, False), True) \
+            .add_extension(
+                x509.AuthorityKeyIdentifier.from_issuer_public_key(issuer_key.public_key()), False)
+    if dns_name is not None:
+        builder = builder.add_extension(
+            x509.SubjectAlternativeName([x509.DNSName(dns_name)]), False)
+    return builder.sign(issuer_key, hashes.SHA256())
+
+
+def write_key(path, key, password=None):
+    """Write private key to path in pem format (encrypted if password is given)."""
+    if password is None:
+        encryption = serialization.NoEncryption()
+    else:
+        encryption = serialization.BestAvailableEncryption(password.encode("utf-8"))
+    with open(path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, encryption
+        ))
+
+
+def write_certificates(path, *certificates):
+    """Write certificates to path in pem format."""
+    with open(path, "wb") as f:
+        for certificate in certificates:
+            f.write(certificate.public_bytes(serialization.Encoding.PEM))
+
+
+def create_credentials(directory):
+    """
+    Generate keys and certificates needed by benchmarks.
+
+    Files created in directory:
+        key.pem, cert.pem - fiscalization user key (encrypted with KEY_PASSWORD) and certificate
+        ca.pem - CA which issued server certificates (used as client and verifier trust store)
+        server.pem, server.key - TLS certificate and key of stub server (localhost)
+        cis.pem, cis.key - certificate and key used by stub server for signing replies
+
+    returns (dict) paths of created files
+    """
+    paths = {
+        name: os.path.join(directory, name)
+        for name in ("key.pem", "cert.pem", "ca.pem", "server.pem", "server.key", "cis.pem",
+                     "cis.key")
+    }
+    user_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    user_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "fiskpy benchmark")])
+    write_key(paths["key.pem"], user_key, KEY_PASSWORD)
+    write_certificates(
+        paths["cert.pem"], create_certificate("fiskpy benchmark", user_key, user_name, user_key))
+
+    ca_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "fiskpy benchmark CA")])
+    ca = create_certificate("fiskpy benchmark CA", ca_key, ca_name, ca_key, ca=True)
+    write_certificates(paths["ca.pem"], ca)
+
+    server_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    write_key(paths["server.key"], server_key)
+    write_certificates(paths["server.pem"], create_certificate(
+        "localhost", server_key, ca_name, ca_key, dns_name="localhost"))
+
+    cis_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    write_key(paths["cis.key"], cis_key)
+    write_certificates(paths["cis.pem"], create_certificate("fiskalcis", cis_key, ca_name, ca_key))
+    return paths
+
+
+def create_racun(key, pdv=1, pnp=0, naknade=0, ostali_por=0, context=None):
+    """
+    Return (fisk.Racun): racun with given number of Pdv, Pnp, Naknade and OstaliPor items.
+
+    key - path to key file, or loaded key (fisk.utils.PrivateKey)
+    """
+    from fisk.elements import BrRac, Naknada, OstPorez, Porez, Racun
+
+    data = {
+        "Oib": "12345678901",
+        "USustPdv": "true",
+        "DatVrijeme": "26.10.2013T23:50:00",
+        "OznSlijed": "P",
+        "BrRac": BrRac({"BrOznRac": "2", "OznPosPr": "POS2", "OznNapUr": "1"}),
+        "IznosUkupno": "500.00",
+        "NacinPlac": "G",
+        "OibOper": "12345678901",
+        "NakDost": "false"
+    }
+    if pdv:
+        data["Pdv"] = [
+            Porez({"Stopa": "25.00", "Osnovica": "100.00", "Iznos": "25.00"}) for i in range(pdv)]
+    if pnp:
+        data["Pnp"] = [
+            Porez({"Stopa": "3.00", "Osnovica": "100.00", "Iznos": "3.00"}) for i in range(pnp)]
+    if ostali_por:
+        data["OstaliPor"] = [
+            OstPorez({"Naziv": "Porez na potrosnju", "Stopa": "3.00", "Osnovica": "100.00",
+                      "Iznos": "3.00"})
+            for i in range(ostali_por)
+        ]
+    if naknade:
+        data["Naknade"] = [Naknada({"NazivN": "Povratna naknada", "IznosN": "0.50"})
+                           for i in range(naknade)]
+    if context is not None:
+        return Racun(data, context=context)
+    if isinstance(key, str):
+        return Racun(data, key, KEY_PASSWORD)
+    return Racun(data, key)
+
+
+def create_racun_columns(count):
+    """Return (dict): columnar Racun data (column name -> list) of count different racuni."""
+    return {
+        "Oib": ["%011d" % (i % 5000) for i in range(count)],
+        "USustPdv": ["true"] * count,
+        "DatVrijeme": [
+            "%02d.10.2023T10:%02d:%02d" % (i % 28 + 1, i // 60 % 60, i % 60) for i in range(count)],
+        "OznSlijed": ["P"] * count,
+        "BrRac.BrOznRac": [str(i + 1) for i in range(count)],
+        "BrRac.OznPosPr": ["POS%d" % (i % 50) for i in range(count)],
+        "BrRac.OznNapUr": [str(i % 10 + 1) for i in range(count)],
+        "IznosUkupno": ["%d.%02d" % (i % 9999, i % 100) for i in range(count)],
+        "NacinPlac": ["G"] * count,
+        "OibOper": ["12345678901"] * count,
+        "NakDost": ["false"] * count
+    }
+
+
+def create_racun_rows(count):
+    """Return (list): Racun data (dicts with nested BrRac and Pdv dicts) of count racuni."""
+    columns = create_racun_columns(count)
+    rows = []
+    for i in range(count):
+        row = {name: column[i] for name, column in columns.items() if "." not in name}
+        row["BrRac"] = {
+            "BrOznRac": columns["BrRac.BrOznRac"][i],
+            "OznPosPr": columns["BrRac.OznPosPr"][i],
+            "OznNapUr": columns["BrRac.OznNapUr"][i]
+        }
+        row["Pdv"] = [{"Stopa": "25.00", "Osnovica": "100.00", "Iznos": "25.00"}]
+        rows.append(row)
+    return rows
@@ -0,0 +1,441 @@
+"""
+fiskpy benchmark suite.
+
+Usage:
+    python benchmarks/run.py [-o results.json] [-k filter] [--quick] [--compare old.json]
+
+Keys and certificates are generated in temporary directory and requests are sent to local stub
+CIS server, so no real credentials or network access are needed. Results are written as json so
+results of different versions can be compared (--compare).
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+from fixtures import (  # noqa: E402
+    KEY_PASSWORD, create_credentials, create_racun, create_racun_columns, create_racun_rows
+)
+from stub_server import StubCISServer, create_reply  # noqa: E402
+
+benchmarks = []
+
+
+def benchmark(name):
+    """Register decorated function as benchmark. Function gets Environment and returns result."""
+    def register(func):
+        benchmarks.append((name, func))
+        return func
+    return register
+
+
+def percentile(samples, percent):
+    """Return percentile of sorted samples (nearest rank)."""
+    index = max(0, min(len(samples) - 1, int(round(percent / 100.0 * len(samples))) - 1))
+    return samples[index]
+
+
+def measure_time(func, min_time=0.2, repeat=5):
+    """
+    Measure time of func call.
+
+    func is called in batches (batch size is calibrated so batch lasts at least min_time /
+    repeat seconds) and per call time of every batch is recorded.
+
+    returns (dict) timings in seconds per call
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeat:
+            break
+        number *= 2
+    samples = []
+    for r in range(repeat):
+        start = time.perf_counter()
+        for i in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        "unit": "s",
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "ops": 1.0 / statistics.median(samples),
+        "number": number,
+        "repeat": repeat
+    }
+
+
+def measure_latency(func, count, workers=1):
+    """
+    Measure latency of every func call and throughput.
+
+    returns (dict) latency percentiles (in seconds) and throughput (calls per second)
+    """
+    def timed_call(i):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if workers == 1:
+        samples = [timed_call(i) for i in range(count)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            samples = list(executor.map(timed_call, range(count)))
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    return {
+        "unit": "s",
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "p90": percentile(samples, 90),
+        "p99": percentile(samples, 99),
+        "max": samples[-1],
+        "ops": count / elapsed,
+        "count": count,
+        "workers": workers
+    }
+
+
+def measure_import(statement, repeat=10):
+    """
+    Measure time of import statement in fresh python process.
+
+    returns (dict) timings in seconds
+    """
+    code = "import time\nstart = time.perf_counter()\n{}\nprint(time.perf_counter() - start)\n"
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [os.path.dirname(BENCHMARKS_DIR), env.get("PYTHONPATH")]))
+    samples = [
+        float(subprocess.check_output([sys.executable, "-c", code.format(statement)], env=env))
+        for r in range(repeat)
+    ]
+    return {
+        "unit": "s",
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "repeat": repeat
+    }
+
+
+class Environment(object):
+    """Credentials, loaded objects and stub server shared by all benchmarks."""
+
+    def __init__(self, directory, quick=False):
+        from cryptography import x509
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key
+        from fisk.client import FiskSOAPClient
+        from fisk.context import FiskContext
+        from fisk.signer import Signer
+        from fisk.utils import load_private_key
+        from fisk.verifier import Verifier
+
+        self.quick = quick
+        self.paths = create_credentials(directory)
+        self.key = load_private_key(self.paths["key.pem"], KEY_PASSWORD)
+        self.signer = Signer(self.paths["key.pem"], KEY_PASSWORD, self.paths["cert.pem"])
+        self.verifier = Verifier()
+        self.verifier.CAs = self.paths["ca.pem"]
+        with open(self.paths["cis.key"], "rb") as f:
+            cis_key = load_pem_private_key(f.read(), None)
+        with open(self.paths["cis.pem"], "rb") as f:
+            cis_certificate = x509.load_pem_x509_certificate(f.read())
+        self.cis_signer = (cis_key, cis_certificate)
+        self.server = StubCISServer(self.paths["server.pem"], self.paths["server.key"])
+        self.server.start()
+        self.context = FiskContext(
+            self.paths["key.pem"], KEY_PASSWORD, self.paths["cert.pem"],
+            client=FiskSOAPClient(
+                "localhost", str(self.server.port), "/FiskalizacijaServiceTest",
+                verify=self.paths["ca.pem"]
+            ),
+            key=self.key
+        )
+
+    @property
+    def min_time(self):
+        return 0.05 if self.quick else 0.5
+
+    def count(self, count):
+        """Return number of calls for latency benchmark."""
+        return max(10, count // 10) if self.quick else count
+
+    def close(self):
+        self.server.stop()
+
+
+@benchmark("import[fisk]")
+def bench_import(env):
+    """Measure import fisk time (in new process)."""
+    return measure_import("import fisk", 3 if env.quick else 10)
+
+
+@benchmark("import[fisk+elements]")
+def bench_import_elements(env):
+    """Measure import of fisk with element and request classes (in new process)."""
+    return measure_import(
+        "import fisk.elements\nimport fisk.request", 3 if env.quick else 10)
+
+
+def construction_benchmark(pdv, pnp, naknade, ostali_por):
+    """Return benchmark of Racun construction with given number of items."""
+    def run(env):
+        return measure_time(
+            lambda: create_racun(env.key, pdv, pnp, naknade, ostali_por), env.min_time)
+    return run
+
+
+for sizes in ((1, 0, 0, 0), (3, 2, 1, 1), (10, 10, 10, 5), (50, 20, 20, 10)):
+    benchmark("racun_construct[pdv=%d,pnp=%d,naknade=%d,ostali_por=%d]" % sizes)(
+        construction_benchmark(*sizes))
+
+
+@benchmark("zastitni_kod[path]")
+def bench_zastitni_kod_path(env):
+    """Measure ZastKod calculation with key given as path and password."""
+    from fisk.utils import zastitni_kod
+
+    return measure_time(lambda: zastitni_kod(
+        "12345678901", "26.10.2013T23:50:00", "2", "POS2", "1", "500.00",
+        env.paths["key.pem"], KEY_PASSWORD
+    ), env.min_time)
+
+
+@benchmark("zastitni_kod[key]")
+def bench_zastitni_kod_key(env):
+    """Measure ZastKod calculation with already loaded key."""
+    from fisk.utils import zastitni_kod
+
+    return measure_time(lambda: zastitni_kod(
+        "12345678901", "26.10.2013T23:50:00", "2", "POS2", "1", "500.00", env.key
+    ), env.min_time)
+
+
+@benchmark("racun_generate")
+def bench_generate(env):
+    """Measure generation of Racun ElementTree element."""
+    racun = create_racun(env.key, 3, 2, 1, 1)
+    return measure_time(racun.generate, env.min_time)
+
+
+@benchmark("racun_zahtjev_serialize")
+def bench_serialize(env):
+    """Measure serialization of RacunZahtjev SOAP message."""
+    from fisk import FiskSOAPMessage
+    from fisk.request import RacunZahtjev
+
+    zahtjev = RacunZahtjev(create_racun(env.key, 3, 2, 1, 1), env.context)
+    return measure_time(lambda: FiskSOAPMessage.serialize(zahtjev), env.min_time)
+
+
+@benchmark("signer_sign_xml")
+def bench_sign(env):
+    """Measure signing of RacunZahtjev SOAP message."""
+    from fisk import FiskSOAPMessage
+    from fisk.request import RacunZahtjev
+    from lxml import etree as et
+
+    zahtjev = RacunZahtjev(create_racun(env.key, 3, 2, 1, 1), env.context)
+    message = FiskSOAPMessage.serialize(zahtjev)
+    return measure_time(
+        lambda: env.signer.signXML(et.fromstring(message), zahtjev.getElementName()),
+        env.min_time
+    )
+
+
+@benchmark("signer_sign_message[template]")
+def bench_sign_template(env):
+    """Measure signing of RacunZahtjev SOAP message (bytes) with TemplateSigner."""
+    from fisk import FiskSOAPMessage
+    from fisk.request import RacunZahtjev
+    from fisk.signer import TemplateSigner
+
+    signer = TemplateSigner(env.paths["key.pem"], KEY_PASSWORD, env.paths["cert.pem"])
+    zahtjev = RacunZahtjev(create_racun(env.key, 3, 2, 1, 1), env.context)
+    message = FiskSOAPMessage.serialize(zahtjev)
+    return measure_time(
+        lambda: signer.signMessage(message, zahtjev.getElementName()), env.min_time)
+
+
+@benchmark("verifier_verify_xml")
+def bench_verify(env):
+    """Measure verification of signed server reply."""
+    from lxml import etree as et
+
+    reply = create_reply(b"<IdPoruke>benchmark</IdPoruke>", env.cis_signer)
+    return measure_time(lambda: env.verifier.verifiyXML(et.fromstring(reply)), env.min_time)
+
+
+@benchmark("client_decode_response")
+def bench_decode_response(env):
+    """Measure decoding of signed server reply (HTTP body) into FiskResponse."""
+    from fisk.client import FiskSOAPClient
+
+    reply = create_reply(b"<IdPoruke>benchmark</IdPoruke>", env.cis_signer)
+    return measure_time(
+        lambda: FiskSOAPClient.decode_response(200, "OK", "text/xml", reply), env.min_time)
+
+
+@benchmark("racun_zahtjev_execute[sequential]")
+def bench_execute(env):
+    """Measure RacunZahtjev.execute latency (one request at a time)."""
+    from fisk.request import RacunZahtjev
+
+    racun = create_racun(env.key, 3, 2, 1, 1)
+    return measure_latency(lambda: RacunZahtjev(racun, env.context).execute(), env.count(500))
+
+
+@benchmark("racun_zahtjev_execute[workers=8]")
+def bench_execute_concurrent(env):
+    """Measure RacunZahtjev.execute latency and throughput with 8 threads."""
+    from fisk.request import RacunZahtjev
+
+    racun = create_racun(env.key, 3, 2, 1, 1)
+    return measure_latency(
+        lambda: RacunZahtjev(racun, env.context).execute(), env.count(2000), workers=8)
+
+
+@benchmark("schema_validate[rows=10000]")
+def bench_validate_rows(env):
+    """Measure validation of 10000 rows of Racun data (dicts) with SchemaValidator."""
+    from fisk.elements import Racun
+    from fisk.validation import SchemaValidator
+
+    rows = create_racun_rows(10000)
+    validator = SchemaValidator.for_class(Racun)
+    return measure_time(lambda: validator.validate_rows(rows), env.min_time)
+
+
+@benchmark("schema_validate[columns=100000]")
+def bench_validate_columns(env):
+    """Measure validation of 100000 racuni given as columns with SchemaValidator."""
+    from fisk.elements import Racun
+    from fisk.validation import SchemaValidator
+
+    columns = create_racun_columns(100000)
+    validator = SchemaValidator.for_class(Racun)
+    return measure_time(lambda: validator.validate_columns(columns), env.min_time)
+
+
+@benchmark("racun_memory")
+def bench_memory(env):
+    """Measure memory used by one Racun (with Pdv, Pnp and Naknade items)."""
+    count = 200 if env.quick else 2000
+    create_racun(env.key, 3, 2, 1, 0)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        racuni = [create_racun(env.key, 3, 2, 1, 0) for i in range(count)]
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del racuni
+    return {"unit": "B", "median": size / count, "count": count}
+
+
+def get_metadata():
+    """Return (dict): description of environment in which benchmarks were run."""
+    try:
+        revision = subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"], cwd=BENCHMARKS_DIR,
+            stderr=subprocess.DEVNULL
+        ).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "revision": revision,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat()
+    }
+
+
+def format_value(result):
+    """Return median of result formatted for printing."""
+    value = result["median"]
+    if result["unit"] == "B":
+        return "%10.0f B " % value
+    if value < 1e-3:
+        return "%10.2f us" % (value * 1e6)
+    return "%10.3f ms" % (value * 1e3)
+
+
+def compare(old, new):
+    """Print comparison of medians of two results."""
+    print()
+    print("%-55s %13s %13s %8s" % ("benchmark", "old", "new", "new/old"))
+    for name, result in new["results"].items():
+        old_result = old["results"].get(name)
+        if old_result is None:
+            continue
+        print("%-55s %s %s %8.2f" % (
+            name, format_value(old_result), format_value(result),
+            result["median"] / old_result["median"]
+        ))
+
+
+def main(argv=None):
+    """Run benchmarks."""
+    parser = argparse.ArgumentParser(description="fiskpy benchmarks")
+    parser.add_argument("-o", "--output", help="write results to this json file")
+    parser.add_argument("-k", "--filter", help="run only benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="shorter (less precise) run")
+    parser.add_argument("--compare", help="compare results with results in this json file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        env = Environment(directory, args.quick)
+        try:
+            for name, func in benchmarks:
+                if args.filter and args.filter not in name:
+                    continue
+                result = func(env)
+                results[name] = result
+                extra = ""
+                if "p99" in result:
+                    extra = "  p99 %.3f ms  %.0f ops/s" % (result["p99"] * 1e3, result["ops"])
+                print("%-55s %s%s" % (name, format_value(result), extra))
+        finally:
+            env.close()
+
+    output = {"meta": get_metadata(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), output)
+
+
+if __name__ == "__main__":
+    main()
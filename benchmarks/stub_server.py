@@ -0,0 +1,103 @@
+"""Local stub of CIS (fiscalization) server used by benchmarks."""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from lxml import etree as et
+from threading import Thread
+import re
+import ssl
+import time
+
+SOAP_ENVELOPE = (
+    '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+    '<soap:Body>{}</soap:Body></soap:Envelope>'
+)
+RACUN_ODGOVOR = (
+    '<tns:RacunOdgovor xmlns:tns="http://www.apis-it.hr/fin/2012/types/f73" Id="RacunOdgovor">'
+    '<tns:Zaglavlje><tns:IdPoruke>{}</tns:IdPoruke>'
+    '<tns:DatumVrijeme>01.01.2020T10:00:00</tns:DatumVrijeme></tns:Zaglavlje>'
+    '<tns:Jir>11111111-2222-3333-4444-555555555555</tns:Jir></tns:RacunOdgovor>'
+)
+ECHO_ODGOVOR = (
+    '<tns:EchoResponse xmlns:tns="http://www.apis-it.hr/fin/2012/types/f73">{}'
+    '</tns:EchoResponse>'
+)
+
+
+def create_reply(body, signer=None):
+    """
+    Return (bytes): stub CIS reply to request body.
+
+    signer - (key, certificate) used to sign RacunOdgovor. If None reply is not signed
+    """
+    match = re.search(rb"IdPoruke>([^<]*)<", body)
+    if match is None:
+        match = re.search(rb"EchoRequest[^>]*>([^<]*)<", body)
+        return SOAP_ENVELOPE.format(
+            ECHO_ODGOVOR.format(match.group(1).decode("utf-8") if match else "")).encode("utf-8")
+    reply = SOAP_ENVELOPE.format(RACUN_ODGOVOR.format(match.group(1).decode("utf-8")))
+    if signer is None:
+        return reply.encode("utf-8")
+    return sign_reply(reply.encode("utf-8"), *signer)
+
+
+def sign_reply(reply, key, certificate):
+    """Return (bytes): reply with RacunOdgovor signed with key."""
+    from signxml import XMLSigner
+
+    root = et.fromstring(reply)
+    element = root.find(".//{http://www.apis-it.hr/fin/2012/types/f73}RacunOdgovor")
+    et.SubElement(element, "{http://www.w3.org/2000/09/xmldsig#}Signature", Id="placeholder")
+    signed = XMLSigner(c14n_algorithm="http://www.w3.org/2001/10/xml-exc-c14n#").sign(
+        root, key=key, cert=[certificate], reference_uri="#RacunOdgovor")
+    return et.tostring(signed)
+
+
+class StubCISHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        reply = create_reply(body, self.server.signer)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubCISServer(object):
+    """HTTPS server (on localhost, random port) which replies to fiscalization requests."""
+
+    def __init__(self, certfile, keyfile, signer=None, delay=0):
+        """
+        Initialize.
+
+        certfile, keyfile - TLS certificate and key of server
+        signer - (key, certificate) used to sign replies. If None replies are not signed
+        delay - time (in seconds) server waits before sending reply (simulated latency)
+        """
+        self.server = ThreadingHTTPServer(("localhost", 0), StubCISHandler)
+        self.server.daemon_threads = True
+        self.server.signer = signer
+        self.server.delay = delay
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def start(self):
+        """Start server in background thread."""
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop server."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
@@ -1,7 +1,60 @@
-from fisk.client import FiskSOAPClientDemo, FiskSOAPClientProduction
-from fisk.signer import Signer
-from fisk.verifier import Verifier
+from fisk.xml import XMLSerializer, XMLSerializerError
 from lxml import etree as et
+import importlib
+
+# classes exported by package which are imported only when they are first used (PEP 562) so
+# crypto (signxml, cryptography, pyOpenSSL) and http (requests) libraries are not loaded by
+# import fisk
+lazy_imports = {
+    "FiskSOAPClient": "fisk.client",
+    "FiskSOAPClientDemo": "fisk.client",
+    "FiskSOAPClientError": "fisk.client",
+    "FiskSOAPClientProduction": "fisk.client",
+    "FiskSOAPClientTimeout": "fisk.client",
+    "FiskSOAPClientUnavailable": "fisk.client",
+    "CircuitBreaker": "fisk.breaker",
+    "Deadline": "fisk.deadline",
+    "DeferredVerifier": "fisk.deferred",
+    "VerificationAudit": "fisk.deferred",
+    "FiskContext": "fisk.context",
+    "Signer": "fisk.signer",
+    "TemplateSigner": "fisk.signer",
+    "Verifier": "fisk.verifier",
+    "FiskResponse": "fisk.response",
+    "Zaglavlje": "fisk.elements",
+    "Adresa": "fisk.elements",
+    "AdresniPodatak": "fisk.elements",
+    "PoslovniProstor": "fisk.elements",
+    "BrRac": "fisk.elements",
+    "Porez": "fisk.elements",
+    "OstPorez": "fisk.elements",
+    "Naknada": "fisk.elements",
+    "Racun": "fisk.elements",
+    "EchoRequest": "fisk.request",
+    "PoslovniProstorZahtjev": "fisk.request",
+    "RacunZahtjev": "fisk.request",
+    "ProvjeraZahtjev": "fisk.request",
+    "SchemaValidator": "fisk.validation",
+}
+# submodules which were imported by package before (fisk.client etc. keep working)
+lazy_modules = ("client", "context", "signer", "verifier")
+
+
+def __getattr__(name):
+    """Import lazily exported class on first access (see lazy_imports)."""
+    if name in lazy_modules:
+        return importlib.import_module("fisk." + name)
+    module = lazy_imports.get(name)
+    if module is None:
+        raise AttributeError("module 'fisk' has no attribute '{}'".format(name))
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """Return module attributes including lazily exported classes."""
+    return sorted(set(globals()) | set(lazy_imports))
 
 
 class FiskInitError(Exception):
@@ -16,14 +69,21 @@ class FiskInit():
     Serve as fisk.py initalizator.
 
     Mainly it should contain all info about environment and credentials
+
+    It holds default fiscalization context (FiskContext) used by Racun and requests when
+    context is not passed to them. Other members are kept for backward compatibility and
+    should be treated as read only.
     """
 
     key_file = None
     password = None
+    cert_file = None
+    production = False
     environment = None
     isset = False
     signer = None
     verifier = None
+    context = None
 
     @staticmethod
     def init(
@@ -40,25 +100,52 @@ class FiskInit():
                 for demo False. Default is False
             demo_skip_signature_verification (boolean): True if you want to skip signature in demo
         """
-        FiskInit.key_file = key_file
-        FiskInit.password = password
+        from fisk.client import FiskSOAPClientDemo, FiskSOAPClientProduction
+        from fisk.context import FiskContext
+        from fisk.signer import Signer
+        from fisk.verifier import Verifier
+
+        verifier = FiskInit.verifier
         if not production and demo_skip_signature_verification:
-            FiskInit.verifier = None
+            verifier = None
         elif demo_skip_signature_verification:
-            FiskInit.verifier = Verifier(production)
-        FiskInit.environment = FiskSOAPClientDemo()
+            verifier = Verifier(production)
+        environment = FiskSOAPClientDemo()
         if (production):
-            FiskInit.environment = FiskSOAPClientProduction()
-        FiskInit.signer = Signer(key_file, password, cert_file)
+            environment = FiskSOAPClientProduction()
+        FiskInit.set_context(FiskContext(
+            key_file, password, cert_file, production, environment,
+            Signer(key_file, password, cert_file), verifier
+        ))
+
+    @staticmethod
+    def set_context(context):
+        """
+        Set default fiscalization context.
+
+        Args:
+            context (FiskContext): context used when context is not passed to Racun or request
+        """
+        FiskInit.context = context
+        FiskInit.key_file = context.key_file
+        FiskInit.password = context.password
+        FiskInit.cert_file = context.cert_file
+        FiskInit.production = context.production
+        FiskInit.environment = context.client
+        FiskInit.signer = context.signer
+        FiskInit.verifier = context.verifier
         FiskInit.isset = True
 
     @staticmethod
     def deinit():
         FiskInit.key_file = None
         FiskInit.password = None
+        FiskInit.cert_file = None
+        FiskInit.production = False
         FiskInit.environment = None
         FiskInit.signer = None
         FiskInit.verifier = None
+        FiskInit.context = None
         FiskInit.isset = False
 
 
@@ -95,3 +182,21 @@ class FiskSOAPMessage():
     def getSOAPMessage(self):
         """Return (ElementTree): reprezentation of SOAPMEssage."""
         return self.message
+
+    @staticmethod
+    def serialize(content):
+        """
+        Return (bytes): SOAP message with content.
+
+        Message is serialized directly to bytes (see XMLSerializer) without building
+        ElementTree. Result is same as et.tostring(FiskSOAPMessage(content).getSOAPMessage())
+        """
+        namespace = "http://schemas.xmlsoap.org/soap/envelope/"
+        try:
+            body = XMLSerializer.serialize(content, namespace)
+        except XMLSerializerError:
+            return et.tostring(FiskSOAPMessage(content).getSOAPMessage())
+        return (
+            b'<ns0:Envelope xmlns:ns0="' + namespace.encode("ascii") + b'"><ns0:Body>' +
+            body + b"</ns0:Body></ns0:Envelope>"
+        )
@@ -0,0 +1,295 @@
+from fisk.breaker import CircuitBreaker
+from fisk.client import FiskSOAPClient, FiskSOAPClientTimeout
+from fisk.deadline import Deadline
+from threading import Lock
+import aiohttp
+import asyncio
+import os
+import ssl
+import time
+
+
+class AsyncFiskSOAPClient(object):
+    """
+    Asyncio version of FiskSOAPClient.
+
+    It uses aiohttp library. Requests are sent over pooled keep-alive connections held by
+    client connector. Every event loop in which client is used gets its own connector (and
+    session), so client can be used by event loops running in different threads at once.
+    Session is closed when its event loop is shut down (for example at the end of
+    asyncio.run), so sessions are not left open by short lived event loops.
+    """
+
+    clients = dict()
+    clients_lock = Lock()
+
+    def __init__(
+        self, host, port, url, verify=None, pool_size=100, timeout=None, circuit_breaker=True
+    ):
+        """
+        Construct client with service arguments (host, port, url, verify).
+
+        verifiy - path to pem file with CA certificates for response verification
+        pool_size - maximum number of simultaneous connections
+        timeout - default timeout (in seconds) for one request. None means no timeout
+        circuit_breaker - True to use circuit breaker shared by clients of same server (also
+            FiskSOAPClient clients), CircuitBreaker to use given breaker or False to not use
+            circuit breaker
+        """
+        self.host = host
+        self.port = port
+        self.url = url
+        self.verify = verify
+        self.pool_size = pool_size
+        self.timeout = timeout
+        # event loop -> [session, async generator which closes session at loop shutdown]
+        self.sessions = dict()
+        self.sessions_lock = Lock()
+        if circuit_breaker is True:
+            self.breaker = CircuitBreaker.for_service(host, port, url)
+        else:
+            self.breaker = circuit_breaker or None
+
+    @staticmethod
+    def for_client(client):
+        """
+        Return (AsyncFiskSOAPClient): asyncio client for same service as given FiskSOAPClient.
+
+        Same asyncio client (and its connection pool) is returned for clients with same
+        service settings.
+        """
+        client_key = (
+            client.host, client.port, client.url, client.verify, client.pool_size, client.breaker)
+        with AsyncFiskSOAPClient.clients_lock:
+            aclient = AsyncFiskSOAPClient.clients.get(client_key)
+            if aclient is None:
+                aclient = AsyncFiskSOAPClient(
+                    client.host, client.port, client.url, client.verify, client.pool_size,
+                    circuit_breaker=client.breaker or False
+                )
+                AsyncFiskSOAPClient.clients[client_key] = aclient
+        return aclient
+
+    def create_ssl_context(self):
+        """Return (ssl.SSLContext): context used to verify server certificate."""
+        if self.verify is False:
+            return False
+        return ssl.create_default_context(cafile=self.verify)
+
+    def get_session(self):
+        """Return (aiohttp.ClientSession): pooled session for currently running event loop."""
+        loop = asyncio.get_running_loop()
+        with self.sessions_lock:
+            entry = self.sessions.get(loop)
+            if entry is None or entry[0].closed:
+                # forget sessions of loops which were closed (see close_at_shutdown)
+                for closed_loop in [key for key in self.sessions if key.is_closed()]:
+                    del self.sessions[closed_loop]
+                connector = aiohttp.TCPConnector(
+                    limit=self.pool_size, ssl=self.create_ssl_context())
+                entry = [aiohttp.ClientSession(connector=connector), None]
+                self.sessions[loop] = entry
+        return entry[0]
+
+    async def close_at_shutdown(self, loop, session):
+        """
+        Close session when its event loop is shut down.
+
+        Async generator started in event loop is finalized by loop.shutdown_asyncgens (called
+        by asyncio.run before loop is closed).
+        """
+        try:
+            yield
+        finally:
+            await session.close()
+            with self.sessions_lock:
+                entry = self.sessions.get(loop)
+                if entry is not None and entry[0] is session:
+                    del self.sessions[loop]
+
+    async def open_session(self):
+        """Return (aiohttp.ClientSession): session (see get_session) closed at loop shutdown."""
+        loop = asyncio.get_running_loop()
+        session = self.get_session()
+        with self.sessions_lock:
+            entry = self.sessions[loop]
+            closer = None
+            if entry[1] is None:
+                # strong reference is kept, loop tracks async generators only weakly
+                closer = entry[1] = self.close_at_shutdown(loop, session)
+        if closer is not None:
+            await closer.__anext__()
+        return session
+
+    async def send(self, message, raw=False, timeout=None):
+        """
+        Send message (as xml string) to server.
+
+        returns ElementTree object with server response message
+
+        if raw is True then returns raw xml
+
+        timeout - timeout (in seconds) or Deadline for this request. If None client default is
+            used
+        """
+        status, reason, content_type, content = await self.post(message, timeout)
+        return FiskSOAPClient.read_response(status, reason, content_type, content, raw)
+
+    async def send_response(self, message, timeout=None, metrics=None):
+        """
+        Send message (as xml string) to server.
+
+        returns (FiskResponse) decoded server response message
+
+        timeout - timeout (in seconds) or Deadline (fisk.deadline) for this request. If None
+            client default is used
+        metrics - RequestMetrics in which network and parse phases and sizes are recorded
+            (optional)
+        """
+        if metrics is not None:
+            start = time.perf_counter()
+        status, reason, content_type, content = await self.post(message, timeout)
+        if metrics is None:
+            return FiskSOAPClient.decode_response(status, reason, content_type, content)
+
+        start = metrics.add_phase("network", start)
+        metrics.request_size = len(message)
+        metrics.response_size = len(content)
+        response = FiskSOAPClient.decode_response(status, reason, content_type, content)
+        metrics.add_phase("parse", start)
+        return response
+
+    async def post(self, message, timeout=None):
+        """
+        Post message to server and return HTTP status, reason, content type and body (bytes).
+
+        timeout - timeout (in seconds) or Deadline. If Deadline is exceeded
+            FiskSOAPClientTimeout is raised
+
+        Raises:
+            FiskSOAPClientUnavailable: if circuit breaker is open
+        """
+        breaker = self.breaker
+        if breaker is None:
+            return await self.post_timeout(message, timeout)
+        if isinstance(timeout, Deadline):
+            # deadline exceeded before request is sent is not failure of server
+            timeout.network_timeouts()
+        if breaker.acquire():
+            try:
+                result = await self.probe()
+            except BaseException as e:
+                # probe was cancelled, breaker must not stay half open
+                breaker.record_failure(e)
+                raise
+            breaker.probe_finished(*result)
+        try:
+            result = await self.post_timeout(message, timeout)
+        except FiskSOAPClientTimeout as e:
+            if e.__cause__ is not None:  # network timeout (not deadline exceeded before sending)
+                breaker.record_failure(e)
+            raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            breaker.record_failure(e)
+            raise
+        breaker.record_response(result[0], result[1], result[2])
+        return result
+
+    async def probe(self):
+        """
+        Send echo message to server (circuit breaker probe).
+
+        returns (tuple) True if server replied to echo and error (None if there is no error)
+        """
+        try:
+            status, reason, content_type, content = await self.post_timeout(
+                FiskSOAPClient.get_probe_message(), Deadline(self.breaker.probe_timeout))
+            response = FiskSOAPClient.decode_response(status, reason, content_type, content)
+        except Exception as e:
+            return False, e
+        if response.echo != CircuitBreaker.probe_text:
+            return False, "Unexpected echo reply"
+        return True, None
+
+    async def post_timeout(self, message, timeout=None):
+        """Post message (without circuit breaker) and return HTTP status, type and body."""
+        if timeout is None:
+            timeout = self.timeout
+        if not isinstance(timeout, Deadline):
+            return await self.post_request(message, aiohttp.ClientTimeout(total=timeout))
+
+        connect, read = timeout.network_timeouts()
+        try:
+            return await self.post_request(
+                message, aiohttp.ClientTimeout(total=connect + read, sock_connect=connect))
+        except aiohttp.ConnectionTimeoutError as e:
+            raise timeout.expired("connect") from e
+        except asyncio.TimeoutError as e:
+            raise timeout.expired("read") from e
+
+    async def post_request(self, message, client_timeout):
+        """Post message with aiohttp timeout and return HTTP status, reason, type and body."""
+        session = await self.open_session()
+        async with session.post(
+            r"https://" + self.host + r":" + self.port + self.url,
+            headers={
+                "Host": self.host,
+                "Content-Type": "text/xml; charset=UTF-8",
+                "SOAPAction": self.url
+            },
+            data=message,
+            timeout=client_timeout
+        ) as r:
+            content = await r.read()
+            return r.status, r.reason, r.headers.get('Content-Type'), content
+
+    async def close(self):
+        """
+        Close session of running event loop and its pooled connections.
+
+        Sessions of other event loops are closed when those loops are shut down.
+        """
+        with self.sessions_lock:
+            entry = self.sessions.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].close()
+
+    @staticmethod
+    async def close_clients():
+        """Close connections of all shared clients (see for_client) in running event loop."""
+        with AsyncFiskSOAPClient.clients_lock:
+            aclients = list(AsyncFiskSOAPClient.clients.values())
+        for aclient in aclients:
+            await aclient.close()
+
+
+class AsyncFiskSOAPClientDemo(AsyncFiskSOAPClient):
+    """Same class as AsyncFiskSOAPClient but with demo PU server parameters set by default."""
+
+    def __init__(self, **kwargs):
+        """Init. Connection pool settings (see AsyncFiskSOAPClient) can be passed as kwargs."""
+        mpath = os.path.dirname(__file__)
+        cafile = mpath + "/CAcerts/demoCAfile.pem"
+        super().__init__(
+            host=r"cistest.apis-it.hr",
+            port=r"8449",
+            url=r"/FiskalizacijaServiceTest",
+            verify=cafile,
+            **kwargs
+        )
+
+
+class AsyncFiskSOAPClientProduction(AsyncFiskSOAPClient):
+    """Same class as AsyncFiskSOAPClient but with procudtion PU server parameters set by default."""
+
+    def __init__(self, **kwargs):
+        """Init. Connection pool settings (see AsyncFiskSOAPClient) can be passed as kwargs."""
+        mpath = os.path.dirname(__file__)
+        cafile = mpath + "/CAcerts/prodCAfile.pem"
+        super().__init__(
+            host=r"cis.porezna-uprava.hr",
+            port=r"8449",
+            url=r"/FiskalizacijaService",
+            verify=cafile,
+            **kwargs
+        )
@@ -0,0 +1,182 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from fisk import FiskInit, FiskInitError
+from fisk.client import FiskSOAPClient
+from fisk.deadline import Deadline
+from fisk.request import RacunZahtjev
+from fisk.signer import Signer
+from threading import Lock, local
+import time
+
+
+class BatchResult(object):
+    """Result of fiscalization of one Racun sent in batch."""
+
+    def __init__(self, index, racun, jir=False, errors=None, exception=None):
+        """
+        Initialize.
+
+        index (int): position of racun in batch input
+        racun (Racun): fiscalized racun
+        jir (str): JIR returned by server or False if fiscalization was not successful
+        errors (list): errors returned by server (see FiskXMLRequest.get_last_error)
+        exception (Exception): exception raised while sending racun (connection error, ...)
+        """
+        self.index = index
+        self.racun = racun
+        self.jir = jir
+        self.errors = errors if errors is not None else []
+        self.exception = exception
+
+    @property
+    def success(self):
+        """Return True if JIR was received."""
+        return self.jir is not False and self.jir is not None
+
+
+class RateLimiter(object):
+    """Thread safe limiter which allows at most rate calls of wait method per second."""
+
+    def __init__(self, rate):
+        """
+        Initialize.
+
+        rate (float): maximum number of calls per second
+        """
+        self.interval = 1.0 / rate
+        self.next_time = time.monotonic()
+        self.lock = Lock()
+
+    def wait(self):
+        """Block until next call is allowed."""
+        with self.lock:
+            now = time.monotonic()
+            if self.next_time < now:
+                self.next_time = now
+            delay = self.next_time - now
+            self.next_time += self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class FiskBatch(object):
+    """
+    Fiscalization of many Racun objects with bounded concurrency.
+
+    Racuni are sent by pool of worker threads. Every worker has its own connection to server
+    and by default its own copy of context signer (see Signer.copy, loaded key is shared,
+    ProcessSigner is shared by all workers). Every racun is sent in same way as by
+    RacunZahtjev.execute (instrumentation, circuit breaker, deadline). Input is consumed lazily
+    so at most max_pending racuni are in flight at once (back-pressure) and results are returned
+    in completion order.
+    """
+
+    def __init__(
+        self, context=None, workers=4, max_pending=None, rate=None, nak_dost=None,
+        client_factory=None, signer_factory=None, timeout=None
+    ):
+        """
+        Initialize.
+
+        context (FiskContext): fiscalization context. If None default context set by FiskInit
+            is used
+        workers (int): number of worker threads
+        max_pending (int): maximum number of racuni in flight. Default is two per worker
+        rate (float): maximum number of requests per second sent to server. None means no limit
+        nak_dost (str): if set ("true" or "false") NakDost of every racun is set to this value
+            before sending
+        client_factory (callable): returns new FiskSOAPClient for worker. If None worker gets
+            copy of context client (same server, verification, retry, proxy and circuit
+            breaker settings) with its own connection
+        signer_factory (callable): returns new signer for worker. If None worker uses copy of
+            context signer (see Signer.copy)
+        timeout (float): time budget (in seconds) of every request (see RacunZahtjev.execute).
+            If None there is no timeout
+        """
+        if context is None:
+            if not FiskInit.isset:
+                raise FiskInitError(
+                    "Needed members not set or fiskpy was not initalized (see FiskInit)")
+            context = FiskInit.context
+        self.context = context
+        self.workers = workers
+        self.max_pending = max_pending if max_pending is not None else 2 * workers
+        self.rate_limiter = RateLimiter(rate) if rate else None
+        self.nak_dost = nak_dost
+        self.client_factory = client_factory
+        self.signer_factory = signer_factory
+        self.timeout = timeout
+        self.worker_data = local()
+
+    def create_client(self):
+        """Return new FiskSOAPClient with its own connection used by one worker."""
+        if self.client_factory is not None:
+            return self.client_factory()
+        client = self.context.client
+        if not isinstance(client, FiskSOAPClient):
+            # custom client, its connection handling is not known
+            return client
+        worker_client = FiskSOAPClient(
+            client.host, client.port, client.url, client.verify, pool_size=1,
+            retries=client.retries, backoff_factor=client.backoff_factor, shared_session=False,
+            circuit_breaker=client.breaker or False
+        )
+        worker_client.session.proxies.update(client.session.proxies)
+        worker_client.session.trust_env = client.session.trust_env
+        return worker_client
+
+    def create_signer(self):
+        """Return signer used by one worker."""
+        if self.signer_factory is not None:
+            return self.signer_factory()
+        signer = self.context.signer
+        if isinstance(signer, Signer):
+            return signer.copy()
+        return signer
+
+    def get_worker_context(self):
+        """Return (FiskContext): context of current worker thread (created on first use)."""
+        if not hasattr(self.worker_data, "context"):
+            self.worker_data.context = self.context.replace(
+                client=self.create_client(), signer=self.create_signer())
+        return self.worker_data.context
+
+    def fiskalize(self, index, racun):
+        """Send one racun to server and return (BatchResult): result."""
+        try:
+            context = self.get_worker_context()
+            if self.nak_dost is not None:
+                racun.NakDost = self.nak_dost
+            zahtjev = RacunZahtjev(racun, context)
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+            zahtjev.send(Deadline.start(self.timeout))
+            jir = zahtjev.read_response()
+            return BatchResult(index, racun, jir, zahtjev.get_last_error())
+        except Exception as e:
+            return BatchResult(index, racun, exception=e)
+
+    def execute(self, racuni):
+        """
+        Fiscalize racuni.
+
+        racuni - iterable of Racun objects. It is consumed lazily
+
+        Returns generator of BatchResult objects in completion order
+        """
+        racuni = enumerate(racuni)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < self.max_pending:
+                    try:
+                        index, racun = next(racuni)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.add(executor.submit(self.fiskalize, index, racun))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
@@ -0,0 +1,219 @@
+from threading import Lock
+import time
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker of one fiscalization service (environment).
+
+    Breaker is closed while server works. After failure_threshold consecutive transport
+    failures (connection errors, timeouts or HTTP 5xx responses which are not SOAP faults) it
+    opens and requests fail immediately with FiskSOAPClientUnavailable (fisk.client) instead of
+    waiting for server. After reset_timeout seconds breaker is half open - first request sends
+    echo probe to server (other requests still fail immediately). If server replies to probe
+    breaker is closed again, otherwise it is open for another reset_timeout seconds. If probe
+    result is not reported in half_open_timeout seconds (for example caller was cancelled)
+    breaker is open again.
+
+    Breaker is shared by all clients (also asyncio clients) of same service (see for_service).
+    Current state is in state attribute and state changes are reported to listeners (see
+    add_listener), so offline mode can be used as soon as breaker opens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    probe_text = "fiskpy circuit breaker probe"
+
+    breakers = dict()  # (host, port, url) -> CircuitBreaker
+    breakers_lock = Lock()
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, probe_timeout=5.0,
+                 half_open_timeout=None):
+        """
+        Initialize.
+
+        failure_threshold (int): number of consecutive failures after which breaker opens
+        reset_timeout (float): time (in seconds) after which open breaker sends probe
+        probe_timeout (float): timeout (in seconds) of echo probe
+        half_open_timeout (float): time (in seconds) after which half open breaker whose probe
+            result was not reported is open again. Default is 2 * probe_timeout
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.half_open_timeout = half_open_timeout if half_open_timeout is not None \
+            else 2 * probe_timeout
+        self.lock = Lock()
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.half_opened_at = None
+        self.last_error = None
+        self.listeners = ()  # tuple so it can be read without lock
+
+    @staticmethod
+    def for_service(host, port, url):
+        """
+        Return (CircuitBreaker): breaker shared by all clients of service.
+
+        Breaker is created with default settings on first use. To use different settings
+        create breaker and pass it to clients (circuit_breaker argument).
+        """
+        key = (host, port, url)
+        with CircuitBreaker.breakers_lock:
+            breaker = CircuitBreaker.breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker()
+                CircuitBreaker.breakers[key] = breaker
+            return breaker
+
+    def add_listener(self, listener):
+        """
+        Register listener of state changes.
+
+        listener - function called as listener(breaker, old_state, new_state) after every
+            state change (in thread which caused change, so it should be fast)
+        """
+        with self.lock:
+            self.listeners = self.listeners + (listener,)
+
+    def remove_listener(self, listener):
+        """Unregister listener."""
+        with self.lock:
+            self.listeners = tuple(item for item in self.listeners if item is not listener)
+
+    def is_open(self):
+        """Return (boolean): True if requests fail immediately (breaker is open or half open)."""
+        return self.state != CircuitBreaker.CLOSED
+
+    def set_state(self, state):
+        """Change state (lock must be held). Returns old state."""
+        old_state = self.state
+        self.state = state
+        if state == CircuitBreaker.OPEN:
+            self.opened_at = time.monotonic()
+        elif state == CircuitBreaker.HALF_OPEN:
+            self.half_opened_at = time.monotonic()
+        elif state == CircuitBreaker.CLOSED:
+            self.opened_at = None
+        return old_state
+
+    def expire_probe(self):
+        """
+        Open half open breaker whose probe did not finish in time (lock must be held).
+
+        returns (boolean) True if breaker was opened
+        """
+        if self.state == CircuitBreaker.HALF_OPEN and \
+                time.monotonic() - self.half_opened_at >= self.half_open_timeout:
+            self.last_error = "Probe did not finish"
+            self.set_state(CircuitBreaker.OPEN)
+            return True
+        return False
+
+    def notify(self, old_state, new_state):
+        """Report state change to listeners."""
+        if old_state != new_state:
+            for listener in self.listeners:
+                listener(self, old_state, new_state)
+
+    def unavailable(self):
+        """Return (FiskSOAPClientUnavailable): exception for request rejected by breaker."""
+        from fisk.client import FiskSOAPClientUnavailable
+
+        return FiskSOAPClientUnavailable(
+            "Server is unavailable (circuit breaker is {}, last error: {})".format(
+                self.state, self.last_error))
+
+    def check(self):
+        """
+        Check if request can be sent without changing state (used before request is signed).
+
+        Raises:
+            FiskSOAPClientUnavailable: if breaker is open and it is not time for probe yet
+        """
+        if self.state == CircuitBreaker.CLOSED:
+            return
+        with self.lock:
+            expired = self.expire_probe()
+            rejected = self.state == CircuitBreaker.HALF_OPEN or (
+                self.state == CircuitBreaker.OPEN and
+                time.monotonic() - self.opened_at < self.reset_timeout
+            )
+        if expired:
+            self.notify(CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN)
+        if rejected:
+            raise self.unavailable()
+
+    def acquire(self):
+        """
+        Check if request can be sent to server.
+
+        returns (boolean) True if caller has to send probe first and report its result with
+            probe_finished (breaker is half open). False if request can be sent
+
+        Raises:
+            FiskSOAPClientUnavailable: if breaker is open
+        """
+        if self.state == CircuitBreaker.CLOSED:
+            return False
+        with self.lock:
+            expired = self.expire_probe()
+            state = self.state
+            if state == CircuitBreaker.CLOSED:
+                return False
+            if state == CircuitBreaker.OPEN and \
+                    time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.set_state(CircuitBreaker.HALF_OPEN)
+            else:
+                state = None
+        if expired:
+            self.notify(CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN)
+        if state is None:
+            raise self.unavailable()
+        self.notify(state, CircuitBreaker.HALF_OPEN)
+        return True
+
+    def probe_finished(self, success, error=None):
+        """
+        Record result of probe.
+
+        Raises:
+            FiskSOAPClientUnavailable: if probe failed (breaker is open again)
+        """
+        if success:
+            self.record_success()
+        else:
+            self.record_failure(error)
+            raise self.unavailable()
+
+    def record_success(self):
+        """Record successful request (server replied)."""
+        if self.failures == 0 and self.state == CircuitBreaker.CLOSED:
+            return
+        with self.lock:
+            self.failures = 0
+            old_state = self.set_state(CircuitBreaker.CLOSED)
+        self.notify(old_state, CircuitBreaker.CLOSED)
+
+    def record_failure(self, error):
+        """Record failed request (error - exception or description of failure)."""
+        with self.lock:
+            self.failures += 1
+            self.last_error = error
+            old_state = self.state
+            if old_state == CircuitBreaker.HALF_OPEN or (
+                old_state == CircuitBreaker.CLOSED and self.failures >= self.failure_threshold
+            ):
+                self.set_state(CircuitBreaker.OPEN)
+            new_state = self.state
+        self.notify(old_state, new_state)
+
+    def record_response(self, status_code, reason, content_type):
+        """Record HTTP response. HTTP 5xx responses which are not SOAP messages are failures."""
+        if status_code >= 500 and not (content_type or "").startswith("text/xml"):
+            self.record_failure(str(status_code) + ": " + str(reason))
+        else:
+            self.record_success()
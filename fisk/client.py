@@ -1,6 +1,12 @@
-from lxml import etree as et
+from fisk.breaker import CircuitBreaker
+from fisk.deadline import Deadline
+from fisk.response import FiskResponse
+from requests.adapters import HTTPAdapter
+from threading import Lock
+from urllib3.util.retry import Retry
 import requests
 import os
+import time
 
 
 class FiskSOAPClientError(Exception):
@@ -10,77 +16,314 @@ class FiskSOAPClientError(Exception):
         Exception.__init__(self, message)
 
 
+class FiskSOAPClientTimeout(FiskSOAPClientError, TimeoutError):
+    """
+    Request was not finished before its deadline (see Deadline).
+
+    phase - phase in which time ran out (sign, connect, read or verify)
+    """
+
+    def __init__(self, message, phase=None):
+        FiskSOAPClientError.__init__(self, message)
+        self.phase = phase
+
+
+class FiskSOAPClientUnavailable(FiskSOAPClientError):
+    """Request was not sent because circuit breaker of server is open (see CircuitBreaker)."""
+
+    def __init__(self, message):
+        FiskSOAPClientError.__init__(self, message)
+
+
 class FiskSOAPClient(object):
-    """Very very simple SOAP Client implementation."""
+    """
+    Very very simple SOAP Client implementation.
+
+    Requests are sent over pooled keep-alive HTTPS connections. Clients with same server and
+    pool settings share one session (connection pool) so TCP/TLS connections are reused also
+    between client objects and threads.
+
+    Client uses circuit breaker (see fisk.breaker.CircuitBreaker) shared by all clients of same
+    server, so during server outage requests fail immediately (FiskSOAPClientUnavailable).
+    """
+
+    sessions = dict()
+    sessions_lock = Lock()
+    probe_message = None  # echo message sent by circuit breaker probe
 
-    def __init__(self, host, port, url, verify=None):
+    def __init__(
+        self, host, port, url, verify=None, pool_size=10, retries=0, backoff_factor=0,
+        shared_session=True, circuit_breaker=True
+    ):
         """
         Construct client with service arguments (host, port, url, verify).
 
         verifiy - path to pem file with CA certificates for response verification
+        pool_size - maximum number of keep-alive connections held in pool
+        retries - how many times to retry failed connection attempt. Requests which
+            reached server are never retried so receipt can not be sent twice
+        backoff_factor - backoff factor (in seconds) used between retries
+        shared_session - if False client gets its own session (connection pool) instead of
+            session shared with other clients
+        circuit_breaker - True to use circuit breaker shared by clients of same server,
+            CircuitBreaker to use given breaker or False to not use circuit breaker
         """
         self.host = host
         self.port = port
         self.url = url
         self.verify = verify
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        if shared_session:
+            self.session = self.get_session()
+        else:
+            self.session = self.create_session()
+        if circuit_breaker is True:
+            self.breaker = CircuitBreaker.for_service(host, port, url)
+        else:
+            self.breaker = circuit_breaker or None
 
-    def send(self, message, raw=False):
+    def get_session(self):
+        """Return (requests.Session): pooled session shared by clients with same settings."""
+        session_key = (
+            self.host, self.port, self.verify, self.pool_size, self.retries, self.backoff_factor
+        )
+        with FiskSOAPClient.sessions_lock:
+            session = FiskSOAPClient.sessions.get(session_key)
+            if session is None:
+                session = self.create_session()
+                FiskSOAPClient.sessions[session_key] = session
+        return session
+
+    def create_session(self):
+        """Return (requests.Session): new session with connection pool and retry policy."""
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=0,
+            status=0,
+            backoff_factor=self.backoff_factor,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        return session
+
+    @staticmethod
+    def close_sessions():
+        """Close all shared sessions and their pooled connections."""
+        with FiskSOAPClient.sessions_lock:
+            for session in FiskSOAPClient.sessions.values():
+                session.close()
+            FiskSOAPClient.sessions.clear()
+
+    def send(self, message, raw=False, deadline=None):
         """
         Send message (as xml string) to server.
 
         returns ElementTree object with server response message
 
         if raw is True then returns raw xml
+
+        deadline - Deadline (or timeout in seconds) of request. If None there is no timeout
         """
-        xml = message
+        r = self.post(message, Deadline.start(deadline))
+        response = self.decode_response(
+            r.status_code, r.reason, r.headers.get('Content-Type'), r.content)
+        if raw:
+            return r.text
+        return response.root
 
-        r = requests.post(r"https://" + self.host + r":" + self.port + self.url, headers={
+    def send_response(self, message, metrics=None, deadline=None):
+        """
+        Send message (as xml string) to server.
+
+        metrics - RequestMetrics in which network and parse phases, sizes, retries and
+            connection reuse are recorded (optional). Connection reuse is only approximate if
+            session is used by many threads at once
+        deadline - Deadline of request (see Deadline). If None there is no timeout
+
+        returns (FiskResponse) decoded server response message
+
+        Raises:
+            FiskSOAPClientTimeout: if response is not received before deadline
+        """
+        if metrics is None:
+            r = self.post(message, deadline)
+            return self.decode_response(r.status_code, r.reason, r.headers.get('Content-Type'),
+                                        r.content)
+
+        connections = self.count_connections()
+        start = time.perf_counter()
+        r = self.post(message, deadline)
+        start = metrics.add_phase("network", start)
+        metrics.request_size = len(message)
+        metrics.response_size = len(r.content)
+        metrics.connection_reused = self.count_connections() == connections
+        if r.raw is not None and r.raw.retries is not None:
+            metrics.retries = len(r.raw.retries.history)
+        response = self.decode_response(r.status_code, r.reason, r.headers.get('Content-Type'),
+                                        r.content)
+        metrics.add_phase("parse", start)
+        return response
+
+    def count_connections(self):
+        """Return (int): number of connections opened by session of this client."""
+        poolmanager = self.session.get_adapter(self.get_url()).poolmanager
+        return sum(poolmanager.pools[key].num_connections for key in poolmanager.pools.keys())
+
+    def post(self, message, deadline=None):
+        """
+        Post message to server and return (requests.Response) HTTP response.
+
+        deadline - Deadline of request. If None there is no timeout
+
+        Raises:
+            FiskSOAPClientUnavailable: if circuit breaker is open
+        """
+        breaker = self.breaker
+        if breaker is None:
+            return self.post_request(message, deadline)
+        if deadline is not None:
+            # deadline exceeded before request is sent is not failure of server
+            deadline.network_timeouts()
+        if breaker.acquire():
+            try:
+                result = self.probe()
+            except BaseException as e:
+                breaker.record_failure(e)
+                raise
+            breaker.probe_finished(*result)
+        try:
+            r = self.post_request(message, deadline)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            breaker.record_failure(e)
+            raise
+        except FiskSOAPClientTimeout as e:
+            if e.__cause__ is not None:  # network timeout (not deadline exceeded before sending)
+                breaker.record_failure(e)
+            raise
+        breaker.record_response(r.status_code, r.reason, r.headers.get('Content-Type'))
+        return r
+
+    def probe(self):
+        """
+        Send echo message to server (circuit breaker probe).
+
+        returns (tuple) True if server replied to echo and error (None if there is no error)
+        """
+        try:
+            r = self.post_request(
+                FiskSOAPClient.get_probe_message(), Deadline(self.breaker.probe_timeout))
+            response = self.decode_response(
+                r.status_code, r.reason, r.headers.get('Content-Type'), r.content)
+        except Exception as e:
+            return False, e
+        if response.echo != CircuitBreaker.probe_text:
+            return False, "Unexpected echo reply"
+        return True, None
+
+    @staticmethod
+    def get_probe_message():
+        """Return (bytes): echo message sent by circuit breaker probe (serialized once)."""
+        if FiskSOAPClient.probe_message is None:
+            from fisk import FiskSOAPMessage
+            from fisk.request import EchoRequest
+
+            FiskSOAPClient.probe_message = FiskSOAPMessage.serialize(
+                EchoRequest(CircuitBreaker.probe_text))
+        return FiskSOAPClient.probe_message
+
+    def post_request(self, message, deadline=None):
+        """Post message to server (without circuit breaker) and return HTTP response."""
+        if deadline is None:
+            return self.session.post(self.get_url(), headers=self.get_headers(), data=message,
+                                     verify=self.verify)
+        try:
+            r = self.session.post(self.get_url(), headers=self.get_headers(), data=message,
+                                  verify=self.verify, timeout=deadline.network_timeouts())
+        except requests.exceptions.ConnectTimeout as e:
+            raise deadline.expired("connect") from e
+        except requests.exceptions.Timeout as e:
+            raise deadline.expired("read") from e
+        return r
+
+    def get_url(self):
+        """Return service url."""
+        return r"https://" + self.host + r":" + self.port + self.url
+
+    def get_headers(self):
+        """Return HTTP headers sent with every request."""
+        return {
             "Host": self.host,
             "Content-Type": "text/xml; charset=UTF-8",
             # "Content-Length": len(xml),
             "SOAPAction": self.url
-        }, data=xml, verify=self.verify)
+        }
 
-        response = None
-        if r.status_code == requests.codes.ok:
-            response = r.text
-        else:
-            if (r.headers['Content-Type'] == "text/xml"):
-                response = r.text
-            else:
-                raise FiskSOAPClientError(str(r.status_code) + ": " + r.reason)
-        responseXML = et.fromstring(response.encode('utf-8'))
-        for relement in responseXML.iter():
-            if relement.tag.find("faultstring") != -1:
-                raise FiskSOAPClientError(relement.text)
-        if not raw:
-            response = responseXML
+    @staticmethod
+    def read_response(status_code, reason, content_type, content, raw=False):
+        """
+        Check server HTTP response and parse its body (bytes or str).
+
+        returns ElementTree object with server response message
+
+        if raw is True then returns raw xml (as str)
+        """
+        response = FiskSOAPClient.decode_response(status_code, reason, content_type, content)
+        if raw:
+            return content.decode('utf-8') if isinstance(content, bytes) else content
+        return response.root
+
+    @staticmethod
+    def decode_response(status_code, reason, content_type, content):
+        """
+        Check server HTTP response and decode its body.
+
+        content - response body as received (bytes). It is parsed without decoding it to str
+            first. str is also accepted (it is encoded to utf-8)
+
+        returns (FiskResponse) decoded server response message
+        """
+        if status_code != requests.codes.ok and content_type != "text/xml":
+            raise FiskSOAPClientError(str(status_code) + ": " + reason)
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        response = FiskResponse.parse(content)
+        if response.fault is not None:
+            raise FiskSOAPClientError(response.fault)
         return response
 
 
 class FiskSOAPClientDemo(FiskSOAPClient):
     """Same class as FiskSOAPClient but with demo PU server parameters set by default."""
 
-    def __init__(self):
+    def __init__(self, **kwargs):
+        """Init. Connection pool settings (see FiskSOAPClient) can be passed as kwargs."""
         mpath = os.path.dirname(__file__)
         cafile = mpath + "/CAcerts/demoCAfile.pem"
         super().__init__(
             host=r"cistest.apis-it.hr",
             port=r"8449",
             url=r"/FiskalizacijaServiceTest",
-            verify=cafile
+            verify=cafile,
+            **kwargs
         )
 
 
 class FiskSOAPClientProduction(FiskSOAPClient):
     """Same class as FiskSOAPClient but with procudtion PU server parameters set by default."""
 
-    def __init__(self):
+    def __init__(self, **kwargs):
+        """Init. Connection pool settings (see FiskSOAPClient) can be passed as kwargs."""
         mpath = os.path.dirname(__file__)
         cafile = mpath + "/CAcerts/prodCAfile.pem"
         super().__init__(
             host=r"cis.porezna-uprava.hr",
             port=r"8449",
             url=r"/FiskalizacijaService",
-            verify=cafile
+            verify=cafile,
+            **kwargs
         )
@@ -0,0 +1,98 @@
+from fisk.client import FiskSOAPClientDemo, FiskSOAPClientProduction
+from fisk.signer import Signer
+from fisk.utils import load_private_key
+
+
+class FiskContext(object):
+    """
+    Fiscalization context - credentials and environment of one taxpayer.
+
+    Holds key (for ZastKod), signer, client and verifier. Context is immutable so one
+    context object can be safely used by many threads and many contexts (for example for
+    different OIB certificates) can be used in same process. Context can be passed to Racun and
+    to request classes. If it is not passed default context set by FiskInit is used.
+    """
+
+    def __init__(
+        self, key_file=None, password=None, cert_file=None, production=False, client=None,
+        signer=None, verifier=None, key=None
+    ):
+        """
+        Initialize.
+
+        Args:
+            key_file (str): path to fiscalization user key file in pem format
+            password (str): password for key
+            cert_file (str): path to fiscalization user certificate in pem fromat
+            production (boolean): True for fiscalization production environment, False (default)
+                for demo
+            client (FiskSOAPClient): client used for sending requests. If None client for
+                selected environment is used
+            signer (Signer): signer of requests. If None it is created from key_file, password
+                and cert_file
+            verifier (Verifier): verifier of response signatures. If None responses are not
+                verified. fisk.deferred.DeferredVerifier verifies responses in background
+            key (PrivateKey): loaded key used for ZastKod. If None it is loaded from key_file
+                (using key cache) when needed
+        """
+        if client is None:
+            client = FiskSOAPClientProduction() if production else FiskSOAPClientDemo()
+        if signer is None and key_file is not None and cert_file is not None:
+            signer = Signer(key_file, password, cert_file)
+        values = {
+            "key_file": key_file,
+            "password": password,
+            "cert_file": cert_file,
+            "production": production,
+            "client": client,
+            "signer": signer,
+            "verifier": verifier,
+            "key": key
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FiskContext is immutable, use replace method instead")
+
+    def __delattr__(self, name):
+        raise AttributeError("FiskContext is immutable")
+
+    def get_key(self):
+        """
+        Return (PrivateKey): key used for ZastKod generation.
+
+        Raises:
+            ValueError: if context does not have key
+        """
+        if self.key is not None:
+            return self.key
+        if self.key_file is None:
+            raise ValueError("Fiscalization context does not have key")
+        return load_private_key(self.key_file, self.password)
+
+    def replace(self, **changes):
+        """
+        Return (FiskContext): copy of this context with changed members.
+
+        If credentials (key_file, password, cert_file) are changed signer and key are
+        created again, and if production is changed client is created again (unless they are
+        also supplied).
+        """
+        values = {
+            "key_file": self.key_file,
+            "password": self.password,
+            "cert_file": self.cert_file,
+            "production": self.production,
+            "client": self.client,
+            "signer": self.signer,
+            "verifier": self.verifier,
+            "key": self.key
+        }
+        if {"key_file", "password", "cert_file"} & set(changes):
+            values["signer"] = None
+            values["key"] = None
+        if "production" in changes:
+            values["client"] = None
+        values.update(changes)
+        return FiskContext(**values)
@@ -0,0 +1,62 @@
+import time
+
+
+class Deadline(object):
+    """
+    Time budget of one request split across its phases.
+
+    Deadline starts when it is created. When request is sent, of budget which is left at most
+    connect seconds are used for connecting (TCP connect, TLS handshake and sending of request,
+    but not more than half of what is left), verify seconds are kept for verification of
+    response and the rest is used for reading of response. If time runs out
+    FiskSOAPClientTimeout (fisk.client) is raised.
+
+    Read timeout is applied to every read from socket so very slow (trickling) response can
+    take a bit longer. Connect retries of client (see FiskSOAPClient retries) are not limited
+    by deadline.
+    """
+
+    def __init__(self, timeout, connect=None, verify=None):
+        """
+        Start deadline.
+
+        timeout (float): time budget (in seconds) of whole request
+        connect (float): maximum time for connecting and sending of request. Default is 30% of
+            timeout
+        verify (float): time kept for verification of response. Default is 10% of timeout
+        """
+        self.timeout = timeout
+        self.end = time.monotonic() + timeout
+        self.connect = connect if connect is not None else timeout * 0.3
+        self.verify = verify if verify is not None else timeout * 0.1
+
+    @staticmethod
+    def start(timeout):
+        """Return (Deadline): timeout if it is Deadline, deadline for timeout seconds or None."""
+        if timeout is None or isinstance(timeout, Deadline):
+            return timeout
+        return Deadline(timeout)
+
+    def remaining(self):
+        """Return (float): seconds left until deadline (negative if it is exceeded)."""
+        return self.end - time.monotonic()
+
+    def expired(self, phase):
+        """Return (FiskSOAPClientTimeout): exception for deadline exceeded in phase."""
+        from fisk.client import FiskSOAPClientTimeout
+
+        return FiskSOAPClientTimeout(
+            "Request deadline ({}s) exceeded in {} phase".format(self.timeout, phase), phase)
+
+    def check(self, phase):
+        """Raise FiskSOAPClientTimeout if deadline is exceeded (before or in phase)."""
+        if self.end <= time.monotonic():
+            raise self.expired(phase)
+
+    def network_timeouts(self):
+        """Return (tuple): connect and read timeouts (seconds) for request sent now."""
+        remaining = self.remaining() - self.verify
+        if remaining <= 0:
+            raise self.expired("connect")
+        connect = min(self.connect, remaining / 2)
+        return connect, remaining - connect
@@ -0,0 +1,197 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+from fisk.response import FiskResponse, parse_xml
+from lxml import etree as et
+from threading import Lock
+import json
+import time
+
+
+class VerificationAudit(object):
+    """
+    Store of response verification results.
+
+    Failed verifications are kept in memory (with received response message as evidence) and
+    numbers of verified and failed responses are counted. If path is given every result is
+    also appended to file as one json line.
+
+    Record (dict) of one verification:
+        {"time": ..., "request": ..., "id_poruke": ..., "jir": ..., "verified": ...,
+         "error": ..., "response": ...}
+        time - time when response was received (seconds since epoch)
+        request - name of request (RacunZahtjev, PoslovniProstorZahtjev, ...)
+        jir - JIR returned to caller before verification (False if response has no Jir)
+        verified - True if signature and returned values (IdPoruke, Jir) are verified
+        error - description of failure (None if response is verified)
+        response - received response message (str, only in records of failed verifications)
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize.
+
+        path (str): path to file to which results are appended (optional)
+        """
+        self.path = path
+        self.lock = Lock()
+        self.verified = 0
+        self.failed = 0
+        self.failed_records = []
+        self.file = open(path, "ab") if path is not None else None
+
+    def add(self, record):
+        """Store result of verification."""
+        line = None
+        if self.file is not None:
+            line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self.lock:
+            if record["verified"]:
+                self.verified += 1
+            else:
+                self.failed += 1
+                self.failed_records.append(record)
+            if line is not None:
+                self.file.write(line)
+                self.file.flush()
+
+    def failures(self):
+        """Return (list): records of all failed verifications."""
+        with self.lock:
+            return list(self.failed_records)
+
+    def close(self):
+        """Close audit file."""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class DeferredVerifier(object):
+    """
+    Verification of response signatures in background threads.
+
+    When DeferredVerifier is used as verifier of context (FiskContext verifier argument)
+    requests (execute, async_execute, FiskBatch) return values from response (JIR) as soon as
+    response is parsed and signed response is verified later by pool of worker threads with
+    wrapped Verifier. For example:
+
+        verifier = DeferredVerifier(Verifier(production=True), callback=report_failure)
+        context = FiskContext(key_file, password, cert_file, production=True, verifier=verifier)
+        ...
+        verifier.close()
+
+    Every verification result is stored in audit (VerificationAudit). Failed verification
+    (invalid signature or certificate, signed IdPoruke or Jir different from returned one) is
+    also reported to callback and queue. Returned JIR should not be trusted (racun should be
+    fiscalized again) if its verification fails.
+
+    If max_pending responses are already waiting for verification, response is verified in
+    caller thread (so memory used by waiting responses is limited).
+    """
+
+    def __init__(self, verifier, workers=1, callback=None, queue=None, audit=None,
+                 max_pending=10000):
+        """
+        Initialize.
+
+        verifier (Verifier): verifier used by worker threads
+        workers (int): number of worker threads
+        callback: function called as callback(record) for every failed verification (in worker
+            thread, see VerificationAudit for record)
+        queue: queue.Queue (or other object with put method) to which records of failed
+            verifications are put
+        audit (VerificationAudit): store of results. If None new in-memory store is created
+        max_pending (int): maximum number of responses waiting for verification
+        """
+        self.verifier = verifier
+        self.callback = callback
+        self.queue = queue
+        self.audit = audit if audit is not None else VerificationAudit()
+        self.max_pending = max_pending
+        self.lock = Lock()
+        self.pending = set()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fisk-verify")
+
+    def verifiyXML(self, xml):
+        """Verify an xml document immediately (see Verifier.verifiyXML)."""
+        return self.verifier.verifiyXML(xml)
+
+    def submit(self, response, request_name, id_poruke):
+        """
+        Schedule verification of response.
+
+        response (FiskResponse): response whose values are returned to caller
+        request_name (str): name of request
+        id_poruke (str): IdPoruke of sent request (None if request does not have it)
+
+        returns (Future) with verification record (see VerificationAudit)
+        """
+        content = response.content
+        if content is None:
+            content = et.tostring(response.root)
+        record = {
+            "time": time.time(),
+            "request": request_name,
+            "id_poruke": id_poruke,
+            "jir": response.jir,
+            "verified": False,
+            "error": None
+        }
+        with self.lock:
+            deferred = len(self.pending) < self.max_pending
+        if not deferred:
+            future = Future()
+            future.set_result(self.verify(record, content))
+            return future
+        future = self.executor.submit(self.verify, record, content)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self.finished)
+        return future
+
+    def finished(self, future):
+        with self.lock:
+            self.pending.discard(future)
+
+    def verify(self, record, content):
+        """Verify response message (bytes) and report result. Runs in worker thread."""
+        try:
+            verified = self.verifier.verifiyXML(parse_xml(content))
+            if verified is None:
+                record["error"] = "Response signature could not be verified"
+            else:
+                response = FiskResponse.fromElement(verified)
+                if record["id_poruke"] is not None and \
+                        response.id_poruke != record["id_poruke"]:
+                    record["error"] = "Signed IdPoruke is not IdPoruke of request"
+                elif response.jir != record["jir"]:
+                    record["error"] = "Signed Jir is not returned Jir"
+                else:
+                    record["verified"] = True
+        except Exception as e:
+            record["error"] = type(e).__name__ + ": " + str(e)
+        if not record["verified"]:
+            record["response"] = content.decode("utf-8", "replace")
+        self.audit.add(record)
+        if not record["verified"]:
+            if self.queue is not None:
+                self.queue.put(record)
+            if self.callback is not None:
+                self.callback(record)
+        return record
+
+    def wait(self, timeout=None):
+        """
+        Wait until all scheduled verifications are finished.
+
+        returns (boolean) True if there are no pending verifications
+        """
+        with self.lock:
+            pending = list(self.pending)
+        return len(wait_futures(pending, timeout).not_done) == 0
+
+    def close(self, wait=True):
+        """Stop worker threads (after pending verifications are finished if wait is True)."""
+        self.executor.shutdown(wait=wait)
+        if wait:
+            self.audit.close()
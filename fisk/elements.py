@@ -1,12 +1,13 @@
 from datetime import datetime
 from uuid import uuid4
 from fisk import FiskInit, FiskInitError
-from fisk.utils import zastitni_kod
+from fisk.instrumentation import Instrumentation
 from fisk.validator import (
     XMLValidatorEnum, XMLValidatorLen, XMLValidatorListType, XMLValidatorRegEx,
     XMLValidatorRequired, XMLValidatorType
 )
-from fisk.xml import FiskXMLElement
+from fisk.xml import FiskXMLElement, XMLSchema
+import time
 
 
 class Zaglavlje(FiskXMLElement):
@@ -21,49 +22,53 @@ class Zaglavlje(FiskXMLElement):
     Ususaly you will not use this element as it is used internaly by this library
     """
 
-    def __init__(self):
-        super().__init__(
-            childrenNames=(
-                (
-                    "IdPoruke",
-                    [XMLValidatorRegEx(
-                        "^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$"
-                    )]
+    __slots__ = ()
+
+    childrenNames = (
+        (
+            "IdPoruke",
+            [
+                XMLValidatorRegEx(
+                    "^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$"
                 ),
-                (
-                    "DatumVrijeme", [XMLValidatorRegEx(
-                        "^[0-9]{2}.[0-9]{2}.[1-2][0-9]{3}T[0-9]{2}:[0-9]{2}:[0-9]{2}$"
-                    )]
-                )
-            )
+                XMLValidatorRequired()
+            ]
+        ),
+        (
+            "DatumVrijeme",
+            [
+                XMLValidatorRegEx("^[0-9]{2}.[0-9]{2}.[1-2][0-9]{3}T[0-9]{2}:[0-9]{2}:[0-9]{2}$"),
+                XMLValidatorRequired()
+            ]
         )
+    )
+
+    def __init__(self):
+        super().__init__()
         self.IdPoruke = str(uuid4())
         self.DatumVrijeme = datetime.now().strftime('%d.%m.%YT%H:%M:%S')
-        self.addValidator("IdPoruke", XMLValidatorRequired())
-        self.addValidator("DatumVrijeme", XMLValidatorRequired())
 
-    def generate(self):  # overide because need new ID and time for every message we sent to porezna
+    def beforeGenerate(self):  # overide because need new ID and time for every message we sent
         self.IdPoruke = str(uuid4())
         self.DatumVrijeme = datetime.now().strftime('%d.%m.%YT%H:%M:%S')
-        return FiskXMLElement.generate(self)
 
 
 class Adresa(FiskXMLElement):
     """Adresa fiskal element."""
 
+    __slots__ = ()
+
+    childrenNames = (
+        ("Ulica", [XMLValidatorLen(1, 100)]),
+        ("KucniBroj", [XMLValidatorRegEx("^\\d{1,4}$")]),
+        ("KucniBrojDodatak", [XMLValidatorLen(1, 4)]),
+        ("BrojPoste", [XMLValidatorRegEx("^\\d{1,12}$")]),
+        ("Naselje", [XMLValidatorLen(1, 35)]),
+        ("Opcina", [XMLValidatorLen(1, 35)])
+    )
+
     def __init__(self, data=None):
-        string35Val = XMLValidatorLen(1, 35)
-        super().__init__(
-            childrenNames=(
-                ("Ulica", [XMLValidatorLen(1, 100)]),
-                ("KucniBroj", [XMLValidatorRegEx("^\\d{1,4}$")]),
-                ("KucniBrojDodatak", [XMLValidatorLen(1, 4)]),
-                ("BrojPoste", [XMLValidatorRegEx("^\\d{1,12}$")]),
-                ("Naselje", [string35Val]),
-                ("Opcina", [string35Val])
-            ),
-            data=data
-        )
+        super().__init__(data=data)
 
 
 class AdresniPodatak(FiskXMLElement):
@@ -74,213 +79,242 @@ class AdresniPodatak(FiskXMLElement):
     and it is not ment to be changed later
     """
 
+    __slots__ = ()
+
+    adresaSchema = XMLSchema((("Adresa", [XMLValidatorType(Adresa)]),), shared=True)
+    ostaliTipoviSchema = XMLSchema((("OstaliTipoviPP", [XMLValidatorLen(1, 100)]),), shared=True)
+
     def __init__(self, adresa):
         super().__init__()
         if isinstance(adresa, Adresa):
-            self.setAvailableChildren(["Adresa"])
-            self.addValidator("Adresa", XMLValidatorType(Adresa))
+            self.setSchema(AdresniPodatak.adresaSchema)
             self.Adresa = adresa
         else:
-            self.setAvailableChildren(["OstaliTipoviPP"])
-            self.addValidator("OstaliTipoviPP", XMLValidatorLen(1, 100))
+            self.setSchema(AdresniPodatak.ostaliTipoviSchema)
             self.OstaliTipoviPP = adresa
 
 
 class PoslovniProstor(FiskXMLElement):
     """PoslovniProstor element."""
 
+    __slots__ = ()
+
+    childrenNames = (
+        ("Oib", [XMLValidatorRegEx("^\\d{11}$"), XMLValidatorRequired()]),
+        ("OznPoslProstora", [XMLValidatorRegEx("^[0-9a-zA-Z]{1,20}$"), XMLValidatorRequired()]),
+        ("AdresniPodatak", [XMLValidatorType(AdresniPodatak), XMLValidatorRequired()]),
+        ("RadnoVrijeme", [XMLValidatorLen(1, 1000), XMLValidatorRequired()]),
+        (
+            "DatumPocetkaPrimjene",
+            [XMLValidatorRegEx("^[0-9]{2}.[0-9]{2}.[1-2][0-9]{3}$"), XMLValidatorRequired()]
+        ),
+        ("OznakaZatvaranja", [XMLValidatorEnum(["Z"])]),
+        ("SpecNamj", [XMLValidatorLen(1, 1000)])
+    )
+
     def __init__(self, data=None):
-        string1000Val = XMLValidatorLen(1, 1000)
-        super().__init__(
-            childrenNames=(
-                ("Oib", [XMLValidatorRegEx("^\\d{11}$"), XMLValidatorRequired()]),
-                (
-                    "OznPoslProstora",
-                    [XMLValidatorRegEx("^[0-9a-zA-Z]{1,20}$"), XMLValidatorRequired()]
-                ),
-                ("AdresniPodatak", [XMLValidatorType(AdresniPodatak), XMLValidatorRequired()]),
-                ("RadnoVrijeme", [string1000Val, XMLValidatorRequired()]),
-                (
-                    "DatumPocetkaPrimjene",
-                    [
-                        XMLValidatorRegEx("^[0-9]{2}.[0-9]{2}.[1-2][0-9]{3}$"),
-                        XMLValidatorRequired()
-                    ]
-                ),
-                ("OznakaZatvaranja", [XMLValidatorEnum(["Z"])]),
-                ("SpecNamj", [string1000Val])
-            ),
-            data=data
-        )
+        super().__init__(data=data)
 
 
 class BrRac(FiskXMLElement):
     """BrojRacuna element."""
 
+    __slots__ = ()
+
+    childrenNames = (
+        ("BrOznRac", [XMLValidatorRegEx("^\\d{1,20}$"), XMLValidatorRequired()]),
+        ("OznPosPr", [XMLValidatorRegEx("^[0-9a-zA-Z]{1,20}$"), XMLValidatorRequired()]),
+        ("OznNapUr", [XMLValidatorRegEx("^\\d{1,20}$"), XMLValidatorRequired()])
+    )
+
     def __init__(self, data=None):
-        regexVal = XMLValidatorRegEx("^\\d{1,20}$")
-        FiskXMLElement.__init__(
-            self,
-            childrenNames=(
-                ("BrOznRac", [regexVal, XMLValidatorRequired()]),
-                ("OznPosPr", [XMLValidatorRegEx("^[0-9a-zA-Z]{1,20}$"), XMLValidatorRequired()]),
-                ("OznNapUr", [regexVal, XMLValidatorRequired()])
-            ),
-            data=data
-        )
+        FiskXMLElement.__init__(self, data=data)
 
 
 class Porez(FiskXMLElement):
     """Porez element."""
 
+    __slots__ = ()
+
+    childrenNames = (
+        ("Stopa", [XMLValidatorRegEx("^([+-]?)[0-9]{1,3}\\.[0-9]{2}$"), XMLValidatorRequired()]),
+        (
+            "Osnovica",
+            [XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$"), XMLValidatorRequired()]
+        ),
+        ("Iznos", [XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$"), XMLValidatorRequired()])
+    )
+
     def __init__(self, data=None):
-        regexVal = XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$")
-        super().__init__(
-            childrenNames=(
-                (
-                    "Stopa",
-                    [XMLValidatorRegEx("^([+-]?)[0-9]{1,3}\\.[0-9]{2}$"), XMLValidatorRequired()]
-                ),
-                ("Osnovica", [regexVal, XMLValidatorRequired()]),
-                ("Iznos", [regexVal, XMLValidatorRequired()])
-            ),
-            data=data
-        )
+        super().__init__(data=data)
 
 
 class OstPorez(FiskXMLElement):
     """Porez element which is cuhiled od OstaliPor elemt."""
 
+    __slots__ = ()
+
+    childrenNames = (
+        ("Naziv", [XMLValidatorLen(1, 100), XMLValidatorRequired()]),
+        ("Stopa", [XMLValidatorRegEx("^([+-]?)[0-9]{1,3}\\.[0-9]{2}$"), XMLValidatorRequired()]),
+        (
+            "Osnovica",
+            [XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$"), XMLValidatorRequired()]
+        ),
+        ("Iznos", [XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$"), XMLValidatorRequired()])
+    )
+
     def __init__(self, data=None):
-        regexVal = XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$")
-        super().__init__(
-            childrenNames=(
-                ("Naziv", [XMLValidatorLen(1, 100), XMLValidatorRequired()]),
-                (
-                    "Stopa",
-                    [XMLValidatorRegEx("^([+-]?)[0-9]{1,3}\\.[0-9]{2}$"), XMLValidatorRequired()]
-                ),
-                ("Osnovica", [regexVal, XMLValidatorRequired()]),
-                ("Iznos", [regexVal, XMLValidatorRequired()])
-            ),
-            data=data,
-            name="Porez"
-        )
+        super().__init__(data=data, name="Porez")
 
 
 class Naknada(FiskXMLElement):
     """Naknada element."""
 
+    __slots__ = ()
+
+    childrenNames = (
+        ("NazivN", [XMLValidatorLen(1, 100), XMLValidatorRequired()]),
+        ("IznosN", [XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$"), XMLValidatorRequired()])
+    )
+
     def __init__(self, data=None):
-        super().__init__(
-            childrenNames=(
-                ("NazivN", [XMLValidatorLen(1, 100), XMLValidatorRequired()]),
-                (
-                    "IznosN",
-                    [XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$"), XMLValidatorRequired()]
-                )
-            ),
-            data=data
-        )
+        super().__init__(data=data)
 
 
 class Racun(FiskXMLElement):
     """
     Racun element.
 
-    it is not possible to set ZastKod as this class calculate it each time
-        you change one of varibales from it is calcualted
+    it is not possible to set ZastKod as this class calculate it. ZastKod is calculated when it
+        is read or when element is generated and only if one of varibales from it is calcualted
+        (including BrRac values) was changed since last calculation
     """
 
-    def __init__(self, data, key_file=None, key_password=None):
+    __slots__ = ('_context', '_key', '_keyPassword', '_zastKodInput')
+
+    childrenNames = (
+        ("Oib", [XMLValidatorRegEx("^\\d{11}$"), XMLValidatorRequired()]),
+        ("USustPdv", [XMLValidatorEnum(["true", "false"]), XMLValidatorRequired()]),
+        ("DatVrijeme", [
+            XMLValidatorRegEx("^[0-9]{2}.[0-9]{2}.[1-2][0-9]{3}T[0-9]{2}:[0-9]{2}:[0-9]{2}$"),
+            XMLValidatorRequired()
+        ]),
+        ("OznSlijed", [XMLValidatorEnum(["P", "N"]), XMLValidatorRequired()]),
+        ("BrRac", [XMLValidatorType(BrRac), XMLValidatorRequired()]),
+        ("Pdv", [XMLValidatorListType(Porez)]),
+        ("Pnp", [XMLValidatorListType(Porez)]),
+        ("OstaliPor", [XMLValidatorListType(OstPorez)]),
+        ("IznosOslobPdv", [XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$")]),
+        ("IznosMarza", [XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$")]),
+        ("IznosNePodlOpor", [XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$")]),
+        ("Naknade", [XMLValidatorListType(Naknada)]),
+        (
+            "IznosUkupno",
+            [XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$"), XMLValidatorRequired()]
+        ),
+        ("NacinPlac", [XMLValidatorEnum(["G", "K", "C", "T", "O"]), XMLValidatorRequired()]),
+        ("OibOper", [XMLValidatorRegEx("^\\d{11}$"), XMLValidatorRequired()]),
+        ("ZastKod", [XMLValidatorRegEx("^[a-f0-9]{32}$")]),
+        ("NakDost", [XMLValidatorEnum(["true", "false"]), XMLValidatorRequired()]),
+        ("ParagonBrRac", [XMLValidatorLen(1, 100)]),
+        ("SpecNamj", [XMLValidatorLen(1, 1000)])
+    )
+
+    def __init__(self, data, key_file=None, key_password=None, context=None):
         """
         Initialize.
 
         data - dict - initial data
         key_file - string - ful path of filename which holds private key needed for
-            creation of ZastKod
-        key_password - key password
+            creation of ZastKod or already loaded key (fisk.utils.PrivateKey)
+        key_password - key password (not needed if key_file is PrivateKey)
+        context - FiskContext - fiscalization context whose key is used if key_file and
+            key_password are not supplied. If None default context set by FiskInit is used
         """
         if (key_file is None and key_password is None):
-            if (not FiskInit.isset):
-                raise FiskInitError(
-                    "Needed members not set or fiskpy was not initalized (see FiskInit)")
-            else:
-                key_file = FiskInit.key_file
-                key_password = FiskInit.password
-
-        porezListVal = XMLValidatorListType(Porez)
-        iznosVal = XMLValidatorRegEx("^([+-]?)[0-9]{1,15}\\.[0-9]{2}$")
-        oibVal = XMLValidatorRegEx("^\\d{11}$")
-        boolVal = XMLValidatorEnum(["true", "false"])
-        super().__init__(
-            childrenNames=(
-                ("Oib", [oibVal, XMLValidatorRequired()]),
-                ("USustPdv", [boolVal, XMLValidatorRequired()]),
-                ("DatVrijeme", [
-                    XMLValidatorRegEx(
-                        "^[0-9]{2}.[0-9]{2}.[1-2][0-9]{3}T[0-9]{2}:[0-9]{2}:[0-9]{2}$"),
-                    XMLValidatorRequired()
-                ]),
-                ("OznSlijed", [XMLValidatorEnum(["P", "N"]), XMLValidatorRequired()]),
-                ("BrRac", [XMLValidatorType(BrRac), XMLValidatorRequired()]),
-                ("Pdv", [porezListVal]),
-                ("Pnp", [porezListVal]),
-                ("OstaliPor", [XMLValidatorListType(OstPorez)]),
-                ("IznosOslobPdv", [iznosVal]),
-                ("IznosMarza", [iznosVal]),
-                ("IznosNePodlOpor", [iznosVal]),
-                ("Naknade", [XMLValidatorListType(Naknada)]),
-                ("IznosUkupno", [iznosVal, XMLValidatorRequired()]),
-                ("NacinPlac", [
-                    XMLValidatorEnum(["G", "K", "C", "T", "O"]), XMLValidatorRequired()
-                ]),
-                ("OibOper", [oibVal, XMLValidatorRequired()]),
-                ("ZastKod", [XMLValidatorRegEx("^[a-f0-9]{32}$")]),
-                ("NakDost", [boolVal, XMLValidatorRequired()]),
-                ("ParagonBrRac", [XMLValidatorLen(1, 100)]),
-                ("SpecNamj", [XMLValidatorLen(1, 1000)])
-            ),
-            data=data
-        )
-        self.__dict__["key"] = key_file
-        self.__dict__["key_pass"] = key_password
-        self.__dict__["items"]["ZastKod"] = zastitni_kod(
+            if context is None:
+                if (not FiskInit.isset):
+                    raise FiskInitError(
+                        "Needed members not set or fiskpy was not initalized (see FiskInit)")
+                context = FiskInit.context
+            key_file = context.get_key()
+
+        self._key = None
+        self._zastKodInput = None
+        super().__init__(data=data)
+        self._context = context
+        self._keyPassword = key_password
+        self._key = key_file
+
+    def get_context(self):
+        """Return (FiskContext): context used for creation of this racun or None."""
+        return self._context
+
+    def _zastitniKod(self, values):
+        """Calculate ZastKod (calculation time is reported to instrumentation observers)."""
+        from fisk.utils import zastitni_kod
+
+        if Instrumentation.observers:
+            start = time.perf_counter()
+        zastKod = zastitni_kod(*values, self._key, self._keyPassword)
+        if Instrumentation.observers:
+            Instrumentation.zki_calculated(time.perf_counter() - start)
+        return zastKod
+
+    def _updateZastKod(self):
+        """
+        Calculate ZastKod if values it is calculated from were changed since last calculation.
+
+        ZastKod is memoized by tuple of its input values so it is calculated only once no matter
+        how many of them are set (or changed in BrRac element) and also changes in BrRac are
+        not missed.
+
+        Raises:
+            FiskInitError: if there is no key for ZastKod (key_password was given without
+                key_file)
+        """
+        brRac = self.BrRac
+        if brRac is None:
+            return
+        if self._key is None:
+            raise FiskInitError("Key needed for ZastKod is not set (key_file is None)")
+        values = (
             self.Oib,
             self.DatVrijeme,
-            self.BrRac.BrOznRac,
-            self.BrRac.OznPosPr,
-            self.BrRac.OznNapUr,
-            self.IznosUkupno,
-            self.__dict__["key"],
-            self.__dict__["key_pass"]
+            brRac.BrOznRac,
+            brRac.OznPosPr,
+            brRac.OznNapUr,
+            self.IznosUkupno
         )
+        if values == self._zastKodInput or None in values:
+            return
+        self._setValue("ZastKod", self._zastitniKod(values))
+        self._zastKodInput = values
+
+    def beforeGenerate(self):
+        """Calculate ZastKod (if needed) before xml reprezentation is generated."""
+        self._updateZastKod()
+
+    @property
+    def items(self):
+        """Return (dict): copy of children values by name (with calculated ZastKod)."""
+        self._updateZastKod()
+        return FiskXMLElement.items.fget(self)
+
+    def __getattr__(self, name):
+        if name == "ZastKod":
+            self._updateZastKod()
+        return FiskXMLElement.__getattr__(self, name)
 
     def __setattr__(self, name, value):
         """
-        Overiden so that it is not possible to set ZastKod and to update.
+        Overiden so that it is not possible to set ZastKod.
 
-        ZastKod is some of variables which are used to generate Zastkode are changed
+        ZastKod is calculated from other values when it is needed (see _updateZastKod)
 
         wanted to raise exception if someone want to set ZastKod but it is not possible
         because of constructor
         """
         if name != "ZastKod":
             FiskXMLElement.__setattr__(self, name, value)
-            if name in ["Oib", "DatVrijeme", "BrRac", "IznosUkupno"]:
-                if (
-                    self.Oib is not None and
-                    self.DatVrijeme is not None and
-                    self.BrRac is not None and
-                    self.IznosUkupno is not None and ("key" in self.__dict__)
-                ):
-                    self.__dict__["items"]["ZastKod"] = zastitni_kod(
-                        self.Oib,
-                        self.DatVrijeme,
-                        self.BrRac.BrOznRac,
-                        self.BrRac.OznPosPr,
-                        self.BrRac.OznNapUr,
-                        self.IznosUkupno,
-                        self.__dict__["key"],
-                        self.__dict__["key_pass"]
-                    )
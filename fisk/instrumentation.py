@@ -0,0 +1,268 @@
+from threading import Lock
+import math
+import time
+
+
+class RequestMetrics(object):
+    """
+    Measurements of one request sent with FiskXMLRequest.send (or async_send).
+
+    phases is list of (name, start, end) tuples. Start and end are perf_counter times, use
+    get_duration for phase duration or get_time_ns for wall clock time of phase start/end.
+
+    Phases:
+        serialize - generation of SOAP message
+        sign - signing of SOAP message
+        network - sending of request and reading of response
+        parse - parsing of response
+        verify - verification of response signature and IdPoruke
+    """
+
+    __slots__ = (
+        'name', 'start', 'start_ns', 'end', 'phases', 'request_size', 'response_size',
+        'connection_reused', 'retries', 'error'
+    )
+
+    def __init__(self, name):
+        """
+        Initialize.
+
+        name (str): name of request (for example RacunZahtjev)
+        """
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.end = None
+        self.phases = []
+        self.request_size = None
+        self.response_size = None
+        self.connection_reused = None  # None if it is not known
+        self.retries = 0
+        self.error = None  # exception raised while sending request
+
+    def add_phase(self, name, start, end=None):
+        """Record phase which started at start (perf_counter) and ended at end (default now)."""
+        if end is None:
+            end = time.perf_counter()
+        self.phases.append((name, start, end))
+        return end
+
+    def get_duration(self, name=None):
+        """Return (float): duration of phase in seconds (total duration of request if None)."""
+        if name is None:
+            return self.end - self.start
+        return sum(end - start for phase, start, end in self.phases if phase == name)
+
+    def get_time_ns(self, perf_time):
+        """Return (int): wall clock time (in nanoseconds) of perf_counter time."""
+        return self.start_ns + int((perf_time - self.start) * 1e9)
+
+
+class FiskObserver(object):
+    """
+    Base class for instrumentation observers.
+
+    Observers are registered with Instrumentation.add_observer. Observer methods are called in
+    thread which sent request so they should be fast and thread safe.
+    """
+
+    def on_request(self, metrics):
+        """Call when request is finished (successfully or not). metrics - RequestMetrics."""
+        pass
+
+    def on_zki(self, duration):
+        """Call when ZastKod is calculated. duration - time in seconds."""
+        pass
+
+
+class Instrumentation(object):
+    """
+    Registry of instrumentation observers.
+
+    If there are no observers requests are not measured at all.
+    """
+
+    observers = ()  # tuple so it can be read without lock
+    observers_lock = Lock()
+
+    @staticmethod
+    def add_observer(observer):
+        """Register observer (FiskObserver)."""
+        with Instrumentation.observers_lock:
+            Instrumentation.observers = Instrumentation.observers + (observer,)
+
+    @staticmethod
+    def remove_observer(observer):
+        """Unregister observer."""
+        with Instrumentation.observers_lock:
+            Instrumentation.observers = tuple(
+                o for o in Instrumentation.observers if o is not observer)
+
+    @staticmethod
+    def request_finished(metrics, error=None):
+        """Pass finished request metrics to observers."""
+        metrics.end = time.perf_counter()
+        metrics.error = error
+        for observer in Instrumentation.observers:
+            observer.on_request(metrics)
+
+    @staticmethod
+    def zki_calculated(duration):
+        """Pass ZastKod calculation time to observers."""
+        for observer in Instrumentation.observers:
+            observer.on_zki(duration)
+
+
+class Histogram(object):
+    """
+    Histogram of durations with logarithmic buckets (bucket bounds grow by 5%).
+
+    Percentiles are accurate to bucket size (5%).
+    """
+
+    growth = 1.05
+    minimum = 1e-6  # durations below 1 microsecond are counted in first bucket
+
+    def __init__(self):
+        self.buckets = dict()
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Add value to histogram."""
+        if value <= Histogram.minimum:
+            bucket = 0
+        else:
+            bucket = int(math.log(value / Histogram.minimum, Histogram.growth)) + 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """Return (float): value below which percent (0-100) of values fall (None if empty)."""
+        if self.count == 0:
+            return None
+        rank = percent / 100.0 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                upper = Histogram.minimum * Histogram.growth ** bucket
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+
+class HistogramObserver(FiskObserver):
+    """
+    Observer which collects durations of requests and its phases in memory.
+
+    Example:
+        observer = HistogramObserver()
+        Instrumentation.add_observer(observer)
+        ...
+        print(observer.summary())
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.clear()
+
+    def clear(self):
+        self.histograms = dict()
+        self.requests = 0
+        self.errors = 0
+        self.reused_connections = 0
+        self.retries = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def add(self, name, duration):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = Histogram()
+            self.histograms[name] = histogram
+        histogram.add(duration)
+
+    def on_request(self, metrics):
+        with self.lock:
+            self.requests += 1
+            if metrics.error is not None:
+                self.errors += 1
+            if metrics.connection_reused:
+                self.reused_connections += 1
+            self.retries += metrics.retries
+            self.request_bytes += metrics.request_size or 0
+            self.response_bytes += metrics.response_size or 0
+            self.add(metrics.name, metrics.get_duration())
+            for name, start, end in metrics.phases:
+                self.add(name, end - start)
+
+    def on_zki(self, duration):
+        with self.lock:
+            self.add("zki", duration)
+
+    def percentile(self, name, percent):
+        """Return (float): percentile of durations of request or phase (None if not measured)."""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            return histogram.percentile(percent) if histogram is not None else None
+
+    def summary(self):
+        """Return (dict): count, mean, p50, p99 and max for every measured request and phase."""
+        with self.lock:
+            return {
+                name: {
+                    "count": histogram.count,
+                    "mean": histogram.sum / histogram.count,
+                    "p50": histogram.percentile(50),
+                    "p99": histogram.percentile(99),
+                    "max": histogram.max
+                }
+                for name, histogram in self.histograms.items()
+            }
+
+    def reset(self):
+        """Remove all collected values."""
+        with self.lock:
+            self.clear()
+
+
+class TracingObserver(FiskObserver):
+    """
+    Observer which reports requests as OpenTelemetry spans.
+
+    tracer - OpenTelemetry tracer (opentelemetry.trace.get_tracer(...)). Request is reported
+        as span with child span for every phase (opentelemetry is not dependency of fiskpy)
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def on_request(self, metrics):
+        from opentelemetry import trace
+
+        span = self.tracer.start_span(
+            "fisk." + metrics.name, start_time=metrics.start_ns,
+            attributes={
+                "fisk.request_size": metrics.request_size or 0,
+                "fisk.response_size": metrics.response_size or 0,
+                "fisk.retries": metrics.retries
+            }
+        )
+        if metrics.connection_reused is not None:
+            span.set_attribute("fisk.connection_reused", metrics.connection_reused)
+        context = trace.set_span_in_context(span)
+        for name, start, end in metrics.phases:
+            child = self.tracer.start_span(
+                "fisk." + name, context=context, start_time=metrics.get_time_ns(start))
+            child.end(end_time=metrics.get_time_ns(end))
+        if metrics.error is not None:
+            span.record_exception(metrics.error)
+            span.set_status(trace.Status(trace.StatusCode.ERROR, str(metrics.error)))
+        span.end(end_time=metrics.get_time_ns(metrics.end))
@@ -0,0 +1,340 @@
+from concurrent.futures import ThreadPoolExecutor
+from fisk import FiskInit, FiskInitError
+from fisk.deadline import Deadline
+from fisk.request import RacunZahtjev
+from fisk.response import FiskResponse
+from threading import Condition, Event, Lock, Thread
+from uuid import uuid4
+import json
+import os
+import time
+
+
+class OfflineJournalError(Exception):
+    """Exception used in OfflineJournal and OfflineQueue classes as indicator of some error."""
+
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class OfflineJournal(object):
+    """
+    Durable append-only journal of signed requests waiting to be sent.
+
+    Every record is one json line. Records are written to file immediately, but file is synced
+    to disk (fsync) by background thread in batches (group commit) so many appends can share
+    one fsync. append method returns only after its record is synced.
+
+    Record types:
+        {"op": "add", "id": ..., "message": ..., ...} - new signed request
+        {"op": "done", "id": ..., "jir": ...} - request was accepted by server
+        {"op": "failed", "id": ..., "errors": [...]} - request was rejected by server
+    """
+
+    def __init__(self, path, sync_interval=0.01):
+        """
+        Open journal (file is created if it does not exist).
+
+        path (str): path to journal file
+        sync_interval (float): maximum time (in seconds) flusher waits to collect more records
+            for one fsync
+        """
+        self.path = path
+        self.sync_interval = sync_interval
+        self.entries = dict()
+        self.results = dict()
+        self.lock = Lock()
+        self.synced = Condition(self.lock)
+        self.written_seq = 0
+        self.synced_seq = 0
+        self.error = None
+        self.load()
+        self.file = open(path, "ab")
+        self.closing = False
+        self.flusher = Thread(target=self.flush_loop, name="fisk-journal-flusher", daemon=True)
+        self.flusher.start()
+
+    def load(self):
+        """
+        Read existing journal and collect entries which are not finished.
+
+        Record which was not completely written before crash (last line without newline) is
+        removed from file, so records appended later start on new line.
+
+        Raises:
+            OfflineJournalError: if complete record can not be read (journal is corrupted)
+        """
+        if not os.path.exists(self.path):
+            return
+        complete = 0  # end of last complete line
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if not isinstance(record, dict) or "op" not in record or "id" not in record:
+                    raise OfflineJournalError(
+                        "Corrupted record at offset {} of journal {}".format(complete, self.path))
+                complete += len(line)
+                self.apply(record)
+        if os.path.getsize(self.path) > complete:
+            with open(self.path, "r+b") as f:
+                f.truncate(complete)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def apply(self, record):
+        """Apply record to journal state."""
+        if record["op"] == "add":
+            self.entries[record["id"]] = record
+        elif record["op"] in ("done", "failed"):
+            self.entries.pop(record["id"], None)
+            self.results[record["id"]] = record
+
+    def append(self, record):
+        """Write record to journal and wait until it is synced to disk."""
+        line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self.lock:
+            if self.closing:
+                raise OfflineJournalError("Journal is closed")
+            self.file.write(line)
+            self.written_seq += 1
+            seq = self.written_seq
+            self.apply(record)
+            self.synced.notify_all()
+            while self.synced_seq < seq and self.error is None:
+                self.synced.wait()
+            if self.error is not None:
+                raise OfflineJournalError("Journal sync failed: " + str(self.error))
+
+    def flush_loop(self):
+        """Sync written records to disk in batches (runs in flusher thread)."""
+        while True:
+            with self.lock:
+                while self.written_seq == self.synced_seq and not self.closing:
+                    self.synced.wait()
+                if self.written_seq == self.synced_seq and self.closing:
+                    return
+            # let other writers join this sync
+            time.sleep(self.sync_interval)
+            with self.lock:
+                seq = self.written_seq
+                try:
+                    self.file.flush()
+                    os.fsync(self.file.fileno())
+                except OSError as e:
+                    self.error = e
+                self.synced_seq = seq
+                self.synced.notify_all()
+
+    def pending(self):
+        """Return (list): records of requests which are not finished (in journal order)."""
+        with self.lock:
+            return list(self.entries.values())
+
+    def get_result(self, entry_id):
+        """Return (dict): done or failed record for entry or None if entry is not finished."""
+        with self.lock:
+            return self.results.get(entry_id)
+
+    def compact(self):
+        """
+        Rewrite journal so it holds only unfinished entries and results of finished entries.
+
+        Signed messages of finished entries are removed, their done and failed records (JIR or
+        errors) are kept so get_result still knows them.
+        """
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for records in (self.results.values(), self.entries.values()):
+                    for record in records:
+                        f.write(
+                            json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.file.close()
+            self.file = open(self.path, "ab")
+
+    def close(self):
+        """Sync remaining records and close journal."""
+        with self.lock:
+            self.closing = True
+            self.synced.notify_all()
+        self.flusher.join()
+        with self.lock:
+            self.file.close()
+
+
+class OfflineQueue(object):
+    """
+    Durable queue of racuni which could not be fiscalized (CIS is unreachable).
+
+    Racun is enqueued with NakDost set to "true", signed request (with already calculated
+    ZastKod) is written to OfflineJournal and replay worker sends it to server later with
+    exponential backoff. JIR of every entry is recorded in journal.
+
+    After crash queue is opened from same journal and unfinished entries are sent again. If
+    crash happened after request was sent but before JIR was recorded same signed message
+    (same IdPoruke and ZastKod) is sent again, so receipt is never duplicated or lost.
+    """
+
+    def __init__(
+        self, path, context=None, workers=4, backoff=1.0, max_backoff=300.0, on_result=None,
+        sync_interval=0.01, timeout=30.0
+    ):
+        """
+        Initialize.
+
+        path (str): path to journal file
+        context (FiskContext): fiscalization context. If None default context set by FiskInit
+            is used
+        workers (int): number of requests sent to server concurrently by replay worker
+        backoff (float): first retry delay in seconds. Delay is doubled after every failure
+        max_backoff (float): maximum retry delay in seconds
+        on_result (callable): called as on_result(entry_id, jir, errors) when entry is finished
+        sync_interval (float): see OfflineJournal
+        timeout (float): time budget (in seconds) of one send of entry (see Deadline). Entry
+            which is not sent in time is retried later. None means no timeout
+        """
+        if context is None:
+            if not FiskInit.isset:
+                raise FiskInitError(
+                    "Needed members not set or fiskpy was not initalized (see FiskInit)")
+            context = FiskInit.context
+        self.context = context
+        self.journal = OfflineJournal(path, sync_interval)
+        self.workers = workers
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_result = on_result
+        self.timeout = timeout
+        self.lock = Lock()
+        self.in_flight = set()
+        self.attempts = dict()
+        self.next_attempt = dict()
+        self.wakeup = Event()
+        self.stopping = Event()
+        self.worker = None
+
+    def enqueue(self, racun):
+        """
+        Sign racun and write it to journal.
+
+        returns (str) entry id. When method returns entry is safely stored on disk.
+        """
+        racun.NakDost = "true"
+        zahtjev = RacunZahtjev(racun, self.context)
+        message = zahtjev.prepare_message(self.context.signer)
+        entry_id = str(uuid4())
+        self.journal.append({
+            "op": "add",
+            "id": entry_id,
+            "idPoruke": zahtjev.get_id_msg(),
+            "zki": racun.ZastKod,
+            "time": time.time(),
+            "message": message.decode("utf-8")
+        })
+        self.wakeup.set()
+        return entry_id
+
+    def get_jir(self, entry_id):
+        """Return JIR of entry, False if server rejected it or None if it is not sent yet."""
+        result = self.journal.get_result(entry_id)
+        if result is None:
+            return None
+        return result.get("jir", False)
+
+    def pending(self):
+        """Return (int): number of entries not finished yet."""
+        return len(self.journal.pending())
+
+    def send_entry(self, entry):
+        """Send one journal entry to server and record result."""
+        entry_id = entry["id"]
+        try:
+            try:
+                reply = self.context.client.send_response(
+                    entry["message"].encode("utf-8"), deadline=Deadline.start(self.timeout))
+                jir, errors = self.read_reply(reply, entry["idPoruke"])
+                if jir:
+                    self.journal.append({"op": "done", "id": entry_id, "jir": jir})
+                else:
+                    self.journal.append({"op": "failed", "id": entry_id, "errors": errors})
+            except Exception:
+                with self.lock:
+                    attempts = self.attempts.get(entry_id, 0) + 1
+                    self.attempts[entry_id] = attempts
+                    delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+                    self.next_attempt[entry_id] = time.monotonic() + delay
+                return
+            with self.lock:
+                self.attempts.pop(entry_id, None)
+                self.next_attempt.pop(entry_id, None)
+        finally:
+            with self.lock:
+                self.in_flight.discard(entry_id)
+            self.wakeup.set()
+        if self.on_result is not None:
+            self.on_result(entry_id, jir, errors)
+
+    def read_reply(self, reply, id_poruke):
+        """
+        Verify server reply (FiskResponse) and return JIR and errors.
+
+        Raises:
+            OfflineJournalError: if reply can not be verified or it is not reply to sent message
+        """
+        verifier = self.context.verifier
+        if verifier is not None and reply.has_signature:
+            verified_reply = verifier.verifiyXML(reply.root)
+            if verified_reply is None:
+                raise OfflineJournalError("Reply signature could not be verified")
+            reply = FiskResponse.fromElement(verified_reply)
+        if reply.id_poruke != id_poruke:
+            raise OfflineJournalError("Reply is not reply to sent message")
+        return reply.jir, reply.errors
+
+    def replay_loop(self):
+        """Send pending entries to server (runs in replay worker thread)."""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while not self.stopping.is_set():
+                self.wakeup.clear()
+                now = time.monotonic()
+                next_wakeup = None
+                for entry in self.journal.pending():
+                    entry_id = entry["id"]
+                    with self.lock:
+                        if entry_id in self.in_flight or len(self.in_flight) >= self.workers:
+                            continue
+                        when = self.next_attempt.get(entry_id, 0)
+                        if when > now:
+                            if next_wakeup is None or when < next_wakeup:
+                                next_wakeup = when
+                            continue
+                        self.in_flight.add(entry_id)
+                    executor.submit(self.send_entry, entry)
+                timeout = 1.0 if next_wakeup is None else max(0.0, next_wakeup - now)
+                self.wakeup.wait(min(timeout, 1.0))
+
+    def start(self):
+        """Start replay worker (background thread)."""
+        if self.worker is None:
+            self.stopping.clear()
+            self.worker = Thread(target=self.replay_loop, name="fisk-offline-replay", daemon=True)
+            self.worker.start()
+
+    def stop(self):
+        """Stop replay worker and close journal."""
+        if self.worker is not None:
+            self.stopping.set()
+            self.wakeup.set()
+            self.worker.join()
+            self.worker = None
+        self.journal.close()
@@ -1,11 +1,14 @@
 from datetime import datetime
 from fisk import FiskInit, FiskSOAPMessage
-from fisk.client import FiskSOAPClientDemo
+from fisk.deadline import Deadline
 from fisk.elements import PoslovniProstor, Racun, Zaglavlje
-from fisk.signer import Signer
+from fisk.instrumentation import Instrumentation, RequestMetrics
+from fisk.response import FiskResponse, parse_xml
 from fisk.validator import XMLValidatorLen, XMLValidatorRequired, XMLValidatorType
 from fisk.xml import FiskXMLElement
 from lxml import etree as et
+from threading import Event, Lock
+import time
 
 
 class FiskXMLRequest(FiskXMLElement):
@@ -15,10 +18,19 @@ class FiskXMLRequest(FiskXMLElement):
     it knows how to send request to srever using send
     """
 
-    def __init__(self, childrenNames=None, text=None, data=None, name=None):
+    def __init__(self, childrenNames=None, text=None, data=None, name=None, context=None):
+        """
+        Initialize.
+
+        context (FiskContext): fiscalization context used for sending this request. If None
+            default context set by FiskInit is used
+        """
         super().__init__(childrenNames, text, data)
+        self.__dict__['context'] = context
         self.__dict__['lastRequest'] = None
+        self.__dict__['lastRequestXML'] = None
         self.__dict__['lastResponse'] = None
+        self.__dict__['response'] = None
         self.__dict__['idPoruke'] = None
         self.__dict__['dateTime'] = None
         self.__dict__['lastError'] = None
@@ -28,22 +40,112 @@ class FiskXMLRequest(FiskXMLElement):
         message = FiskSOAPMessage(self)
         return message.getSOAPMessage()
 
-    def send(self):
-        """Send SOAP request to server."""
-        cl = None
-        verifier = None
-        signer = None
-        signxmlNS = "{http://www.w3.org/2000/09/xmldsig#}"
-        apisNS = "{http://www.apis-it.hr/fin/2012/types/f73}"
-
-        if FiskInit.isset:
-            cl = FiskInit.environment
-            signer = FiskInit.signer
-            verifier = FiskInit.verifier
-        else:
-            cl = FiskSOAPClientDemo()
-
-        self.__dict__['lastRequest'] = self.getSOAPMessage()
+    def send(self, deadline=None):
+        """
+        Send SOAP request to server.
+
+        If there are instrumentation observers (see fisk.instrumentation) request phases are
+        measured and reported to them
+
+        deadline - fisk.deadline.Deadline of request. If None there is no timeout
+
+        Raises:
+            FiskSOAPClientTimeout: if request is not finished before deadline
+            FiskSOAPClientUnavailable: if circuit breaker of server is open (request is not
+                even signed)
+        """
+        cl, signer, verifier = self.get_environment()
+        if cl.breaker is not None:
+            cl.breaker.check()
+        if not Instrumentation.observers:
+            message = self.prepare_message(signer)
+            if deadline is None:
+                reply = cl.send_response(message)
+            else:
+                deadline.check("sign")
+                reply = cl.send_response(message, deadline=deadline)
+            return self.accept_reply(reply, verifier, deadline=deadline)
+
+        metrics = RequestMetrics(self.getName())
+        try:
+            message = self.prepare_message(signer, metrics)
+            if deadline is None:
+                reply = cl.send_response(message, metrics=metrics)
+            else:
+                deadline.check("sign")
+                reply = cl.send_response(message, metrics=metrics, deadline=deadline)
+            reply = self.accept_reply(reply, verifier, metrics, deadline)
+        except Exception as e:
+            Instrumentation.request_finished(metrics, e)
+            raise
+        Instrumentation.request_finished(metrics)
+        return reply
+
+    async def async_send(self, client=None, timeout=None):
+        """
+        Send SOAP request to server using asyncio client.
+
+        client - AsyncFiskSOAPClient. If None asyncio client for environment set in FiskInit
+            (or DEMO) is used
+        timeout - timeout (in seconds) or fisk.deadline.Deadline for this request
+        """
+        from fisk.aioclient import AsyncFiskSOAPClient
+
+        cl, signer, verifier = self.get_environment()
+        deadline = timeout if isinstance(timeout, Deadline) else None
+        if client is None:
+            client = AsyncFiskSOAPClient.for_client(cl)
+        if client.breaker is not None:
+            client.breaker.check()
+        if not Instrumentation.observers:
+            message = self.prepare_message(signer)
+            if isinstance(timeout, Deadline):
+                timeout.check("sign")
+            reply = await client.send_response(message, timeout=timeout)
+            return self.accept_reply(reply, verifier, deadline=deadline)
+
+        metrics = RequestMetrics(self.getName())
+        try:
+            message = self.prepare_message(signer, metrics)
+            if isinstance(timeout, Deadline):
+                timeout.check("sign")
+            reply = await client.send_response(message, timeout=timeout, metrics=metrics)
+            reply = self.accept_reply(reply, verifier, metrics, deadline)
+        except Exception as e:
+            Instrumentation.request_finished(metrics, e)
+            raise
+        Instrumentation.request_finished(metrics)
+        return reply
+
+    def get_context(self):
+        """Return (FiskContext): context used by this request or None if there is none."""
+        if self.__dict__['context'] is not None:
+            return self.__dict__['context']
+        return FiskInit.context
+
+    def get_environment(self):
+        """Return client, signer and verifier of request context (or DEMO client only)."""
+        context = self.get_context()
+        if context is not None:
+            return context.client, context.signer, context.verifier
+        from fisk.client import FiskSOAPClientDemo
+
+        return FiskSOAPClientDemo(), None, None
+
+    def prepare_message(self, signer, metrics=None):
+        """
+        Generate SOAP message of this request and sign it if signer is supplied.
+
+        metrics - RequestMetrics in which serialize and sign phases are recorded (optional)
+        """
+        self.__dict__['lastError'] = list()
+        if metrics is not None:
+            start = time.perf_counter()
+        message = FiskSOAPMessage.serialize(self)
+        if metrics is not None:
+            start = metrics.add_phase("serialize", start)
+        self.__dict__['lastRequest'] = None
+        self.__dict__['lastRequestXML'] = message
         # rememer generated IdPoruke nedded for return message check
         self.__dict__['idPoruke'] = None
         self.__dict__['dateTime'] = None
@@ -54,52 +156,123 @@ class FiskXMLRequest(FiskXMLElement):
         except NameError:
             pass
 
-        message = et.tostring(self.__dict__['lastRequest'])
-
-        if signer is not None and isinstance(signer, Signer):
-            message = signer.signXML(self.__dict__['lastRequest'], self.getElementName())
-
-        reply = cl.send(message)
-        has_signature = False
-        verified_reply = None
-        if reply.find(".//" + signxmlNS + "Signature") is not None:
-            has_signature = True
-        if has_signature is True and verifier is not None:
-            verified_reply = verifier.verifiyXML(reply)
-        else:
-            verified_reply = reply
-
-        if self.__dict__['idPoruke'] is not None and verified_reply is not None:
-            retIdPoruke = None
-            idPorukeE = verified_reply.find(".//" + apisNS + "IdPoruke")
-            if idPorukeE is not None:
-                retIdPoruke = idPorukeE.text
-            if self.__dict__['idPoruke'] != retIdPoruke:
-                verified_reply = None
-        self.__dict__['lastResponse'] = verified_reply
-        return verified_reply
+        if signer is not None:
+            from fisk.signer import Signer
+
+            if isinstance(signer, Signer):
+                message = signer.signMessage(message, self.getElementName())
+                self.__dict__['lastRequestXML'] = message
+                if metrics is not None:
+                    metrics.add_phase("sign", start)
+        return message
+
+    def accept_reply(self, reply, verifier, metrics=None, deadline=None):
+        """
+        Verify server reply and check is it reply to last sent message.
+
+        reply - FiskResponse (or ElementTree object) with server response message
+        verifier - Verifier or fisk.deferred.DeferredVerifier (reply is then verified in
+            background and its values are used immediately). If None reply is not verified
+        metrics - RequestMetrics in which verify phase is recorded (optional)
+        deadline - Deadline of request. If None there is no timeout
+
+        returns verified response message (ElementTree object) or None
+
+        Raises:
+            FiskSOAPClientTimeout: if deadline is exceeded before or during verification
+        """
+        if metrics is not None:
+            start = time.perf_counter()
+        if not isinstance(reply, FiskResponse):
+            reply = FiskResponse.fromElement(reply)
+        response = reply
+        deferred = False
+        if reply.has_signature and verifier is not None:
+            from fisk.deferred import DeferredVerifier
+
+            if deadline is not None:
+                deadline.check("verify")
+            if isinstance(verifier, DeferredVerifier):
+                # reply values are used now, reply is verified in background
+                deferred = True
+            else:
+                verified_reply = verifier.verifiyXML(reply.root)
+                # use only values from signed part of reply
+                response = FiskResponse.fromElement(verified_reply) \
+                    if verified_reply is not None else None
+                if deadline is not None:
+                    deadline.check("verify")
+
+        if self.__dict__['idPoruke'] is not None and response is not None:
+            if self.__dict__['idPoruke'] != response.id_poruke:
+                response = None
+        if deferred and response is not None:
+            verifier.submit(response, self.getName(), self.__dict__['idPoruke'])
+        self.__dict__['response'] = response
+        self.__dict__['lastResponse'] = response.root if response is not None else None
+        if metrics is not None:
+            metrics.add_phase("verify", start)
+        return self.__dict__['lastResponse']
 
     def get_last_request(self):
         """Return last SOAP message sent to server as ElementTree object."""
+        if self.__dict__['lastRequest'] is None and self.__dict__['lastRequestXML'] is not None:
+            self.__dict__['lastRequest'] = parse_xml(self.__dict__['lastRequestXML'])
         return self.__dict__['lastRequest']
 
     def get_last_response(self):
         """Return last SOAP message received from server as ElementTree object."""
         return self.__dict__['lastResponse']
 
+    def get_response(self):
+        """Return (FiskResponse): last decoded server response or None."""
+        return self.__dict__['response']
+
     def get_last_error(self):
         """Return last error which was recieved from PU serever."""
         return self.__dict__['lastError']
 
-    def execute(self):
+    def execute(self, timeout=None):
         """
         Return reply from server or False.
 
         If false you can check what was error with get_last_error method
 
-        In this class this method does nothing as this is base class for other requests
+        Request is sent and reply is interpreted by read_response method
+
+        timeout - overall time budget (in seconds) of request or fisk.deadline.Deadline (to set
+            also connect and verify budget). Budget starts when execute is called (or when
+            Deadline is created). If None (default) there is no timeout
+
+        Raises:
+            FiskSOAPClientTimeout: if request is not finished in time. For RacunZahtjev
+                racun should then be issued without JIR (NakDost) and sent later
         """
         self.__dict__['lastError'] = list()
+        self.send(Deadline.start(timeout))
+        return self.read_response()
+
+    async def async_execute(self, client=None, timeout=None):
+        """
+        Asyncio version of execute method.
+
+        client - AsyncFiskSOAPClient. If None asyncio client for environment set in FiskInit
+            (or DEMO) is used
+        timeout - timeout (in seconds) or fisk.deadline.Deadline for this request. Timeout in
+            seconds is split across request phases in same way as in execute (if None
+            default timeout of client is used)
+        """
+        timeout = Deadline.start(timeout)
+        self.__dict__['lastError'] = list()
+        await self.async_send(client, timeout)
+        return self.read_response()
+
+    def read_response(self):
+        """
+        Interpret last response from server.
+
+        In this class this method does nothing as this is base class for other requests
+        """
         self.__dict__['lastError'].append(
             "Class " + self.__class__.__name__ + "did not implement execute method")
         return False
@@ -120,42 +293,156 @@ class EchoRequest(FiskXMLRequest):
     This element is capable to send Echo SOAP message to server
     """
 
-    def __init__(self, text=None):
+    childrenNames = (
+        ("text", [XMLValidatorLen(1, 1000), XMLValidatorRequired()]),
+    )
+
+    def __init__(self, text=None, context=None):
         """
         Init.
 
         creates Echo Request with message defined in text. Althought there is no string limit
         defined in specification I have put that text should be between 1-1000 chars
         """
-        super().__init__(
-            text=text,
-            childrenNames=(
-                ("text", [XMLValidatorLen(1, 1000), XMLValidatorRequired()]),
-            )
-        )
+        super().__init__(text=text, context=context)
 
-    def execute(self):
+    def read_response(self):
         """
-        Send echo request to server and returns echo reply.
+        Return echo reply from last response (used by execute and async_execute).
 
         If error occures returns False. You can get last error with get_last_error method
         """
-        self.__dict__['lastError'] = list()
         reply = False
+        response = self.__dict__['response']
 
-        self.send()
-        if isinstance(self.__dict__['lastResponse'], et._Element):
-            for relement in self.__dict__['lastResponse'].iter(
-                    self.__dict__['namespace'] + "EchoResponse"):
-                reply = relement.text
+        if response is not None:
+            reply = response.echo
 
             if reply is False:
-                for relement in self.__dict__['lastResponse'].iter(
-                        self.__dict__['namespace'] + "PorukaGreske"):
-                    self.__dict__['lastError'].append(relement.text)
+                self.__dict__['lastError'].extend(response.errors)
 
         return reply
 
+    @staticmethod
+    def health_check(cache_window=1.0, context=None, timeout=None):
+        """
+        Return (boolean): True if server is available (it replied to echo message).
+
+        Lightweight check for liveness probes. Echo message is serialized only once, it is
+        sent over pooled connection and result is shared by all checks (from all threads) made
+        in cache_window seconds, so concurrent probes send only one request (see
+        EchoHealthCheck).
+
+        context (FiskContext): context whose client is checked. If None client of default
+            context set by FiskInit (or DEMO client) is used
+        timeout (float): time (in seconds) after which server which did not reply is
+            unavailable. If None default of EchoHealthCheck is used
+        """
+        from fisk.client import FiskSOAPClientDemo
+
+        if context is None:
+            context = FiskInit.context
+        client = context.client if context is not None else FiskSOAPClientDemo()
+        return EchoHealthCheck.for_client(client).check(cache_window, timeout)
+
+
+class EchoHealthCheck(object):
+    """
+    Server availability check with pre-serialized echo message and shared results.
+
+    Only one echo request is in flight at once (other callers wait for its result) and result
+    is reused for cache_window seconds. Server which does not reply in timeout seconds is
+    unavailable.
+    """
+
+    checks = dict()  # server -> EchoHealthCheck
+    checks_lock = Lock()
+
+    def __init__(self, client, text="fiskpy health check", cache_window=1.0, timeout=5.0):
+        """
+        Initialize.
+
+        client (FiskSOAPClient): client used for sending echo message
+        text (str): echo message text
+        cache_window (float): default time (in seconds) for which result is reused
+        timeout (float): default time (in seconds) in which server has to reply
+        """
+        self.client = client
+        self.text = text
+        self.cache_window = cache_window
+        self.timeout = timeout
+        self.message = FiskSOAPMessage.serialize(EchoRequest(text))
+        self.lock = Lock()
+        self.in_flight = None
+        self.result = None
+        self.result_time = None
+        self.last_error = None
+
+    @staticmethod
+    def for_client(client):
+        """Return (EchoHealthCheck): shared health check of client server."""
+        key = (client.host, client.port, client.url, client.verify)
+        with EchoHealthCheck.checks_lock:
+            check = EchoHealthCheck.checks.get(key)
+            if check is None:
+                check = EchoHealthCheck(client)
+                EchoHealthCheck.checks[key] = check
+            return check
+
+    def check(self, cache_window=None, timeout=None):
+        """
+        Return (boolean): True if server replied to echo message.
+
+        cache_window - maximum age (in seconds) of reused result. If None default of this
+            health check is used
+        timeout - time (in seconds) in which server has to reply (also maximum time caller
+            waits for echo request sent by other caller). If None default of this health check
+            is used
+        """
+        if cache_window is None:
+            cache_window = self.cache_window
+        if timeout is None:
+            timeout = self.timeout
+        with self.lock:
+            if self.result_time is not None and \
+                    time.monotonic() - self.result_time < cache_window:
+                return self.result
+            in_flight = self.in_flight
+            if in_flight is None:
+                self.in_flight = Event()
+        if in_flight is not None:
+            if not in_flight.wait(timeout):
+                return False
+            return self.result
+
+        result = False
+        error = "Health check was interrupted"
+        finished = False
+        try:
+            try:
+                response = self.client.send_response(
+                    self.message, deadline=Deadline(timeout, verify=0))
+                result = response.echo == self.text
+                error = None
+                if not result:
+                    error = "; ".join(str(e) for e in response.errors) or \
+                        "Unexpected echo reply"
+            except Exception as e:
+                error = str(e)
+            finished = True
+        finally:
+            # waiting callers are released also if caller was interrupted (result of
+            # interrupted check is not reused)
+            with self.lock:
+                self.result = result
+                if finished:
+                    self.result_time = time.monotonic()
+                self.last_error = error
+                in_flight = self.in_flight
+                self.in_flight = None
+            in_flight.set()
+        return result
+
 
 class PoslovniProstorZahtjev(FiskXMLRequest):
     """
@@ -165,33 +452,27 @@ class PoslovniProstorZahtjev(FiskXMLRequest):
     server and veifiey server seply.
     """
 
-    def __init__(self, poslovniProstor):
-        super().__init__(
-            childrenNames=(
-                ("Zaglavlje", [XMLValidatorType(Zaglavlje)]),
-                ("PoslovniProstor", [XMLValidatorType(PoslovniProstor), XMLValidatorRequired()])
-            ),
-            data={"PoslovniProstor": poslovniProstor}
-        )
+    childrenNames = (
+        ("Zaglavlje", [XMLValidatorType(Zaglavlje), XMLValidatorRequired()]),
+        ("PoslovniProstor", [XMLValidatorType(PoslovniProstor), XMLValidatorRequired()])
+    )
+
+    def __init__(self, poslovniProstor, context=None):
+        super().__init__(data={"PoslovniProstor": poslovniProstor}, context=context)
         self.Zaglavlje = Zaglavlje()
         self.setAttr({"Id": "ppz"})
-        self.addValidator("Zaglavlje", XMLValidatorRequired())
 
-    def execute(self):
+    def read_response(self):
         """
-        Send PoslovniProstorZahtjev request to server and returns True if success.
+        Return True if PoslovniProstorZahtjev was successful (used by execute and async_execute).
 
         If error occures returns False. In that case you can check error with get_last_error
         """
-        self.__dict__['lastError'] = list()
         reply = False
+        response = self.__dict__['response']
 
-        self.send()
-
-        if isinstance(self.__dict__['lastResponse'], et._Element):
-            for element in self.__dict__['lastResponse'].iter(
-                    self.__dict__['namespace'] + "PorukaGreske"):
-                self.__dict__['lastError'].append(element.text)
+        if response is not None:
+            self.__dict__['lastError'].extend(response.errors)
             if len(self.__dict__['lastError']) == 0:
                 reply = True
 
@@ -201,38 +482,38 @@ class PoslovniProstorZahtjev(FiskXMLRequest):
 class RacunZahtjev(FiskXMLRequest):
     """RacunZahtijev element - has everything needed to send RacunZahtijev to server."""
 
-    def __init__(self, racun):
-        super().__init__(
-            childrenNames=(
-                ("Zaglavlje", [XMLValidatorType(Zaglavlje)]),
-                ("Racun", [XMLValidatorType(Racun), XMLValidatorRequired()])
-            ),
-            data={"Racun": racun}
-        )
+    childrenNames = (
+        ("Zaglavlje", [XMLValidatorType(Zaglavlje), XMLValidatorRequired()]),
+        ("Racun", [XMLValidatorType(Racun), XMLValidatorRequired()])
+    )
+
+    def __init__(self, racun, context=None):
+        """
+        Init.
+
+        context (FiskContext): if None context used for creation of racun is used
+        """
+        if context is None and isinstance(racun, Racun):
+            context = racun.get_context()
+        super().__init__(data={"Racun": racun}, context=context)
         self.Zaglavlje = Zaglavlje()
         self.setAttr({"Id": "rac"})
-        self.addValidator("Zaglavlje", XMLValidatorRequired())
 
-    def execute(self):
+    def read_response(self):
         """
-        Send RacunRequest to server.
+        Return JIR from last RacunZahtjev response (used by execute and async_execute).
 
         If seccessful returns JIR else False
         If returns False you can get errors with get_last_error method
         """
-        self.__dict__['lastError'] = list()
         reply = False
+        response = self.__dict__['response']
 
-        self.send()
-
-        if isinstance(self.__dict__['lastResponse'], et._Element):
-            for element in self.__dict__['lastResponse'].iter(self.__dict__['namespace'] + "Jir"):
-                reply = element.text
+        if response is not None:
+            reply = response.jir
 
             if reply is False:
-                for element in self.__dict__['lastResponse'].iter(
-                        self.__dict__['namespace'] + "PorukaGreske"):
-                    self.__dict__['lastError'].append(element.text)
+                self.__dict__['lastError'].extend(response.errors)
 
         return reply
 
@@ -240,38 +521,41 @@ class RacunZahtjev(FiskXMLRequest):
 class ProvjeraZahtjev(FiskXMLRequest):
     """ProvjeraZahtjev element."""
 
-    def __init__(self, racun):
-        super().__init__(
-            childrenNames=(
-                ("Zaglavlje", [XMLValidatorType(Zaglavlje)]),
-                ("Racun", [XMLValidatorType(Racun), XMLValidatorRequired()])
-            ),
-            data={"Racun": racun}
-        )
+    childrenNames = (
+        ("Zaglavlje", [XMLValidatorType(Zaglavlje), XMLValidatorRequired()]),
+        ("Racun", [XMLValidatorType(Racun), XMLValidatorRequired()])
+    )
+
+    def __init__(self, racun, context=None):
+        """
+        Init.
+
+        context (FiskContext): if None context used for creation of racun is used
+        """
+        if context is None and isinstance(racun, Racun):
+            context = racun.get_context()
+        super().__init__(data={"Racun": racun}, context=context)
         self.Zaglavlje = Zaglavlje()
         self.setAttr({"Id": "rac"})
-        self.addValidator("Zaglavlje", XMLValidatorRequired())
 
-    def execute(self):
+    def read_response(self):
         """
-        Send ProvjeraZahtjec request to server.
+        Interpret last ProvjeraZahtjev response (used by execute and async_execute).
 
         If returns False if request Racun data is not same as response Racun data,
         otherwise it returns Greske element from respnse so you can check them if they exist.
         """
-        self.__dict__['lastError'] = list()
         reply = False
+        response = self.__dict__['response']
 
-        self.send()
+        if response is not None:
+            if response.racuni:
+                racun = et.tostring(self.Racun.generate())
+                for element in response.racuni:
+                    if et.tostring(element) == racun:
+                        reply = True
 
-        if isinstance(self.__dict__['lastResponse'], et._Element):
-            for element in self.__dict__['lastResponse'].iter(self.__dict__['namespace'] + "Racun"):
-                if et.tostring(element) == et.tostring(self.Racun.generate()):
-                    reply = True
-
-            if reply is False:
-                for element in self.__dict__['lastResponse'].iter(
-                        self.__dict__['namespace'] + "Greske"):
-                    reply = element
+            if reply is False and response.greske is not None:
+                reply = response.greske
 
         return reply
@@ -0,0 +1,116 @@
+from lxml import etree as et
+from threading import local
+
+parsers = local()  # lxml parser of every thread (parser must not be used by many threads at once)
+
+
+def get_parser():
+    """
+    Return (lxml.etree.XMLParser): parser of current thread.
+
+    Parser is created once per thread and reused for all messages. It does not load DTDs,
+    resolve entities or access network, so server responses can not expand to huge documents or
+    read local files.
+    """
+    parser = getattr(parsers, "parser", None)
+    if parser is None:
+        parser = et.XMLParser(
+            resolve_entities=False, no_network=True, load_dtd=False, huge_tree=False)
+        parsers.parser = parser
+    return parser
+
+
+def parse_xml(data):
+    """Return (lxml.etree._Element): root of xml message (bytes) parsed by get_parser parser."""
+    return et.fromstring(data, get_parser())
+
+
+class FiskResponse(object):
+    """
+    Decoded server response.
+
+    All values needed by requests (SOAP fault, signature presence, IdPoruke, Jir, errors, ...)
+    are collected in one pass over response tree (iteration is filtered by tag in lxml), so
+    response tree is not searched again for every value.
+    """
+
+    __slots__ = (
+        'root', 'fault', 'has_signature', 'id_poruke', 'jir', 'echo', 'errors', 'racuni', 'greske',
+        'content'
+    )
+
+    apisNS = "{http://www.apis-it.hr/fin/2012/types/f73}"
+    signatureTag = "{http://www.w3.org/2000/09/xmldsig#}Signature"
+    tags = (
+        "{*}faultstring",
+        signatureTag,
+        apisNS + "IdPoruke",
+        apisNS + "Jir",
+        apisNS + "EchoResponse",
+        apisNS + "PorukaGreske",
+        apisNS + "Racun",
+        apisNS + "Greske"
+    )
+
+    def __init__(self, root=None):
+        """
+        Initialize empty response.
+
+        root (lxml.etree._Element): response message
+        """
+        self.root = root
+        self.fault = None  # text of SOAP faultstring
+        self.has_signature = False
+        self.id_poruke = None
+        self.jir = False  # False if response does not have Jir
+        self.echo = False  # False if response does not have EchoResponse
+        self.errors = []  # texts of PorukaGreske elements
+        self.racuni = []  # Racun elements (ProvjeraZahtjev response)
+        self.greske = None  # Greske element (ProvjeraZahtjev response)
+        self.content = None  # received message (bytes) if response was decoded by parse
+
+    def collect(self, element):
+        """Remember value of element (one of FiskResponse.tags)."""
+        tag = element.tag
+        if tag == FiskResponse.apisNS + "Jir":
+            self.jir = element.text
+        elif tag == FiskResponse.apisNS + "PorukaGreske":
+            self.errors.append(element.text)
+        elif tag == FiskResponse.apisNS + "IdPoruke":
+            if self.id_poruke is None:
+                self.id_poruke = element.text
+        elif tag == FiskResponse.signatureTag:
+            self.has_signature = True
+        elif tag == FiskResponse.apisNS + "EchoResponse":
+            self.echo = element.text
+        elif tag == FiskResponse.apisNS + "Racun":
+            self.racuni.append(element)
+        elif tag == FiskResponse.apisNS + "Greske":
+            self.greske = element
+        elif self.fault is None:
+            self.fault = element.text
+
+    @staticmethod
+    def parse(data):
+        """
+        Parse response message.
+
+        data (bytes): xml message (HTTP response body, encoding is read from xml declaration)
+
+        returns (FiskResponse) decoded response
+        """
+        response = FiskResponse.fromElement(parse_xml(data))
+        response.content = data
+        return response
+
+    @staticmethod
+    def fromElement(root):
+        """
+        Decode already parsed response message (for example verified part of response).
+
+        returns (FiskResponse) decoded response
+        """
+        response = FiskResponse(root)
+        for element in root.iter(*FiskResponse.tags):
+            response.collect(element)
+        return response
@@ -1,5 +1,14 @@
+from base64 import b64encode
+from copy import copy
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric.padding import PKCS1v15
+from cryptography.hazmat.primitives.serialization import Encoding, load_pem_private_key
+from fisk.response import parse_xml
+from hashlib import sha256
 from lxml import etree as et
 from signxml import XMLSigner, SignatureMethod, DigestAlgorithm
+from signxml.util import strip_pem_header
 
 
 class FiskXMLEleSignerError(Exception):
@@ -13,7 +22,8 @@ class Signer:
     """
     A class which implements signing of fiskal SOAP messages.
 
-    It uses signxml library for that purpose.
+    It uses signxml library for that purpose. Key and certificates are parsed only once (in
+    constructor) and same configured XMLSigner is used for all messages.
     """
 
     def __init__(self, key, password, cert):
@@ -27,9 +37,32 @@ class Signer:
         trustcerts (str): path to file vhere are CA certificates in.pem format
         """
         self.init_error = []
-        self.key = open(key).read()
         self.password = password
-        self.certificate = open(cert).read()
+        with open(key, 'rb') as f:
+            self.key = load_pem_private_key(f.read(), password.encode('utf-8'))
+        with open(cert, 'rb') as f:
+            self.certificate = x509.load_pem_x509_certificates(f.read())
+        self.xml_signer = Signer.create_xml_signer()
+
+    @staticmethod
+    def create_xml_signer():
+        """Return (signxml.XMLSigner): signer configured for fiskal messages."""
+        return XMLSigner(
+            signature_algorithm=SignatureMethod.RSA_SHA256,
+            digest_algorithm=DigestAlgorithm.SHA256,
+            c14n_algorithm="http://www.w3.org/2001/10/xml-exc-c14n#"
+        )
+
+    def copy(self):
+        """
+        Return (Signer): signer for other thread.
+
+        Copy uses same loaded key and certificates but has its own XMLSigner (signxml signer
+        keeps parser and settings in its attributes so it is not shared by threads).
+        """
+        signer = copy(self)
+        signer.xml_signer = Signer.create_xml_signer()
+        return signer
 
     def signXML(self, fiskXML, elementToSign):
         """
@@ -58,16 +91,143 @@ class Signer:
         namespace = "{http://www.w3.org/2000/09/xmldsig#}"
         et.SubElement(RequestElement, namespace + "Signature", {'Id': 'placeholder'})
 
-        signed_root = XMLSigner(
-            signature_algorithm=SignatureMethod.RSA_SHA256,
-            digest_algorithm=DigestAlgorithm.SHA256,
-            c14n_algorithm="http://www.w3.org/2001/10/xml-exc-c14n#"
-        ).sign(
+        signed_root = self.xml_signer.sign(
             root,
             key=self.key,
-            passphrase=self.password.encode('utf-8'),
             cert=self.certificate,
             reference_uri="#" + RequestElement.get("Id")
         )
 
         return et.tostring(signed_root)
+
+    def signMessage(self, message, elementToSign):
+        """
+        Sign xml message (bytes) acording to XML Signature Syntax and Processing.
+
+        returns signed xml
+        """
+        return self.signXML(parse_xml(message), elementToSign)
+
+    def sign_many(self, messages):
+        """
+        Sign many xml messages.
+
+        returns list of signed xml messages in same order as messages
+
+        messages - iterable of (fiskXML, elementToSign) tuples (see signXML)
+        """
+        return [self.signXML(fiskXML, elementToSign) for fiskXML, elementToSign in messages]
+
+
+class TemplateSigner(Signer):
+    """
+    Signer specialized for fiskal request messages.
+
+    Fiskal requests always have same signature shape: enveloped signature of one element
+    referenced by its Id attribute, RSA-SHA256, SHA256 digest and exclusive C14N. So instead of
+    building signature with signxml, only referenced element is canonicalized (by libxml2),
+    its digest is filled into already canonical SignedInfo template, SignedInfo bytes are signed
+    and Signature element (with KeyInfo prepared in constructor) is inserted into message bytes.
+    Message is not serialized again.
+
+    DigestValue and SignatureValue are same as those made by Signer (SignedInfo is same) and
+    signatures are verified by signxml XMLVerifier. Messages which do not have expected shape
+    (element to sign is not last element of message, it already has signature, ...) are signed
+    by Signer.signXML.
+    """
+
+    dsNS = "http://www.w3.org/2000/09/xmldsig#"
+    signedInfoTemplate = (
+        '<ds:SignedInfo xmlns:ds="' + dsNS + '">'
+        '<ds:CanonicalizationMethod Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#">'
+        '</ds:CanonicalizationMethod>'
+        '<ds:SignatureMethod Algorithm="http://www.w3.org/2001/04/xmldsig-more#rsa-sha256">'
+        '</ds:SignatureMethod>'
+        '<ds:Reference URI="#{uri}"><ds:Transforms>'
+        '<ds:Transform Algorithm="' + dsNS + 'enveloped-signature"></ds:Transform>'
+        '<ds:Transform Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#"></ds:Transform>'
+        '</ds:Transforms>'
+        '<ds:DigestMethod Algorithm="http://www.w3.org/2001/04/xmlenc#sha256"></ds:DigestMethod>'
+        '<ds:DigestValue>{digest}</ds:DigestValue></ds:Reference></ds:SignedInfo>'
+    )
+
+    def __init__(self, key, password, cert):
+        """Initialize (see Signer). KeyInfo element is prepared once."""
+        super().__init__(key, password, cert)
+        certificates = "".join(
+            "<ds:X509Certificate>" + strip_pem_header(certificate.public_bytes(Encoding.PEM)) +
+            "</ds:X509Certificate>"
+            for certificate in self.certificate
+        )
+        self.key_info = (
+            "<ds:KeyInfo><ds:X509Data>" + certificates + "</ds:X509Data></ds:KeyInfo>"
+        ).encode("ascii")
+        self.algorithm = hashes.SHA256()
+
+    @staticmethod
+    def escape(value):
+        """Return value escaped as attribute value in canonical XML."""
+        return value.replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;").replace(
+            "\t", "&#x9;").replace("\n", "&#xA;").replace("\r", "&#xD;")
+
+    def signature(self, element):
+        """Return (bytes): Signature element for element (which has Id attribute)."""
+        c14n = et.tostring(element, method="c14n", exclusive=True, with_comments=False)
+        digest = b64encode(sha256(c14n).digest()).decode("ascii")
+        signed_info = TemplateSigner.signedInfoTemplate.format(
+            uri=TemplateSigner.escape(element.get("Id")), digest=digest).encode("utf-8")
+        signature_value = b64encode(self.key.sign(signed_info, PKCS1v15(), self.algorithm))
+        return (
+            b'<ds:Signature xmlns:ds="' + TemplateSigner.dsNS.encode("ascii") + b'">' +
+            signed_info + b"<ds:SignatureValue>" + signature_value + b"</ds:SignatureValue>" +
+            self.key_info + b"</ds:Signature>"
+        )
+
+    @staticmethod
+    def insert_position(message, element):
+        """
+        Return (int): position of end tag of element in message or None if it is not known.
+
+        Element must have Id attribute, it must be last element (or comment) of utf-8 message
+        and it must not contain signature or element with same tag.
+        """
+        if element.get("Id") is None or \
+                element.getroottree().docinfo.encoding.upper() != "UTF-8" or \
+                next(element.iterdescendants(element.tag, "{*}Signature"), None) is not None:
+            return None
+        parent = element
+        depth = 0
+        while parent is not None:
+            if parent.getnext() is not None:
+                return None
+            parent = parent.getparent()
+            depth += 1
+        qname = et.QName(element).localname
+        if element.prefix is not None:
+            qname = element.prefix + ":" + qname
+        position = message.rfind(b"</" + qname.encode("utf-8") + b">")
+        # only end tags of element and its ancestors can follow
+        if position < 0 or message.count(b"<", position) != depth:
+            return None
+        return position
+
+    def signXML(self, fiskXML, elementToSign):
+        """
+        Sign xml template acording to XML Signature Syntax and Processing.
+
+        returns signed xml (unlike Signer.signXML, fiskXML is not changed)
+        """
+        return self.signMessage(et.tostring(fiskXML), elementToSign)
+
+    def signMessage(self, message, elementToSign):
+        """Sign xml message (bytes) and return signed xml."""
+        if self.init_error:
+            raise FiskXMLEleSignerError(self.init_error)
+        root = parse_xml(message)
+        element = next(root.iter(elementToSign), None)
+        if element is None:
+            raise FiskXMLEleSignerError("Coudl not find element to sign")
+        position = TemplateSigner.insert_position(message, element)
+        if position is None:
+            return super().signXML(root, elementToSign)
+        return message[:position] + self.signature(element) + message[position:]
@@ -0,0 +1,150 @@
+from concurrent.futures import ProcessPoolExecutor
+from fisk.response import parse_xml
+from fisk.signer import Signer
+from fisk.utils import PrivateKey, zastitni_kod_values
+from lxml import etree as et
+
+# key and signer loaded in worker process (by init_worker)
+worker_key = None
+worker_signer = None
+
+
+def init_worker(key_file, password, cert_file):
+    """Load key and signer once in every worker process."""
+    global worker_key, worker_signer
+    worker_key = PrivateKey(key_file, password)
+    worker_signer = Signer(key_file, password, cert_file)
+
+
+def worker_rsa_sign(data):
+    """Return RSA-SHA1 signature of data (see PrivateKey.sign). Runs in worker process."""
+    return worker_key.sign(data)
+
+
+def worker_zastitni_kod(rows):
+    """Return list of zastitni kod values for list of data (bytes). Runs in worker process."""
+    return zastitni_kod_values(worker_key, rows)
+
+
+def worker_sign(message, elementToSign):
+    """Return signed xml message (bytes). Runs in worker process."""
+    return worker_signer.signXML(parse_xml(message), elementToSign)
+
+
+class ProcessPoolKey(PrivateKey):
+    """
+    Private key whose signing is done by ProcessSigner worker processes.
+
+    It can be used everywhere PrivateKey is accepted (Racun, zastitni_kod, FiskContext key).
+    """
+
+    def __init__(self, pool):
+        self.filename = pool.key_file
+        self.password = pool.password
+        self.mtime = None
+        self.key = None
+        self.pool = pool
+
+    def sign(self, data):
+        """Return RSA-SHA1 signature (bytes) of data (bytes) as needed for zastitni kod."""
+        return self.pool.executor.submit(worker_rsa_sign, data).result()
+
+
+class ProcessSigner(Signer):
+    """
+    Signer which does CPU bound RSA work (XML signatures and zastitni kod) in worker processes.
+
+    Signing in worker processes is not limited by GIL so all cores can be used. Key and
+    certificate are loaded once in every worker process and only message bytes are sent to
+    workers. Signer can be used as signer of FiskContext and its private_key attribute as
+    context key (for zastitni kod), for example:
+
+        pool = ProcessSigner(key_file, password, cert_file, processes=4)
+        context = FiskContext(key_file, password, cert_file, signer=pool, key=pool.private_key)
+        ...
+        pool.close()
+    """
+
+    def __init__(self, key, password, cert, processes=None, mp_context=None):
+        """
+        Initialize.
+
+        Args:
+            key (str): path to file holding your key. This file should be in pem format
+            password (str): password for key file
+            cert (str): path to certificate file. This file should be in pem format
+            processes (int): number of worker processes. Default is number of CPUs
+            mp_context: multiprocessing context used to start workers (default is platform
+                default start method)
+        """
+        super().__init__(key, password, cert)
+        self.key_file = key
+        self.cert_file = cert
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=mp_context,
+            initializer=init_worker,
+            initargs=(key, password, cert)
+        )
+        self.private_key = ProcessPoolKey(self)
+
+    def copy(self):
+        """Return (ProcessSigner): this signer (it can be used by many threads)."""
+        return self
+
+    def signXML(self, fiskXML, elementToSign):
+        """
+        Sign xml template acording to XML Signature Syntax and Processing.
+
+        returns signed xml
+        """
+        return self.signMessage(et.tostring(fiskXML), elementToSign)
+
+    def signMessage(self, message, elementToSign):
+        """Sign xml message (bytes) and return signed xml."""
+        return self.executor.submit(worker_sign, message, elementToSign).result()
+
+    def submit(self, message, elementToSign):
+        """Start signing of xml message (bytes) and return (Future) with signed xml."""
+        return self.executor.submit(worker_sign, message, elementToSign)
+
+    def sign_many(self, messages):
+        """
+        Sign many xml messages (in parallel).
+
+        returns list of signed xml messages in same order as messages
+
+        messages - iterable of (fiskXML, elementToSign) tuples (see signXML). fiskXML can also
+            be xml message (bytes)
+        """
+        futures = [
+            self.submit(
+                fiskXML if isinstance(fiskXML, bytes) else et.tostring(fiskXML), elementToSign)
+            for fiskXML, elementToSign in messages
+        ]
+        return [future.result() for future in futures]
+
+    def zastitni_kod(self, oib, datumVrijeme, brRacuna, ozPoslovnogP, ozUredaja, ukupnoIznos):
+        """Generate Zastitni kod in worker process (see fisk.utils.zastitni_kod)."""
+        forsigning = oib + datumVrijeme + brRacuna + ozPoslovnogP + ozUredaja + ukupnoIznos
+        return self.executor.submit(worker_zastitni_kod, [forsigning.encode('utf-8')]).result()[0]
+
+    def zastitni_kod_many(self, rows, chunksize=256):
+        """
+        Generate Zastitni kod for many racuni (in parallel).
+
+        rows - iterable of (oib, datumVrijeme, brRacuna, ozPoslovnogP, ozUredaja, ukupnoIznos)
+        chunksize - number of values sent to worker process at once
+
+        returns list of zastitni kod values in same order as rows
+        """
+        data = [''.join(row).encode('utf-8') for row in rows]
+        chunks = [data[i:i + chunksize] for i in range(0, len(data), chunksize)]
+        result = []
+        for values in self.executor.map(worker_zastitni_kod, chunks):
+            result.extend(values)
+        return result
+
+    def close(self):
+        """Stop worker processes."""
+        self.executor.shutdown()
@@ -1,7 +1,95 @@
 from OpenSSL import crypto
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from hashlib import md5
+from threading import Lock
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
+import os
+
+
+class PrivateKey(object):
+    """
+    Private key loaded from pem file and ready for signing.
+
+    Key file is read and decrypted only once (in constructor) so it can be used for generation
+    of many zastitni kod values.
+    """
+
+    def __init__(self, key_filename, key_password):
+        """
+        Load and decrypt key.
+
+        Args:
+            key_filename (str): path to file holding private key in pem format
+            key_password (str): password for key
+        """
+        self.filename = key_filename
+        self.password = key_password
+        self.mtime = os.stat(key_filename).st_mtime_ns
+        with open(key_filename, 'rb') as f:
+            key = crypto.load_privatekey(
+                crypto.FILETYPE_PEM,
+                f.read(),
+                key_password.encode('utf-8')
+            )
+        self.key = key.to_cryptography_key()
+
+    def sign(self, data):
+        """Return RSA-SHA1 signature (bytes) of data (bytes) as needed for zastitni kod."""
+        return self.key.sign(data, padding.PKCS1v15(), hashes.SHA1())
+
+
+class PrivateKeyCache(object):
+    """
+    Bounded cache of loaded private keys.
+
+    Keys are cached by file path, file modification time and password so key is loaded again
+    if key file is changed on disk.
+    """
+
+    def __init__(self, maxsize=8):
+        """
+        Initialize.
+
+        Args:
+            maxsize (int): maximum number of keys held in cache
+        """
+        self.maxsize = maxsize
+        self.keys = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key_filename, key_password):
+        """Return (PrivateKey): loaded key from cache or loads it if it is not cached."""
+        path = os.path.abspath(key_filename)
+        cache_key = (path, os.stat(path).st_mtime_ns, key_password)
+        with self.lock:
+            key = self.keys.get(cache_key)
+            if key is not None:
+                self.keys.move_to_end(cache_key)
+                return key
+        key = PrivateKey(path, key_password)
+        with self.lock:
+            # forget keys loaded from older version of same file
+            for old_key in [k for k in self.keys if k[0] == path]:
+                del self.keys[old_key]
+            self.keys[cache_key] = key
+            while len(self.keys) > self.maxsize:
+                self.keys.popitem(last=False)
+        return key
+
+    def clear(self):
+        """Remove all keys from cache."""
+        with self.lock:
+            self.keys.clear()
+
+
+key_cache = PrivateKeyCache()
+
+
+def load_private_key(key_filename, key_password):
+    """Return (PrivateKey): loaded key using module key cache."""
+    return key_cache.get(key_filename, key_password)
 
 
 def zastitni_kod(
@@ -12,27 +100,107 @@ def zastitni_kod(
     ozUredaja,
     ukupnoIznos,
     key_filename,
-    key_password
+    key_password=None
 ):
     """
     Generate Zastitni kod.
 
     it is defined as member as it is likely that you would need to call it to generate this
     code without need to create all elements for sending to server
+
+    key_filename can be path to key file (key is then loaded using module key cache) or
+    already loaded PrivateKey object. In later case key_password is not needed.
     """
     forsigning = oib + datumVrijeme + brRacuna + ozPoslovnogP + ozUredaja + ukupnoIznos
 
-    with open(key_filename, 'rb') as f:
-        key = crypto.load_privatekey(
-            crypto.FILETYPE_PEM,
-            f.read(),
-            key_password.encode('utf-8')
-        )
-    private_key = key.to_cryptography_key()
-    signature = private_key.sign(
-        forsigning.encode('utf-8'),
-        padding.PKCS1v15(),
-        hashes.SHA1()
-    )
+    if isinstance(key_filename, PrivateKey):
+        private_key = key_filename
+    else:
+        private_key = load_private_key(key_filename, key_password)
+    signature = private_key.sign(forsigning.encode('utf-8'))
     signature = md5(signature).hexdigest()
     return signature
+
+
+# key loaded in worker process of zastitni_kod_many (by init_zastitni_kod_worker)
+worker_key = None
+
+
+def init_zastitni_kod_worker(key_filename, key_password):
+    """Load key once in every worker process of zastitni_kod_many."""
+    global worker_key
+    worker_key = PrivateKey(key_filename, key_password)
+
+
+def zastitni_kod_worker(rows):
+    """Return zastitni kod values for list of data (bytes). Runs in worker process."""
+    return zastitni_kod_values(worker_key, rows)
+
+
+def zastitni_kod_values(private_key, rows):
+    """Return list of zastitni kod values for list of already concatenated data (bytes)."""
+    if type(private_key) is not PrivateKey:
+        return [md5(private_key.sign(data)).hexdigest() for data in rows]
+    sign = private_key.key.sign
+    pkcs1 = padding.PKCS1v15()
+    sha1 = hashes.SHA1()
+    return [md5(sign(data, pkcs1, sha1)).hexdigest() for data in rows]
+
+
+def zastitni_kod_many(
+    oib,
+    datumVrijeme,
+    brRacuna,
+    ozPoslovnogP,
+    ozUredaja,
+    ukupnoIznos,
+    key_filename,
+    key_password=None,
+    processes=None,
+    chunksize=1024
+):
+    """
+    Generate Zastitni kod for many racuni.
+
+    Arguments are columns - sequences (lists, tuples, numpy arrays, ...) of strings with one
+    item for every racun, for example oib is list of oib values of all racuni. Key is loaded
+    only once (see zastitni_kod for key_filename and key_password, already loaded key can be
+    given as key_filename).
+
+    processes - if set, values are calculated in that many worker processes (every worker
+        loads key once). Worker processes are useful for very big inputs only. Key has to be
+        given as path or PrivateKey loaded from file
+    chunksize - number of values sent to worker process at once
+
+    returns list of zastitni kod values in same order as input
+
+    Raises:
+        TypeError: if processes are set and key can not be loaded by worker processes
+    """
+    columns = (oib, datumVrijeme, brRacuna, ozPoslovnogP, ozUredaja, ukupnoIznos)
+    if len(set(len(column) for column in columns)) > 1:
+        raise ValueError("All columns must have same length")
+    rows = [''.join(row).encode('utf-8') for row in zip(*columns)]
+
+    if isinstance(key_filename, (str, bytes, os.PathLike)):
+        private_key = load_private_key(key_filename, key_password)
+    else:
+        private_key = key_filename
+    if processes and type(private_key) is not PrivateKey:
+        raise TypeError(
+            "zastitni_kod_many with processes needs key file or PrivateKey, not " +
+            type(private_key).__name__ + " (use ProcessSigner.zastitni_kod_many for "
+            "ProcessSigner key)")
+    if not processes or len(rows) <= chunksize:
+        return zastitni_kod_values(private_key, rows)
+
+    chunks = [rows[i:i + chunksize] for i in range(0, len(rows), chunksize)]
+    result = []
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=init_zastitni_kod_worker,
+        initargs=(private_key.filename, private_key.password)
+    ) as executor:
+        for values in executor.map(zastitni_kod_worker, chunks):
+            result.extend(values)
+    return result
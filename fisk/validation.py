@@ -0,0 +1,345 @@
+from fisk.validator import (
+    XMLValidatorEnum, XMLValidatorLen, XMLValidatorListType, XMLValidatorRegEx, XMLValidatorType
+)
+from fisk.xml import XMLSchema
+from threading import Lock
+
+
+class ValidationErrors(object):
+    """
+    Violations found by SchemaValidator in columnar form.
+
+    Violation i is (rows[i], fields[i], codes[i], messages[i]):
+        row - index of row (None if violation is found in all rows, for example missing column)
+        field - path of field (for example Oib, BrRac.BrOznRac or Pdv[1].Stopa)
+        code - unknown (no such field), required (value is missing) or invalid (value is not
+            valid)
+        message - description of violation
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.fields = []
+        self.codes = []
+        self.messages = []
+
+    def add(self, row, field, code, message):
+        """Add violation."""
+        self.rows.append(row)
+        self.fields.append(field)
+        self.codes.append(code)
+        self.messages.append(message)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return zip(self.rows, self.fields, self.codes, self.messages)
+
+    def invalid_rows(self):
+        """Return (list): sorted indexes of rows with violations (without None)."""
+        return sorted(set(row for row in self.rows if row is not None))
+
+    def by_row(self):
+        """Return (dict): row -> list of (field, code, message) tuples."""
+        result = dict()
+        for row, field, code, message in self:
+            result.setdefault(row, []).append((field, code, message))
+        return result
+
+
+class FieldCheck(object):
+    """
+    Validators of one schema field compiled for fast validation of many values.
+
+    Field is simple if all its validators check string values (regex, enum and length
+    validators). Valid values of simple field are remembered (up to cache_size values) so
+    values repeated in many rows (dates, OIBs, enum values) are checked only once.
+    """
+
+    __slots__ = ('name', 'required', 'checks', 'nested', 'simple', 'valid')
+
+    cache_size = 4096
+
+    def __init__(self, name, validators, required):
+        """
+        Initialize.
+
+        name (str): field name
+        validators (list): value validators of field (XMLValidator)
+        required (boolean): True if field value is required
+        """
+        self.name = name
+        self.required = required
+        self.checks = []
+        self.nested = None  # element class of XMLValidatorType or XMLValidatorListType
+        for validator in validators:
+            if type(validator) is XMLValidatorRegEx:
+                self.checks.append(("regex", validator.regex.match, validator))
+            elif type(validator) is XMLValidatorEnum:
+                self.checks.append(("enum", frozenset(validator.values), validator))
+            elif type(validator) is XMLValidatorLen:
+                self.checks.append(("len", (validator.min, validator.max), validator))
+            elif type(validator) is XMLValidatorType:
+                self.nested = validator.type
+                self.checks.append(("type", validator.type, validator))
+            elif type(validator) is XMLValidatorListType:
+                self.nested = validator.type
+                self.checks.append(("list", validator.type, validator))
+            else:
+                self.checks.append(("validator", None, validator))
+        self.simple = all(kind in ("regex", "enum", "len") for kind, arg, validator in self.checks)
+        self.valid = set()
+
+    def is_valid(self, value):
+        """Return (boolean): True if value (not None) passes all checks of simple field."""
+        if value.__class__ is str and value in self.valid:
+            return True
+        if not isinstance(value, str):
+            return False
+        for kind, arg, validator in self.checks:
+            if kind == "regex":
+                if arg(value) is None:
+                    return False
+            elif kind == "enum":
+                if value not in arg:
+                    return False
+            elif not arg[0] <= len(value) <= arg[1]:
+                return False
+        if len(self.valid) < FieldCheck.cache_size:
+            self.valid.add(value)
+        return True
+
+
+class SchemaValidator(object):
+    """
+    Validation of plain data (dicts or columns) against schema of element class.
+
+    Same schema (childrenNames) and validators as in fisk.elements are used, but element objects
+    are not created (and ZastKod is not calculated) and all violations are reported, not just
+    first one. Nested elements (for example BrRac or Pdv items of Racun) can be given as dicts
+    or as already created elements. For example:
+
+        validator = SchemaValidator.for_class(Racun)
+        errors = validator.validate_rows(rows)  # rows - list of dicts
+        for row, field, code, message in errors:
+            ...
+
+    or for columnar data (dict of column name -> list of values, nested element values can be
+    given as columns with dotted names, for example BrRac.BrOznRac):
+
+        errors = validator.validate_columns(columns)
+    """
+
+    validators = dict()  # element class -> SchemaValidator
+    validators_lock = Lock()
+
+    def __init__(self, cls):
+        """
+        Initialize.
+
+        cls: element class (derived from XMLElement with childrenNames declared)
+        """
+        schema = XMLSchema.forClass(cls)
+        self.cls = cls
+        self.fields = dict()
+        for name in schema.order:
+            self.fields[name] = FieldCheck(
+                name, schema.validators[name], len(schema.required[name]) > 0)
+        self.required = [field for field in self.fields.values() if field.required]
+
+    @staticmethod
+    def for_class(cls):
+        """Return (SchemaValidator): shared validator for element class."""
+        validator = SchemaValidator.validators.get(cls)
+        if validator is None:
+            with SchemaValidator.validators_lock:
+                validator = SchemaValidator.validators.get(cls)
+                if validator is None:
+                    validator = SchemaValidator(cls)
+                    SchemaValidator.validators[cls] = validator
+        return validator
+
+    def nested_validator(self, field):
+        """Return (SchemaValidator): validator of nested element dicts (None if not possible)."""
+        if field.nested is None or field.nested.childrenNames is None:
+            return None
+        return SchemaValidator.for_class(field.nested)
+
+    def invalid(self, errors, row, path, value):
+        errors.add(row, path, "invalid", "Value " + str(value) + " (" + type(value).__name__ +
+                   ") is not valid for " + path + " attribute of class " + self.cls.__name__)
+
+    def required_missing(self, errors, row, path):
+        errors.add(row, path, "required",
+                   "Attribute " + path + " of class " + self.cls.__name__ + " is required!")
+
+    def unknown(self, errors, row, path):
+        errors.add(row, path, "unknown",
+                   "Class " + self.cls.__name__ + " does not have attribute with name " + path)
+
+    def validate(self, data, errors=None, row=0, path=""):
+        """
+        Validate one row of data.
+
+        data (dict): field name -> value
+        errors (ValidationErrors): violations are added to errors. If None new one is created
+        row (int): row index used in reported violations
+        path (str): prefix of field names in reported violations
+
+        returns (ValidationErrors) violations
+        """
+        if errors is None:
+            errors = ValidationErrors()
+        fields = self.fields
+        for name, value in data.items():
+            field = fields.get(name)
+            if field is None:
+                self.unknown(errors, row, path + name)
+            elif value is None:
+                continue
+            elif field.simple:
+                if not field.is_valid(value):
+                    self.invalid(errors, row, path + name, value)
+            else:
+                self.check_value(field, value, errors, row, path + name)
+        for field in self.required:
+            if data.get(field.name) is None:
+                self.required_missing(errors, row, path + field.name)
+        return errors
+
+    def validate_rows(self, rows, errors=None):
+        """
+        Validate many rows of data.
+
+        rows - iterable of dicts (see validate)
+
+        returns (ValidationErrors) violations of all rows
+        """
+        if errors is None:
+            errors = ValidationErrors()
+        validate = self.validate
+        for row, data in enumerate(rows):
+            validate(data, errors, row)
+        return errors
+
+    def check_value(self, field, value, errors, row, path):
+        """Validate not None value of field which is not simple (see FieldCheck)."""
+        for kind, arg, validator in field.checks:
+            if kind == "type":
+                nested = self.nested_validator(field)
+                if isinstance(value, dict) and nested is not None:
+                    nested.validate(value, errors, row, path + ".")
+                    continue
+                valid = validator.validate(value)
+            elif kind == "list":
+                if not isinstance(value, list):
+                    valid = False
+                else:
+                    nested = self.nested_validator(field)
+                    for index, item in enumerate(value):
+                        item_path = path + "[" + str(index) + "]"
+                        if isinstance(item, dict) and nested is not None:
+                            nested.validate(item, errors, row, item_path + ".")
+                        elif not isinstance(item, arg):
+                            self.invalid(errors, row, item_path, item)
+                    continue
+            elif kind == "validator":
+                valid = validator.validate(value)
+            else:
+                valid = value.__class__ is str and field.is_valid(value)
+            if not valid:
+                self.invalid(errors, row, path, value)
+                return
+
+    def validate_columns(self, columns, errors=None, path=""):
+        """
+        Validate columnar data.
+
+        columns (dict): column name -> list of values (all columns must have same length).
+            Values of nested element can be given as columns with dotted names (BrRac.BrOznRac)
+            or as one column of dicts (or elements)
+        errors (ValidationErrors): violations are added to errors. If None new one is created
+        path (str): prefix of field names in reported violations
+
+        returns (ValidationErrors) violations (missing required or unknown column is reported
+            once with row None)
+
+        Raises:
+            ValueError: if columns have different lengths
+        """
+        if errors is None:
+            errors = ValidationErrors()
+        if len(set(len(column) for column in columns.values())) > 1:
+            raise ValueError("All columns must have same length")
+        nested_columns = dict()
+        for name, column in columns.items():
+            if "." in name:
+                prefix, rest = name.split(".", 1)
+                nested_columns.setdefault(prefix, dict())[rest] = column
+                continue
+            field = self.fields.get(name)
+            if field is None:
+                self.unknown(errors, None, path + name)
+            else:
+                self.check_column(field, column, errors, path + name)
+        for prefix, subcolumns in nested_columns.items():
+            field = self.fields.get(prefix)
+            nested = self.nested_validator(field) if field is not None else None
+            if nested is None or field.checks[0][0] != "type" or prefix in columns:
+                self.unknown(errors, None, path + prefix)
+                continue
+            nested.validate_columns(subcolumns, errors, path + prefix + ".")
+            if field.required and all(None in column for column in subcolumns.values()):
+                # nested element is missing in rows in which all its columns are empty
+                for row, values in enumerate(zip(*subcolumns.values())):
+                    if values.count(None) == len(values):
+                        self.required_missing(errors, row, path + prefix)
+        for field in self.required:
+            if field.name not in columns and field.name not in nested_columns:
+                self.required_missing(errors, None, path + field.name)
+        return errors
+
+    def check_column(self, field, column, errors, path):
+        """Validate all values of field column."""
+        values = None
+        if field.simple:
+            try:
+                values = set(column)
+            except TypeError:  # unhashable values, they are checked one by one
+                pass
+        if values is None:
+            for row, value in enumerate(column):
+                if value is None:
+                    if field.required:
+                        self.required_missing(errors, row, path)
+                elif field.simple:
+                    if not field.is_valid(value):
+                        self.invalid(errors, row, path, value)
+                else:
+                    self.check_value(field, value, errors, row, path)
+            return
+        # every distinct value is checked only once
+        missing = field.required and None in values
+        values.discard(None)
+        invalid = set()
+        for kind, arg, validator in field.checks:
+            if kind == "regex":
+                invalid |= {
+                    value for value in values if not isinstance(value, str) or arg(value) is None}
+            elif kind == "enum":
+                invalid |= {
+                    value for value in values if not isinstance(value, str) or value not in arg}
+            else:
+                minimum, maximum = arg
+                invalid |= {
+                    value for value in values
+                    if not isinstance(value, str) or not minimum <= len(value) <= maximum
+                }
+        if missing or invalid:
+            for row, value in enumerate(column):
+                if value is None:
+                    if missing:
+                        self.required_missing(errors, row, path)
+                elif value in invalid:
+                    self.invalid(errors, row, path, value)
@@ -1,5 +1,10 @@
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
 from signxml import XMLVerifier
+from signxml.util import X509CertChainVerifier
+from threading import Lock
 import os
+import time
 
 
 class Verifier(object):
@@ -7,15 +12,24 @@ class Verifier(object):
     A class used for verification of reply messages.
 
     is uses signxml module
+
+    CA certificates (trust store) are loaded once per environment and shared by all verifiers.
+    Successful validation of server certificate chain is cached (by certificate fingerprints)
+    for cache_ttl seconds so replies signed with same certificate skip chain building.
     """
 
-    def __init__(self, production=False):
+    trust_stores = dict()  # CA file -> TrustStore
+    trust_stores_lock = Lock()
+
+    def __init__(self, production=False, cache_ttl=3600):
         """
         Initialize.
 
         Args:
             production (boolean): if False demo fiscalization environment will be used (default),
                 if True production fiscalization environment will be used
+            cache_ttl (float): time (in seconds) for which successful validation of server
+                certificate chain is cached. 0 disables caching
 
         The locations of files holding CA cerificates are hardcoded so if you need to add some
         certificate please add it to those files.
@@ -25,6 +39,22 @@ class Verifier(object):
         prodCAfile = mpath + "/prodCAfile.pem"
         if production:
             self.CAs = prodCAfile
+        self.cache_ttl = cache_ttl
+
+    def get_trust_store(self):
+        """Return (TrustStore): shared trust store for CA file of this verifier."""
+        with Verifier.trust_stores_lock:
+            trust_store = Verifier.trust_stores.get(self.CAs)
+            if trust_store is None:
+                trust_store = TrustStore(self.CAs)
+                Verifier.trust_stores[self.CAs] = trust_store
+            return trust_store
+
+    @staticmethod
+    def clear_trust_stores():
+        """Remove all loaded trust stores (for example after CA files are changed)."""
+        with Verifier.trust_stores_lock:
+            Verifier.trust_stores.clear()
 
     def verifiyXML(self, xml):
         """
@@ -36,7 +66,8 @@ class Verifier(object):
         root = xml
         rvalue = None
 
-        rvalue = WeakXMLVerifier().verify(root, ca_pem_file=self.CAs, validate_schema=False)
+        xml_verifier = WeakXMLVerifier(self.get_trust_store(), self.cache_ttl)
+        rvalue = xml_verifier.verify(root, ca_pem_file=self.CAs, validate_schema=False)
         if rvalue.signed_xml is not None:
             rvalue = rvalue.signed_xml
         else:
@@ -44,7 +75,91 @@ class Verifier(object):
         return rvalue
 
 
+class TrustStore(object):
+    """CA certificates loaded from one file and cache of validated certificate chains."""
+
+    def __init__(self, ca_pem_file):
+        """
+        Initialize.
+
+        ca_pem_file (str): path to file with CA certificates in pem format
+        """
+        with open(ca_pem_file, "rb") as pems:
+            self.store = x509.verification.Store(x509.load_pem_x509_certificates(pems.read()))
+        self.validated = dict()  # chain fingerprints -> (signing certificate, expiry time)
+        self.lock = Lock()
+
+    @staticmethod
+    def get_fingerprint(cert_chain):
+        """Return (tuple): fingerprints of all certificates in chain."""
+        return tuple(cert.fingerprint(hashes.SHA256()) for cert in cert_chain)
+
+    def get_validated(self, cert_chain):
+        """Return signing certificate if chain was validated before (and it did not expire)."""
+        fingerprint = TrustStore.get_fingerprint(cert_chain)
+        with self.lock:
+            cached = self.validated.get(fingerprint)
+            if cached is None:
+                return None
+            if cached[1] <= time.time():
+                del self.validated[fingerprint]
+                return None
+            return cached[0]
+
+    def set_validated(self, cert_chain, signing_cert, ttl):
+        """Remember validated chain for ttl seconds (but not after certificate expires)."""
+        expires = min(time.time() + ttl, signing_cert.not_valid_after_utc.timestamp())
+        with self.lock:
+            self.validated[TrustStore.get_fingerprint(cert_chain)] = (signing_cert, expires)
+
+    def clear(self):
+        """Forget all validated chains."""
+        with self.lock:
+            self.validated.clear()
+
+
+class CachedCertChainVerifier(X509CertChainVerifier):
+    """Certificate chain verifier which uses loaded trust store and its validation cache."""
+
+    def __init__(self, trust_store, ttl, **kwargs):
+        super().__init__(**kwargs)
+        self.trust_store = trust_store
+        self.ttl = ttl
+
+    @property
+    def store(self):
+        return self.trust_store.store
+
+    def verify(self, cert_chain):
+        if self.ttl > 0:
+            signing_cert = self.trust_store.get_validated(cert_chain)
+            if signing_cert is not None:
+                return signing_cert
+        signing_cert = super().verify(cert_chain)
+        if self.ttl > 0:
+            self.trust_store.set_validated(cert_chain, signing_cert, self.ttl)
+        return signing_cert
+
+
 class WeakXMLVerifier(XMLVerifier):
+    def __init__(self, trust_store=None, ttl=0):
+        super().__init__()
+        self.trust_store = trust_store
+        self.ttl = ttl
+
     def check_signature_alg_expected(self, signature):
         # Override the method to skip the check
         pass
+
+    def get_cert_chain_verifier(self, ca_pem_file, ee_policy, ca_policy):
+        chain_verifier = super().get_cert_chain_verifier(ca_pem_file, ee_policy, ca_policy)
+        if self.trust_store is None:
+            return chain_verifier
+        return CachedCertChainVerifier(
+            self.trust_store,
+            self.ttl,
+            ca_pem_file=ca_pem_file,
+            verification_time=chain_verifier.verification_time,
+            ee_policy=chain_verifier.ee_policy,
+            ca_policy=chain_verifier.ca_policy
+        )
@@ -1,5 +1,94 @@
 from fisk.validator import XMLValidator, XMLValidatorRequired
 from lxml import etree as et
+import re
+import sys
+
+
+class XMLSchema(object):
+    """
+    Schema of XMLElement - possible children (in order), their validators and required checks.
+
+    Schema declared in class (see XMLElement.childrenNames) is made only once and it is shared
+    by all instances of that class.
+    """
+
+    schemas = dict()
+
+    def __init__(self, childrenNames=None, shared=False):
+        """
+        Create schema.
+
+        childrenNames (tuple): ((name1, validators1), (name2, validators2), ...)
+        shared (boolean): True if schema is shared by many elements. Shared schema is copied
+            before it is changed by element
+        """
+        self.order = []
+        self.index = dict()
+        self.validators = dict()
+        self.required = dict()
+        self.textValidators = []
+        self.textRequired = []
+        self.shared = shared
+        if childrenNames is None:
+            childrenNames = ()
+        self.setAvailableChildren([name for name, validators in childrenNames])
+        for name, validators in childrenNames:
+            if isinstance(validators, list):
+                for validator in validators:
+                    self.addValidator(name, validator)
+            else:
+                raise TypeError("Validators has to be list of validators")
+
+    @staticmethod
+    def forClass(cls):
+        """Return (XMLSchema): shared schema declared by cls.childrenNames."""
+        schema = XMLSchema.schemas.get(cls)
+        if schema is None:
+            schema = XMLSchema(cls.childrenNames, shared=True)
+            XMLSchema.schemas[cls] = schema
+        return schema
+
+    def copy(self):
+        """Return (XMLSchema): not shared copy of this schema."""
+        schema = XMLSchema()
+        schema.order = list(self.order)
+        schema.index = dict(self.index)
+        schema.validators = {name: list(value) for name, value in self.validators.items()}
+        schema.required = {name: list(value) for name, value in self.required.items()}
+        schema.textValidators = list(self.textValidators)
+        schema.textRequired = list(self.textRequired)
+        return schema
+
+    def setAvailableChildren(self, names):
+        """Set list of possible sub elements (in context of class possible attributes)."""
+        self.order = []
+        self.index = dict()
+        self.validators = dict()
+        self.required = dict()
+        for name in names:
+            if name != "text":
+                self.index[name] = len(self.order)
+                self.order.append(name)
+                self.validators[name] = []
+                self.required[name] = []
+
+    def addValidator(self, name, validator):
+        """Add new validator to valirable (text or child)."""
+        if not isinstance(validator, XMLValidator):
+            raise TypeError("Validator has to be instance or subclass of XMLValidator")
+        if name == "text":
+            if isinstance(validator, XMLValidatorRequired):
+                self.textRequired.append(validator)
+            else:
+                self.textValidators.append(validator)
+        else:
+            if name not in self.validators:
+                raise NameError("This object does not have attribute with given value")
+            # we separate required and value checkers because they are used in different places
+            if isinstance(validator, XMLValidatorRequired):
+                self.required[name].append(validator)
+            else:
+                self.validators[name].append(validator)
 
 
 class XMLElement(object):
@@ -9,13 +98,24 @@ class XMLElement(object):
     this is usually used as base calss
 
     it uses ElementTree for xml generation
+
+    Possible children are declared once per class in childrenNames class attribute, as
+    ((name1, validators1), (name2, validators2), ...). Derived schema (XMLSchema) is shared by
+    all instances so every instance holds just its values. Values are held in list (in schema
+    order) and element state in slots, so elements are small. Derived classes which hold
+    many instances should also define __slots__.
     """
 
+    __slots__ = ('_schema', '_values', '_attributes', '_namespace', '_text', '_name')
+
+    childrenNames = None
+
     def __init__(self, childrenNames=None, namespace="", text=None, data=None, name=None):
         """
         Create XMLElement object.
 
-        childrenNames (tuple): ((name1, validators1), (name2, validators2), ...)
+        childrenNames (tuple): ((name1, validators1), (name2, validators2), ...). If None
+            (default) schema declared by class childrenNames attribute is used
         namespace (str): xml namespace used for this class element and its sub elements
         text (str): if set and if this class does not hold any attribute that this text is text
             inside xml tag
@@ -23,31 +123,15 @@ class XMLElement(object):
         name (str): if for some reason you have to use diferent name for xml tag then class name
         """
         if childrenNames is None:
-            childrenNames = ()
-        self.__dict__['items'] = dict()
-        self.__dict__['order'] = []
-        self.__dict__['attributes'] = dict()
-        self.__dict__['namespace'] = "{" + namespace + "}"
-        self.__dict__['text'] = None
-        self.__dict__['textValidators'] = []
-        self.__dict__['textRequired'] = []
-        self.__dict__['name'] = name
-        self.__dict__["validators"] = dict()
-        self.__dict__['required'] = dict()
-
-        childNames = list()
-        for element in childrenNames:
-            key, value = element
-            childNames.append(key)
-        self.setAvailableChildren(childNames)
-
-        for element in childrenNames:
-            name, validators = element
-            if isinstance(validators, list):
-                for validator in validators:
-                    self.addValidator(name, validator)
-            else:
-                raise TypeError("Validators has to be list of validators")
+            schema = XMLSchema.forClass(self.__class__)
+        else:
+            schema = XMLSchema(childrenNames)
+        object.__setattr__(self, '_schema', schema)
+        object.__setattr__(self, '_values', [None] * len(schema.order))
+        object.__setattr__(self, '_attributes', None)
+        object.__setattr__(self, '_namespace', sys.intern("{" + namespace + "}"))
+        object.__setattr__(self, '_text', None)
+        object.__setattr__(self, '_name', name)
 
         if text is not None:
             self.__setattr__("text", text)
@@ -63,25 +147,25 @@ class XMLElement(object):
             ValueError: This method also checks are all required valuesa (attributes) set.
                 If not it will raise this exception
         """
+        self.beforeGenerate()
+        schema = self._schema
+        namespace = self._namespace
         # generate xml as ElementTree
-        xml = et.Element(self.__dict__["namespace"] + self.getName(), self.__dict__['attributes'])
-        if self.__dict__['items']:
-            for key in self.__dict__['order']:
+        xml = et.Element(namespace + self.getName(), self._attributes)
+        if self._values:
+            for key, value in zip(schema.order, self._values):
                 # check if it is required
-                if key in self.__dict__['required']:
-                    validators = self.__dict__['required'][key]
-                    for validator in validators:
-                        if not validator.validate(self.__dict__['items'][key]):
-                            raise ValueError(
-                                f"Attribute {key}  of class {self.__class__.__name__} is required!"
-                            )
-                value = self.__dict__['items'][key]
+                for validator in schema.required[key]:
+                    if not validator.validate(value):
+                        raise ValueError(
+                            f"Attribute {key}  of class {self.__class__.__name__} is required!"
+                        )
                 if value is not None:
                     if isinstance(value, str):
-                        svar = et.SubElement(xml, self.__dict__["namespace"] + key)
+                        svar = et.SubElement(xml, namespace + key)
                         svar.text = value
                     elif isinstance(value, list):
-                        svar = et.SubElement(xml, self.__dict__["namespace"] + key)
+                        svar = et.SubElement(xml, namespace + key)
                         for subvalue in value:
                             if issubclass(type(subvalue), XMLElement):
                                 svar.append(subvalue.generate())
@@ -92,24 +176,42 @@ class XMLElement(object):
                                         self.__class__.__name__ + " can not generate supplied type")
         else:
             # check if it text is required
-            validators = self.__dict__['textRequired']
-            for validator in validators:
-                if not validator.validate(self.__dict__['text']):
+            for validator in schema.textRequired:
+                if not validator.validate(self._text):
                     raise ValueError(
                         "Text attribute of class " +
                         self.__class__.__name__ +
                         " is required!"
                     )
-            xml.text = self.__dict__["text"]
+            xml.text = self._text
         return xml
 
+    def beforeGenerate(self):
+        """Call before xml reprezentation is generated (override to update values)."""
+        pass
+
+    @property
+    def items(self):
+        """Return (dict): copy of children values by name."""
+        return dict(zip(self._schema.order, self._values))
+
+    @property
+    def text(self):
+        """Return (str): text of element."""
+        return self._text
+
     def __getattr__(self, name):
-        if name not in self.items:
+        # called only if name is not found as slot, property or method - so it is child name
+        if name.startswith("_"):
+            raise AttributeError(name)
+        index = self._schema.index.get(name)
+        if index is None:
             raise NameError(
                 "Class " + self.__class__.__name__ +
                 " does not have attribute with name " + name
             )
-        return self.items[name]
+        values = self._values
+        return values[index] if values else None
 
     def __setattr__(self, name, value):
         if name == "items":
@@ -117,8 +219,8 @@ class XMLElement(object):
         if name == "text":
             if isinstance(value, str):
                 if self._validateValue(name, value):
-                    self.__dict__['items'] = dict()
-                    self.__dict__['text'] = value
+                    object.__setattr__(self, '_values', [])
+                    object.__setattr__(self, '_text', value)
                 else:
                     raise ValueError(
                         "Value " +
@@ -131,14 +233,17 @@ class XMLElement(object):
                     )
             else:
                 raise TypeError("text attribute must be string")
+        elif name.startswith("_"):
+            object.__setattr__(self, name, value)
         else:
-            if name not in self.__dict__['order']:
+            index = self._schema.index.get(name)
+            if index is None:
                 raise NameError(
                     "Class " + self.__class__.__name__ +
                     " does not have attribute with name " + name
                 )
             if self._validateValue(name, value):
-                self.items[name] = value
+                self._setValue(name, value)
             else:
                 raise ValueError(
                     "Value " + str(value) + " (" + type(value).__name__ +
@@ -146,18 +251,34 @@ class XMLElement(object):
                     self.__class__.__name__
                 )
 
+    def _setValue(self, name, value):
+        """Set child value without validation."""
+        if not self._values:
+            object.__setattr__(self, '_values', [None] * len(self._schema.order))
+        self._values[self._schema.index[name]] = value
+
+    def getSchema(self):
+        """Return (XMLSchema): schema of this element."""
+        return self._schema
+
+    def setSchema(self, schema):
+        """Set new schema (XMLSchema) for this element. All values are reset."""
+        object.__setattr__(self, '_schema', schema)
+        object.__setattr__(self, '_values', [None] * len(schema.order))
+
+    def _ownSchema(self):
+        """Return schema which can be changed (shared class schema is copied first)."""
+        schema = self._schema
+        if schema.shared:
+            schema = schema.copy()
+            object.__setattr__(self, '_schema', schema)
+        return schema
+
     def setAvailableChildren(self, names):
         """Set list of possible sub elements (in context of class possible attributes)."""
-        self.__dict__['items'] = dict()
-        self.__dict__['order'] = []
-        self.__dict__['validators'] = dict()
-        self.__dict__['required'] = dict()
-        for name in names:
-            if name != "text":
-                self.__dict__['items'][name] = None
-                self.__dict__['order'].append(name)
-                self.__dict__['validators'][name] = []
-                self.__dict__['required'][name] = []
+        schema = self._ownSchema()
+        schema.setAvailableChildren(names)
+        object.__setattr__(self, '_values', [None] * len(schema.order))
 
     def setAttr(self, attrs):
         """
@@ -166,20 +287,28 @@ class XMLElement(object):
         attrs - dict with keys as attribute names and values as attribure values
         """
         if isinstance(attrs, dict):
-            self.__dict__['attributes'] = attrs
+            object.__setattr__(self, '_attributes', attrs)
+
+    def getAttr(self):
+        """Return (dict): element attributes."""
+        return self._attributes if self._attributes is not None else dict()
 
     def setNamespace(self, namespace):
         """Set new namespace for this elementa and all his children."""
-        self.__dict__["namespace"] = "{" + namespace + "}"
+        object.__setattr__(self, '_namespace', sys.intern("{" + namespace + "}"))
+
+    def getNamespace(self):
+        """Return namespace in ElementTree form ({namespace})."""
+        return self._namespace
 
     def getElementName(self):
         """Return full xml element tag name including namespace as used in ElementTree module."""
-        return self.__dict__["namespace"] + self.getName()
+        return self._namespace + self.getName()
 
     def getName(self):
         name = self.__class__.__name__
-        if self.__dict__['name'] is not None:
-            name = self.__dict__['name']
+        if self._name is not None:
+            name = self._name
         return name
 
     def addValidator(self, name, validator):
@@ -188,57 +317,40 @@ class XMLElement(object):
 
         After adding new validator this function will try to validate element
         """
+        if name != "text" and name not in self._schema.index:
+            raise NameError("This object does not have attribute with given value")
+        if not isinstance(validator, XMLValidator):
+            raise TypeError(
+                "Validator for " + name + " attribute of " +
+                self.__class__.__name__ +
+                "class has to be instance or subclass of XMLValidator"
+            )
+        self._ownSchema().addValidator(name, validator)
+        if isinstance(validator, XMLValidatorRequired):
+            return
         if name == "text":
-            if isinstance(validator, XMLValidator):
-                if isinstance(validator, XMLValidatorRequired):
-                    self.__dict__['textRequired'].append(validator)
-                else:
-                    self.__dict__["textValidators"].append(validator)
-                    if not self._validateValue(name, self.__dict__["text"]):
-                        raise ValueError(
-                            "Value " + self.__dict__["text"] + " (" +
-                            type(self.__dict__["text"]).__name__ + ") is not valid for " +
-                            name + " attribute of class " + self.__class__.__name__
-                        )
+            value = self._text
         else:
-            if name not in self.__dict__["order"]:
-                raise NameError("This object does not have attribute with given value")
-            if isinstance(validator, XMLValidator):
-                # we separate required and value checkers because they are used in different places
-                if isinstance(validator, XMLValidatorRequired):
-                    if not self.__dict__["required"][name]:
-                        self.__dict__["required"][name] = []
-                    self.__dict__["required"][name].append(validator)
-                else:
-                    if not self.__dict__["validators"][name]:
-                        self.__dict__["validators"][name] = []
-                    self.__dict__["validators"][name].append(validator)
-
-                    if not self._validateValue(name, self.__dict__["items"][name]):
-                        raise ValueError(
-                            "Value " + self.__dict__["items"][name] + " (" +
-                            type(self.__dict__["items"][name]).__name__ + ") is not valid for " +
-                            name + " attribute of class " + self.__class__.__name__
-                        )
-            else:
-                raise TypeError(
-                    "Validator for " + name + " attribute of " +
-                    self.__class__.__name__ +
-                    "class has to be instance or subclass of XMLValidator"
-                )
+            value = self.__getattr__(name)
+        if not self._validateValue(name, value):
+            raise ValueError(
+                "Value " + str(value) + " (" + type(value).__name__ + ") is not valid for " +
+                name + " attribute of class " + self.__class__.__name__
+            )
 
     def _validateValue(self, name, value):
         """Validate class attribute with avaliable validators."""
+        schema = self._schema
         if name == "text":
-            for validator in self.__dict__["textValidators"]:
+            for validator in schema.textValidators:
                 if not validator.validate(value):
                     return False
         else:
-            if name not in self.__dict__["order"]:
+            if name not in schema.validators:
                 raise NameError("This object (of class " + self.__class__.__name__ +
                                 ") does not have attribute with given value")
 
-            for validator in self.__dict__['validators'][name]:
+            for validator in schema.validators[name]:
                 if not validator.validate(value):
                     return False
         return True
@@ -247,7 +359,10 @@ class XMLElement(object):
 class FiskXMLElement(XMLElement):
     """Base element for creating fiskla xml messages."""
 
+    __slots__ = ()
+
     def __init__(self, childrenNames=None, text=None, data=None, name=None):
+        """Create fiskal element (see XMLElement)."""
         super().__init__(
             childrenNames,
             "http://www.apis-it.hr/fin/2012/types/f73",
@@ -255,3 +370,158 @@ class FiskXMLElement(XMLElement):
             data,
             name
         )
+
+
+class XMLSerializerError(Exception):
+    """Element can not be serialized by XMLSerializer (use ElementTree instead)."""
+
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class XMLSerializer(object):
+    """
+    Serialize XMLElement objects directly to xml bytes.
+
+    Output is byte identical to et.tostring(element.generate()) but ElementTree is not built.
+    Serialization plan (escaped tags of element and its children) is made once for every
+    element class and children schema and then reused.
+    """
+
+    plans = dict()
+    invalidChars = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+    @staticmethod
+    def serialize(element, scope_namespace=None):
+        """
+        Return (bytes): xml reprezentation of element.
+
+        element (XMLElement): element to serialize
+        scope_namespace (str): namespace bound to ns0 prefix in parent element (if element is
+            serialized as part of other xml)
+
+        Raises:
+            ValueError, TypeError: same as XMLElement.generate
+        """
+        out = []
+        XMLSerializer.write(element, out, scope_namespace)
+        return b"".join(out)
+
+    @staticmethod
+    def escapeText(value):
+        """Return (bytes): value escaped as xml text."""
+        if XMLSerializer.invalidChars.search(value) is not None:
+            raise ValueError(
+                "All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control "
+                "characters"
+            )
+        return value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace(
+            "\r", "&#13;").encode("ascii", "xmlcharrefreplace")
+
+    @staticmethod
+    def escapeAttribute(value):
+        """Return (bytes): value escaped as xml attribute value."""
+        if XMLSerializer.invalidChars.search(value) is not None:
+            raise ValueError(
+                "All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control "
+                "characters"
+            )
+        return value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace(
+            '"', "&quot;").replace("\n", "&#10;").replace("\r", "&#13;").replace(
+            "\t", "&#9;").encode("ascii", "xmlcharrefreplace")
+
+    @staticmethod
+    def getPlan(element):
+        """Return serialization plan for element (made on first use)."""
+        order = element._schema.order
+        plan_key = (element.__class__, element._namespace, element._name, tuple(order))
+        plan = XMLSerializer.plans.get(plan_key)
+        if plan is None:
+            namespace = element._namespace[1:-1]
+            prefix = "ns0:" if namespace else ""
+            children = []
+            for key in order:
+                tag = XMLSerializer.escapeText(prefix + key)
+                children.append((key, b"<" + tag + b">", b"</" + tag + b">", b"<" + tag + b"/>"))
+            tag = XMLSerializer.escapeText(prefix + element.getName())
+            plan = (
+                namespace,
+                b"<" + tag,
+                b' xmlns:ns0="' + XMLSerializer.escapeAttribute(namespace) + b'"',
+                b"</" + tag + b">",
+                children
+            )
+            XMLSerializer.plans[plan_key] = plan
+        return plan
+
+    @staticmethod
+    def write(element, out, scope_namespace):
+        """Append xml reprezentation of element to out (list of bytes)."""
+        element.beforeGenerate()
+        namespace, open_tag, ns_declaration, close_tag, children = XMLSerializer.getPlan(element)
+        out.append(open_tag)
+        if namespace and namespace != scope_namespace:
+            out.append(ns_declaration)
+        if element._attributes:
+            for name, value in element._attributes.items():
+                if not isinstance(name, str) or name.startswith("{"):
+                    raise XMLSerializerError("Namespaced attributes are not supported")
+                out.append(b" " + name.encode("ascii") + b'="' +
+                           XMLSerializer.escapeAttribute(value) + b'"')
+        mark = len(out)
+        out.append(b">")
+        if not namespace:
+            namespace = scope_namespace
+        values = element._values
+        if values:
+            required = element._schema.required
+            for (key, start, end, empty), value in zip(children, values):
+                # check if it is required
+                for validator in required[key]:
+                    if not validator.validate(value):
+                        raise ValueError(
+                            f"Attribute {key}  of class {element.__class__.__name__} "
+                            "is required!"
+                        )
+                if value is None:
+                    continue
+                if isinstance(value, str):
+                    if value:
+                        out.append(start)
+                        out.append(XMLSerializer.escapeText(value))
+                        out.append(end)
+                    else:
+                        out.append(start)
+                        out.append(end)
+                elif isinstance(value, list):
+                    list_mark = len(out)
+                    out.append(start)
+                    for subvalue in value:
+                        if issubclass(type(subvalue), XMLElement):
+                            XMLSerializer.write(subvalue, out, namespace)
+                    if len(out) == list_mark + 1:
+                        out[list_mark] = empty
+                    else:
+                        out.append(end)
+                elif issubclass(type(value), XMLElement) and key == value.getName():
+                    XMLSerializer.write(value, out, namespace)
+                else:
+                    raise TypeError("Generate method in class " +
+                                    element.__class__.__name__ + " can not generate supplied type")
+        else:
+            # check if it text is required
+            for validator in element._schema.textRequired:
+                if not validator.validate(element._text):
+                    raise ValueError(
+                        "Text attribute of class " +
+                        element.__class__.__name__ +
+                        " is required!"
+                    )
+            if element._text is not None:
+                out.append(XMLSerializer.escapeText(element._text))
+                out.append(close_tag)
+                return
+        if len(out) == mark + 1:
+            out[mark] = b"/>"
+        else:
+            out.append(close_tag)
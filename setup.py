@@ -33,9 +33,12 @@ setup(
         'pyOpenSSL>=20.0.0',
         'pycrypto>=2.6.1',
         'requests>=2.27.1',
-        'signxml>=2.9.0',
+        'signxml>=5.0.0',
         'pyasn1>=0.4.8'
     ],
+    extras_require={
+        'async': ['aiohttp>=3.10.0'],
+    },
     classifiers=[
         'Development Status :: 4 - Beta',
         'Environment :: Web Environment',
@@ -0,0 +1,33 @@
+"""Shared fixtures of fiskpy tests (keys, certificates and stub CIS server from benchmarks)."""
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "benchmarks"))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from fixtures import KEY_PASSWORD, create_credentials  # noqa: E402
+from stub_server import StubCISServer  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def credentials(tmp_path_factory):
+    """Return (dict): paths of generated keys and certificates (see create_credentials)."""
+    return create_credentials(str(tmp_path_factory.mktemp("credentials")))
+
+
+@pytest.fixture(scope="session")
+def key_password():
+    """Return (str): password of generated key.pem."""
+    return KEY_PASSWORD
+
+
+@pytest.fixture(scope="session")
+def stub_server(credentials):
+    """Return (StubCISServer): running local stub CIS server."""
+    server = StubCISServer(credentials["server.pem"], credentials["server.key"])
+    server.start()
+    yield server
+    server.stop()
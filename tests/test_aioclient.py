@@ -0,0 +1,97 @@
+import asyncio
+import gc
+import threading
+import warnings
+
+from fisk import FiskSOAPMessage
+from fisk.aioclient import AsyncFiskSOAPClient
+from fisk.request import EchoRequest
+
+
+def create_client(credentials, stub_server):
+    """Return (AsyncFiskSOAPClient): client of stub CIS server."""
+    return AsyncFiskSOAPClient(
+        "localhost", str(stub_server.port), "/FiskalizacijaServiceTest",
+        verify=credentials["ca.pem"], circuit_breaker=False
+    )
+
+
+async def echo(client, text):
+    """Send EchoRequest and return echo text and session used to send it."""
+    reply = await client.send_response(FiskSOAPMessage.serialize(EchoRequest(text)))
+    return reply.echo, client.get_session()
+
+
+def test_session_closed_at_event_loop_shutdown(credentials, stub_server):
+    """Session of every asyncio.run loop is closed when loop is shut down."""
+    client = create_client(credentials, stub_server)
+    sessions = []
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ResourceWarning)
+        for i in range(3):
+            text, session = asyncio.run(echo(client, "echo %d" % i))
+            assert text == "echo %d" % i
+            assert session.closed
+            sessions.append(session)
+            gc.collect()
+        asyncio.run(client.close())
+        gc.collect()
+    assert len(set(map(id, sessions))) == 3
+    assert not client.sessions
+    assert not [w for w in caught if issubclass(w.category, ResourceWarning)]
+
+
+def test_session_of_running_loop_kept_open(credentials, stub_server):
+    """Session of loop running in other thread is not closed when client is used elsewhere."""
+    client = create_client(credentials, stub_server)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        text, old_session = asyncio.run_coroutine_threadsafe(
+            echo(client, "first"), loop).result(10)
+        assert text == "first"
+
+        text, session = asyncio.run(echo(client, "second"))
+        assert text == "second"
+        assert session is not old_session
+        assert not old_session.closed
+
+        text, same_session = asyncio.run_coroutine_threadsafe(
+            echo(client, "third"), loop).result(10)
+        assert text == "third"
+        assert same_session is old_session
+        asyncio.run_coroutine_threadsafe(client.close(), loop).result(10)
+        assert old_session.closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def test_concurrent_event_loops(credentials, stub_server):
+    """Client is used by event loops running in different threads at once."""
+    client = create_client(credentials, stub_server)
+    barrier = threading.Barrier(2)
+    results = dict()
+
+    async def send_many(name):
+        barrier.wait()
+        replies = await asyncio.gather(*[echo(client, "%s %d" % (name, i)) for i in range(20)])
+        return [text for text, session in replies]
+
+    def run(name):
+        try:
+            results[name] = asyncio.run(send_many(name))
+        except BaseException as e:
+            results[name] = e
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for name in ("a", "b"):
+        assert results[name] == ["%s %d" % (name, i) for i in range(20)]
+    assert not client.sessions
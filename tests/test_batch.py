@@ -0,0 +1,55 @@
+import pytest
+
+from fisk.batch import FiskBatch
+from fisk.client import FiskSOAPClient
+from fisk.context import FiskContext
+
+from fixtures import create_racun
+
+
+@pytest.fixture(scope="module")
+def context(credentials, key_password, stub_server):
+    """Return (FiskContext): context whose client sends requests to stub CIS server."""
+    client = FiskSOAPClient(
+        "localhost", str(stub_server.port), "/FiskalizacijaServiceTest",
+        verify=credentials["ca.pem"], circuit_breaker=False
+    )
+    return FiskContext(credentials["key.pem"], key_password, credentials["cert.pem"],
+                       client=client)
+
+
+def test_batch_uses_context_client(context):
+    """Racuni of batch are sent to server of context client."""
+    batch = FiskBatch(context, workers=2, timeout=10)
+    racuni = [create_racun(None, context=context) for i in range(5)]
+
+    results = sorted(batch.execute(racuni), key=lambda result: result.index)
+
+    assert [result.index for result in results] == list(range(5))
+    for result in results:
+        assert result.exception is None
+        assert result.success
+        assert result.jir == "11111111-2222-3333-4444-555555555555"
+
+
+def test_worker_client_copies_context_client(context):
+    """Worker client has settings of context client and its own session."""
+    batch = FiskBatch(context)
+    client = batch.create_client()
+
+    assert (client.host, client.port, client.url, client.verify) == (
+        context.client.host, context.client.port, context.client.url, context.client.verify)
+    assert client.breaker is context.client.breaker
+    assert client.session is not context.client.session
+
+
+def test_worker_signer_is_copy(context):
+    """Every worker gets its own copy of context signer."""
+    batch = FiskBatch(context)
+    signer = batch.create_signer()
+
+    assert signer is not context.signer
+    assert signer.key is context.signer.key
+    assert signer.xml_signer is not context.signer.xml_signer
+    assert FiskBatch(context, signer_factory=lambda: context.signer).create_signer() is \
+        context.signer
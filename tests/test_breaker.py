@@ -0,0 +1,193 @@
+import socket
+import time
+
+import pytest
+import requests
+
+from fisk import FiskSOAPMessage
+from fisk.breaker import CircuitBreaker
+from fisk.client import FiskSOAPClient, FiskSOAPClientTimeout, FiskSOAPClientUnavailable
+from fisk.deadline import Deadline
+from fisk.request import EchoRequest
+
+
+class Clock(object):
+    """Replacement of time module with monotonic clock moved by test."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Return (Clock): clock used by CircuitBreaker."""
+    clock = Clock()
+    monkeypatch.setattr("fisk.breaker.time", clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    """Return (CircuitBreaker): breaker with recorded state changes in changes attribute."""
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0, probe_timeout=5.0)
+    breaker.changes = []
+    breaker.add_listener(lambda b, old, new: b.changes.append((old, new)))
+    return breaker
+
+
+def open_breaker(breaker):
+    """Record failures until breaker is open."""
+    for i in range(breaker.failure_threshold):
+        breaker.record_failure("error %d" % i)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_opens_after_threshold(breaker):
+    """Breaker opens after failure_threshold consecutive failures."""
+    breaker.record_failure("error")
+    breaker.record_failure("error")
+    breaker.record_success()
+    breaker.record_failure("error")
+    breaker.record_failure("error")
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.acquire() is False
+
+    breaker.record_failure("last error")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.last_error == "last error"
+    assert breaker.changes == [(CircuitBreaker.CLOSED, CircuitBreaker.OPEN)]
+
+
+def test_responses(breaker):
+    """HTTP 5xx responses which are not SOAP messages are failures."""
+    breaker.record_response(500, "Internal Server Error", "text/xml; charset=utf-8")
+    breaker.record_response(200, "OK", "text/xml")
+    assert breaker.failures == 0
+    for i in range(3):
+        breaker.record_response(503, "Service Unavailable", "text/html")
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_open_fails_fast(breaker, clock):
+    """Open breaker rejects requests until reset_timeout passes."""
+    open_breaker(breaker)
+    clock.advance(29)
+    with pytest.raises(FiskSOAPClientUnavailable, match="error 2"):
+        breaker.check()
+    with pytest.raises(FiskSOAPClientUnavailable):
+        breaker.acquire()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_single_half_open_probe(breaker, clock):
+    """After reset_timeout only first request sends probe, success closes breaker."""
+    open_breaker(breaker)
+    clock.advance(30)
+    breaker.check()
+
+    assert breaker.acquire() is True
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(FiskSOAPClientUnavailable):
+        breaker.acquire()
+    with pytest.raises(FiskSOAPClientUnavailable):
+        breaker.check()
+
+    breaker.probe_finished(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+    assert breaker.acquire() is False
+    assert breaker.changes == [
+        (CircuitBreaker.CLOSED, CircuitBreaker.OPEN),
+        (CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN),
+        (CircuitBreaker.HALF_OPEN, CircuitBreaker.CLOSED),
+    ]
+
+
+def test_failed_probe_opens_breaker(breaker, clock):
+    """Failed probe opens breaker for another reset_timeout."""
+    open_breaker(breaker)
+    clock.advance(30)
+    assert breaker.acquire() is True
+
+    with pytest.raises(FiskSOAPClientUnavailable):
+        breaker.probe_finished(False, "probe failed")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.last_error == "probe failed"
+    clock.advance(29)
+    with pytest.raises(FiskSOAPClientUnavailable):
+        breaker.acquire()
+    clock.advance(1)
+    assert breaker.acquire() is True
+
+
+def test_lost_probe_expires(breaker, clock):
+    """Half open breaker whose probe result is not reported is open after half_open_timeout."""
+    open_breaker(breaker)
+    clock.advance(30)
+    assert breaker.acquire() is True
+
+    clock.advance(breaker.half_open_timeout - 1)
+    with pytest.raises(FiskSOAPClientUnavailable):
+        breaker.check()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    clock.advance(1)
+    with pytest.raises(FiskSOAPClientUnavailable):
+        breaker.check()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.last_error == "Probe did not finish"
+    assert breaker.changes[-1] == (CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN)
+
+    clock.advance(30)
+    assert breaker.acquire() is True
+    breaker.probe_finished(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def create_client(host, port, breaker, credentials):
+    """Return (FiskSOAPClient): client of server with given breaker."""
+    return FiskSOAPClient(host, str(port), "/FiskalizacijaServiceTest",
+                          verify=credentials["ca.pem"], circuit_breaker=breaker)
+
+
+def test_client_breaker(credentials, stub_server):
+    """Client requests open breaker and probe sent to server closes it."""
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        closed_port = s.getsockname()[1]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2, probe_timeout=5.0)
+    dead_client = create_client("localhost", closed_port, breaker, credentials)
+    client = create_client("localhost", stub_server.port, breaker, credentials)
+    message = FiskSOAPMessage.serialize(EchoRequest("proba"))
+
+    for i in range(2):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            dead_client.send_response(message)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(FiskSOAPClientUnavailable):
+        client.send_response(message)
+
+    time.sleep(0.2)
+    assert client.send_response(message).echo == "proba"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_expired_deadline_is_not_failure(credentials, stub_server):
+    """Deadline exceeded before request is sent is not counted as server failure."""
+    breaker = CircuitBreaker(failure_threshold=1)
+    client = create_client("localhost", stub_server.port, breaker, credentials)
+    message = FiskSOAPMessage.serialize(EchoRequest("proba"))
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+
+    with pytest.raises(FiskSOAPClientTimeout) as raised:
+        client.send_response(message, deadline=deadline)
+    assert raised.value.phase == "connect"
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
@@ -0,0 +1,193 @@
+import socket
+import time
+
+import pytest
+
+from fisk import FiskSOAPMessage
+from fisk.client import FiskSOAPClient, FiskSOAPClientTimeout
+from fisk.context import FiskContext
+from fisk.deadline import Deadline
+from fisk.request import EchoRequest, RacunZahtjev
+from fisk.response import FiskResponse
+
+from fixtures import create_racun
+from stub_server import StubCISServer, create_reply
+
+
+class Clock(object):
+    """Replacement of time module with monotonic clock moved by test."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Return (Clock): clock used by Deadline."""
+    clock = Clock()
+    monkeypatch.setattr("fisk.deadline.time", clock)
+    return clock
+
+
+def test_network_timeouts(clock):
+    """Connect gets at most connect seconds (and half of what is left), verify time is kept."""
+    deadline = Deadline(10)
+    assert deadline.network_timeouts() == pytest.approx((3, 6))
+    clock.now += 6
+    assert deadline.network_timeouts() == pytest.approx((1.5, 1.5))
+    clock.now += 2.9
+    assert deadline.network_timeouts() == pytest.approx((0.05, 0.05))
+    clock.now += 0.2
+    with pytest.raises(FiskSOAPClientTimeout) as raised:
+        deadline.network_timeouts()
+    assert raised.value.phase == "connect"
+
+
+def test_phase_settings(clock):
+    """Connect and verify parts of budget can be set."""
+    deadline = Deadline(10, connect=1, verify=0)
+    assert deadline.network_timeouts() == pytest.approx((1, 9))
+    deadline.check("sign")
+    clock.now += 10
+    with pytest.raises(FiskSOAPClientTimeout) as raised:
+        deadline.check("sign")
+    assert raised.value.phase == "sign"
+    assert "10s" in str(raised.value)
+
+
+def test_start():
+    """Deadline.start accepts timeout in seconds, Deadline or None."""
+    deadline = Deadline(5)
+    assert Deadline.start(deadline) is deadline
+    assert Deadline.start(None) is None
+    assert Deadline.start(2).timeout == 2
+
+
+def create_client(port, credentials):
+    """Return (FiskSOAPClient): client of local server without circuit breaker."""
+    return FiskSOAPClient("localhost", str(port), "/FiskalizacijaServiceTest",
+                          verify=credentials["ca.pem"], circuit_breaker=False)
+
+
+def test_connect_phase(credentials):
+    """Server which does not accept connection exceeds deadline in connect phase."""
+    with socket.socket() as server:
+        server.bind(("localhost", 0))
+        server.listen(0)
+        port = server.getsockname()[1]
+        # fill accept queue so next connection attempt is not answered
+        pending = []
+        for i in range(4):
+            connection = socket.socket()
+            connection.setblocking(False)
+            connection.connect_ex(("localhost", port))
+            pending.append(connection)
+        time.sleep(0.1)
+        client = create_client(port, credentials)
+        try:
+            start = time.monotonic()
+            with pytest.raises(FiskSOAPClientTimeout) as raised:
+                client.send_response(FiskSOAPMessage.serialize(EchoRequest("proba")),
+                                     deadline=Deadline(1, connect=0.2))
+            assert time.monotonic() - start < 0.9
+            assert raised.value.phase == "connect"
+        finally:
+            for connection in pending:
+                connection.close()
+
+
+@pytest.fixture(scope="module")
+def slow_server(credentials):
+    """Return (StubCISServer): stub CIS server which replies after 2 seconds."""
+    server = StubCISServer(credentials["server.pem"], credentials["server.key"], delay=2)
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_read_phase(credentials, slow_server):
+    """Slow response exceeds deadline in read phase."""
+    client = create_client(slow_server.port, credentials)
+    start = time.monotonic()
+    with pytest.raises(FiskSOAPClientTimeout) as raised:
+        client.send_response(FiskSOAPMessage.serialize(EchoRequest("proba")),
+                             deadline=Deadline(0.5, verify=0))
+    assert time.monotonic() - start < 1.5
+    assert raised.value.phase == "read"
+
+
+def test_sign_phase(credentials, key_password, stub_server):
+    """Deadline exceeded before request is sent is reported in sign phase."""
+    context = FiskContext(credentials["key.pem"], key_password, credentials["cert.pem"],
+                          client=create_client(stub_server.port, credentials))
+    zahtjev = RacunZahtjev(create_racun(None, context=context), context)
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    with pytest.raises(FiskSOAPClientTimeout) as raised:
+        zahtjev.send(deadline)
+    assert raised.value.phase == "sign"
+
+
+class SlowVerifier(object):
+    """Verifier which records calls and takes delay seconds."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = 0
+
+    def verifiyXML(self, xml):
+        self.calls += 1
+        time.sleep(self.delay)
+        return xml
+
+
+@pytest.fixture(scope="module")
+def signed_reply(credentials):
+    """Return (tuple): prepared RacunZahtjev and signed reply (FiskResponse) to it."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+    with open(credentials["cis.key"], "rb") as f:
+        key = load_pem_private_key(f.read(), None)
+    with open(credentials["cis.pem"], "rb") as f:
+        certificate = x509.load_pem_x509_certificate(f.read())
+
+    def create(zahtjev):
+        message = zahtjev.prepare_message(None)
+        return FiskResponse.parse(create_reply(message, (key, certificate)))
+
+    return create
+
+
+def test_verify_phase_before_verification(credentials, key_password, signed_reply):
+    """Reply is not verified if deadline is exceeded before verification."""
+    context = FiskContext(credentials["key.pem"], key_password, credentials["cert.pem"])
+    zahtjev = RacunZahtjev(create_racun(None, context=context), context)
+    reply = signed_reply(zahtjev)
+    assert reply.has_signature
+    verifier = SlowVerifier()
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+
+    with pytest.raises(FiskSOAPClientTimeout) as raised:
+        zahtjev.accept_reply(reply, verifier, deadline=deadline)
+    assert raised.value.phase == "verify"
+    assert verifier.calls == 0
+
+
+def test_verify_phase_during_verification(credentials, key_password, signed_reply):
+    """Verification which does not finish before deadline exceeds it in verify phase."""
+    context = FiskContext(credentials["key.pem"], key_password, credentials["cert.pem"])
+    zahtjev = RacunZahtjev(create_racun(None, context=context), context)
+    reply = signed_reply(zahtjev)
+    verifier = SlowVerifier(0.2)
+
+    with pytest.raises(FiskSOAPClientTimeout) as raised:
+        zahtjev.accept_reply(reply, verifier, deadline=Deadline(0.1))
+    assert raised.value.phase == "verify"
+    assert verifier.calls == 1
+
+    assert zahtjev.accept_reply(reply, SlowVerifier(), deadline=Deadline(5)) is not None
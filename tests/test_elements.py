@@ -0,0 +1,82 @@
+import pytest
+
+import fisk.utils
+from fisk import FiskInitError, FiskSOAPMessage
+from fisk.context import FiskContext
+from fisk.elements import BrRac, Racun
+from fisk.request import RacunZahtjev
+from fisk.utils import zastitni_kod
+
+from fixtures import create_racun
+
+
+@pytest.fixture(scope="module")
+def context(credentials, key_password):
+    """Return (FiskContext): context with generated key and certificate."""
+    return FiskContext(credentials["key.pem"], key_password, credentials["cert.pem"])
+
+
+@pytest.fixture
+def sign_calls(monkeypatch):
+    """Return (list): arguments of every ZastKod calculation."""
+    calls = []
+
+    def counted_zastitni_kod(*args):
+        calls.append(args)
+        return zastitni_kod(*args)
+
+    monkeypatch.setattr(fisk.utils, "zastitni_kod", counted_zastitni_kod)
+    return calls
+
+
+def expected_zastitni_kod(racun, context):
+    """Return (str): ZastKod calculated directly from racun values."""
+    return zastitni_kod(racun.Oib, racun.DatVrijeme, racun.BrRac.BrOznRac, racun.BrRac.OznPosPr,
+                        racun.BrRac.OznNapUr, racun.IznosUkupno, context.get_key())
+
+
+def test_zastitni_kod_calculated_once(context, sign_calls):
+    """Racun ZastKod is calculated once no matter how many times it is used."""
+    racun = create_racun(None, context=context)
+    assert sign_calls == []
+
+    zastitni = racun.ZastKod
+    assert racun.ZastKod == zastitni
+    assert racun.items["ZastKod"] == zastitni
+    racun.generate()
+    zahtjev = RacunZahtjev(racun, context)
+    FiskSOAPMessage.serialize(zahtjev)
+    zahtjev.prepare_message(context.signer)
+
+    assert len(sign_calls) == 1
+    assert zastitni == expected_zastitni_kod(racun, context)
+
+
+def test_zastitni_kod_recalculated_after_change(context, sign_calls):
+    """Change of BrRac value after ZastKod was read is not missed."""
+    racun = create_racun(None, context=context)
+    zastitni = racun.ZastKod
+
+    racun.BrRac.BrOznRac = "3"
+    assert racun.ZastKod != zastitni
+    assert racun.ZastKod == expected_zastitni_kod(racun, context)
+    assert len(sign_calls) == 2
+
+    racun.IznosUkupno = "500.00"  # same value, ZastKod is not calculated again
+    assert racun.ZastKod == expected_zastitni_kod(racun, context)
+    assert len(sign_calls) == 2
+
+
+def test_zastitni_kod_without_key():
+    """Reading ZastKod of racun without key raises FiskInitError."""
+    racun = Racun({
+        "Oib": "12345678901",
+        "DatVrijeme": "26.10.2013T23:50:00",
+        "BrRac": BrRac({"BrOznRac": "2", "OznPosPr": "POS2", "OznNapUr": "1"}),
+        "IznosUkupno": "500.00"
+    }, key_password="secret")
+
+    with pytest.raises(FiskInitError):
+        racun.ZastKod
+    with pytest.raises(FiskInitError):
+        racun.generate()
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from fisk.request import EchoHealthCheck
+from fisk.response import FiskResponse
+
+from stub_server import create_reply
+
+
+class EchoClient(object):
+    """Client which replies to echo message or raises error."""
+
+    def __init__(self, error=None, delay=0):
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    def send_response(self, message, deadline=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return FiskResponse.parse(create_reply(message))
+
+
+def test_result_reused():
+    """Result is reused for cache_window seconds."""
+    client = EchoClient()
+    health_check = EchoHealthCheck(client, cache_window=60)
+    assert health_check.check() is True
+    assert health_check.check() is True
+    assert client.calls == 1
+    assert health_check.check(cache_window=0) is True
+    assert client.calls == 2
+
+
+def test_error():
+    """Server which can not be reached is unavailable."""
+    health_check = EchoHealthCheck(EchoClient(ConnectionError("refused")), cache_window=60)
+    assert health_check.check() is False
+    assert health_check.last_error == "refused"
+
+
+def test_interrupted_check_releases_waiting_callers():
+    """Check interrupted by BaseException does not block later and waiting callers."""
+    client = EchoClient(KeyboardInterrupt(), delay=0.2)
+    health_check = EchoHealthCheck(client, cache_window=60, timeout=5)
+    results = []
+    interrupted = threading.Thread(
+        target=lambda: pytest.raises(KeyboardInterrupt, health_check.check))
+    interrupted.start()
+    time.sleep(0.05)
+    waiting = threading.Thread(target=lambda: results.append(health_check.check()))
+    start = time.monotonic()
+    waiting.start()
+    interrupted.join()
+    waiting.join()
+
+    assert time.monotonic() - start < 1
+    assert results == [False]
+    assert health_check.in_flight is None
+    client.error = None
+    client.delay = 0
+    start = time.monotonic()
+    assert health_check.check() is True
+    assert time.monotonic() - start < 1
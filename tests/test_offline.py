@@ -0,0 +1,188 @@
+import socket
+import time
+
+import pytest
+
+from fisk.client import FiskSOAPClient
+from fisk.context import FiskContext
+from fisk.offline import OfflineJournal, OfflineJournalError, OfflineQueue
+
+from fixtures import create_racun
+from stub_server import StubCISServer
+
+
+def add_record(entry_id):
+    """Return (dict): journal record of new entry."""
+    return {"op": "add", "id": entry_id, "idPoruke": entry_id, "message": "<message/>"}
+
+
+def test_compact_keeps_results(tmp_path):
+    """Results of finished entries are known after compaction and reopening."""
+    path = str(tmp_path / "journal")
+    journal = OfflineJournal(path, sync_interval=0)
+    for entry_id in ("a", "b", "c"):
+        journal.append(add_record(entry_id))
+    journal.append({"op": "done", "id": "a", "jir": "jir-a"})
+    journal.append({"op": "failed", "id": "b", "errors": ["error"]})
+    size = (tmp_path / "journal").stat().st_size
+
+    journal.compact()
+    assert (tmp_path / "journal").stat().st_size < size
+    assert journal.get_result("a")["jir"] == "jir-a"
+    journal.close()
+
+    journal = OfflineJournal(path, sync_interval=0)
+    assert journal.get_result("a")["jir"] == "jir-a"
+    assert journal.get_result("b")["errors"] == ["error"]
+    assert journal.get_result("c") is None
+    assert [record["id"] for record in journal.pending()] == ["c"]
+    journal.close()
+
+
+def test_torn_last_record_removed(tmp_path):
+    """Record torn by crash is removed and records appended later are read."""
+    path = str(tmp_path / "journal")
+    journal = OfflineJournal(path, sync_interval=0)
+    journal.append(add_record("a"))
+    journal.append(add_record("b"))
+    journal.close()
+    size = (tmp_path / "journal").stat().st_size
+    with open(path, "ab") as f:
+        f.write(b'{"op":"add","id":"c","mess')
+
+    journal = OfflineJournal(path, sync_interval=0)
+    assert (tmp_path / "journal").stat().st_size == size
+    assert [record["id"] for record in journal.pending()] == ["a", "b"]
+    journal.append(add_record("d"))
+    journal.close()
+
+    journal = OfflineJournal(path, sync_interval=0)
+    assert [record["id"] for record in journal.pending()] == ["a", "b", "d"]
+    journal.close()
+
+
+def test_corrupted_record_raises(tmp_path):
+    """Complete record which can not be read is reported (with its offset)."""
+    path = str(tmp_path / "journal")
+    journal = OfflineJournal(path, sync_interval=0)
+    journal.append(add_record("a"))
+    journal.close()
+    offset = (tmp_path / "journal").stat().st_size
+    with open(path, "ab") as f:
+        f.write(b'{"op":"add","id":"b",garbage}\n')
+        f.write(b'{"op":"add","id":"c","message":"<message/>"}\n')
+
+    with pytest.raises(OfflineJournalError, match="offset {}".format(offset)):
+        OfflineJournal(path, sync_interval=0)
+
+
+def create_context(credentials, key_password, server):
+    """Return (FiskContext): context whose client sends requests to server."""
+    client = FiskSOAPClient(
+        "localhost", str(server.port), "/FiskalizacijaServiceTest",
+        verify=credentials["ca.pem"], circuit_breaker=False
+    )
+    return FiskContext(credentials["key.pem"], key_password, credentials["cert.pem"],
+                       client=client)
+
+
+@pytest.fixture(scope="module")
+def slow_server(credentials):
+    """Return (StubCISServer): stub CIS server which replies after 2 seconds."""
+    server = StubCISServer(credentials["server.pem"], credentials["server.key"], delay=2)
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_hung_send_is_retried(tmp_path, credentials, key_password, slow_server):
+    """Send which does not finish before timeout frees replay worker and is retried."""
+    context = create_context(credentials, key_password, slow_server)
+    queue = OfflineQueue(str(tmp_path / "journal"), context, workers=1, backoff=10,
+                         sync_interval=0, timeout=0.3)
+    entry_id = queue.enqueue(create_racun(None, context=context))
+    entry = queue.journal.pending()[0]
+
+    start = time.monotonic()
+    queue.send_entry(entry)
+
+    assert time.monotonic() - start < 1.5
+    assert queue.get_jir(entry_id) is None
+    assert queue.attempts[entry_id] == 1
+    assert queue.next_attempt[entry_id] > time.monotonic() + 5
+    assert not queue.in_flight
+    queue.stop()
+
+
+def test_in_flight_cleared_when_on_result_fails(tmp_path, credentials, key_password,
+                                                stub_server):
+    """Entry is not left in flight if on_result raises."""
+    def on_result(entry_id, jir, errors):
+        raise RuntimeError("callback failed")
+
+    context = create_context(credentials, key_password, stub_server)
+    queue = OfflineQueue(str(tmp_path / "journal"), context, on_result=on_result,
+                         sync_interval=0)
+    entry_id = queue.enqueue(create_racun(None, context=context))
+    entry = queue.journal.pending()[0]
+    queue.in_flight.add(entry_id)
+
+    with pytest.raises(RuntimeError):
+        queue.send_entry(entry)
+
+    assert not queue.in_flight
+    assert queue.get_jir(entry_id) == "11111111-2222-3333-4444-555555555555"
+    queue.stop()
+
+
+def test_pending_entries_replayed_after_restart(tmp_path, credentials, key_password,
+                                                stub_server):
+    """Entries not sent before queue was stopped are sent by queue opened from same journal."""
+    path = str(tmp_path / "journal")
+    context = create_context(credentials, key_password, stub_server)
+    queue = OfflineQueue(path, context, sync_interval=0)
+    entry_ids = [queue.enqueue(create_racun(None, context=context)) for i in range(3)]
+    queue.stop()
+
+    results = []
+    queue = OfflineQueue(path, context, sync_interval=0,
+                         on_result=lambda entry_id, jir, errors: results.append(entry_id))
+    assert queue.pending() == 3
+    queue.start()
+    end = time.monotonic() + 10
+    while queue.pending() and time.monotonic() < end:
+        time.sleep(0.05)
+    queue.stop()
+
+    assert sorted(results) == sorted(entry_ids)
+    for entry_id in entry_ids:
+        assert queue.get_jir(entry_id) == "11111111-2222-3333-4444-555555555555"
+    queue = OfflineQueue(path, context, sync_interval=0)
+    assert queue.pending() == 0
+    assert queue.get_jir(entry_ids[0]) == "11111111-2222-3333-4444-555555555555"
+    queue.stop()
+
+
+def test_backoff_schedule(tmp_path, credentials, key_password):
+    """Retry delay is doubled after every failed send up to max_backoff."""
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        port = s.getsockname()[1]
+    client = FiskSOAPClient("localhost", str(port), "/FiskalizacijaServiceTest",
+                            verify=credentials["ca.pem"], circuit_breaker=False)
+    context = FiskContext(credentials["key.pem"], key_password, credentials["cert.pem"],
+                          client=client)
+    queue = OfflineQueue(str(tmp_path / "journal"), context, backoff=1.0, max_backoff=5.0,
+                         sync_interval=0)
+    entry_id = queue.enqueue(create_racun(None, context=context))
+    entry = queue.journal.pending()[0]
+
+    delays = []
+    for i in range(5):
+        queue.send_entry(entry)
+        delays.append(queue.next_attempt[entry_id] - time.monotonic())
+
+    assert [round(delay) for delay in delays] == [1, 2, 4, 5, 5]
+    assert queue.attempts[entry_id] == 5
+    assert queue.get_jir(entry_id) is None
+    queue.stop()
@@ -0,0 +1,141 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+from lxml import etree as et
+from signxml import XMLVerifier
+
+from fisk import FiskSOAPMessage
+from fisk.context import FiskContext
+from fisk.elements import Adresa, AdresniPodatak, PoslovniProstor
+from fisk.request import PoslovniProstorZahtjev, ProvjeraZahtjev, RacunZahtjev
+from fisk.signer import Signer, TemplateSigner
+
+from fixtures import create_racun
+
+DS = "{http://www.w3.org/2000/09/xmldsig#}"
+
+
+@pytest.fixture(scope="module")
+def context(credentials, key_password):
+    """Return (FiskContext): context with generated key and certificate."""
+    return FiskContext(credentials["key.pem"], key_password, credentials["cert.pem"])
+
+
+@pytest.fixture(scope="module")
+def signers(credentials, key_password):
+    """Return (Signer, TemplateSigner): signers with same key and certificate."""
+    arguments = (credentials["key.pem"], key_password, credentials["cert.pem"])
+    return Signer(*arguments), TemplateSigner(*arguments)
+
+
+def create_poslovni_prostor():
+    """Return (PoslovniProstor): poslovni prostor used in PoslovniProstorZahtjev."""
+    adresa = Adresa(data={"Ulica": "Proba", "KucniBroj": "1", "BrojPoste": "54321"})
+    return PoslovniProstor(data={
+        "Oib": "12345678901",
+        "OznPoslProstora": "POS1",
+        "AdresniPodatak": AdresniPodatak(adresa),
+        "RadnoVrijeme": "PON-PET 9:00-17:00",
+        "DatumPocetkaPrimjene": (date.today() + timedelta(days=1)).strftime("%d.%m.%Y")
+    })
+
+
+def create_zahtjev(name, context):
+    """Return request of given class name."""
+    if name == "RacunZahtjev":
+        return RacunZahtjev(create_racun(None, 2, 1, 1, 1, context), context)
+    if name == "ProvjeraZahtjev":
+        return ProvjeraZahtjev(create_racun(None, context=context), context)
+    return PoslovniProstorZahtjev(create_poslovni_prostor(), context)
+
+
+def signature_values(message):
+    """Return (tuple): DigestValue and SignatureValue of signed message."""
+    root = et.fromstring(message)
+    return (
+        root.findtext(".//" + DS + "DigestValue"),
+        root.findtext(".//" + DS + "SignatureValue")
+    )
+
+
+def verify(message, credentials, name):
+    """Verify signed message with signxml (using signing certificate) and return signed element."""
+    with open(credentials["cert.pem"], "rb") as f:
+        certificate = f.read().decode("ascii")
+    result = XMLVerifier().verify(message, x509_cert=certificate, validate_schema=False)
+    assert et.QName(result.signed_xml).localname == name
+    return result.signed_xml
+
+
+@pytest.mark.parametrize(
+    "name", ["RacunZahtjev", "PoslovniProstorZahtjev", "ProvjeraZahtjev"])
+def test_template_signature(name, context, signers, credentials):
+    """Signature made by TemplateSigner is verified by signxml and is same as Signer one."""
+    signer, template_signer = signers
+    zahtjev = create_zahtjev(name, context)
+    message = FiskSOAPMessage.serialize(zahtjev)
+
+    signed = template_signer.signMessage(message, zahtjev.getElementName())
+    expected = signer.signMessage(message, zahtjev.getElementName())
+
+    # template path only inserts Signature element into original message bytes
+    start = signed.index(b"<ds:Signature")
+    end = signed.index(b"</ds:Signature>") + len(b"</ds:Signature>")
+    assert signed[:start] + signed[end:] == message
+    signed_element = verify(signed, credentials, name)
+    assert signed_element.get("Id") == next(et.fromstring(message).iter(
+        zahtjev.getElementName())).get("Id")
+    assert signature_values(signed) == signature_values(expected)
+    assert None not in signature_values(signed)
+
+
+def test_template_sign_xml(context, signers, credentials):
+    """Element tree is signed by TemplateSigner.signXML without being changed."""
+    signer, template_signer = signers
+    zahtjev = create_zahtjev("RacunZahtjev", context)
+    root = et.fromstring(FiskSOAPMessage.serialize(zahtjev))
+    before = et.tostring(root)
+
+    signed = template_signer.signXML(root, zahtjev.getElementName())
+
+    assert et.tostring(root) == before
+    verify(signed, credentials, "RacunZahtjev")
+    assert signature_values(signed) == signature_values(
+        signer.signXML(et.fromstring(before), zahtjev.getElementName()))
+
+
+def test_fallback_to_signer(context, signers, credentials):
+    """Message in which signed element is not last element is signed by Signer.signXML."""
+    signer, template_signer = signers
+    zahtjev = create_zahtjev("RacunZahtjev", context)
+    root = et.fromstring(FiskSOAPMessage.serialize(zahtjev))
+    element = next(root.iter(zahtjev.getElementName()))
+    element.addnext(et.Element("{http://www.apis-it.hr/fin/2012/types/f73}Dodatak"))
+    message = et.tostring(root)
+
+    assert TemplateSigner.insert_position(message, element) is None
+    signed = template_signer.signMessage(message, zahtjev.getElementName())
+
+    verify(signed, credentials, "RacunZahtjev")
+    assert signed == signer.signMessage(message, zahtjev.getElementName())
+
+
+@pytest.mark.parametrize("signer_class", [Signer, TemplateSigner])
+def test_copies_sign_concurrently(signer_class, context, credentials, key_password):
+    """Copies of signer used by many threads make same signatures as one signer serially."""
+    signer = signer_class(credentials["key.pem"], key_password, credentials["cert.pem"])
+    copies = [signer.copy() for i in range(4)]
+    assert len({id(copy.xml_signer) for copy in copies + [signer]}) == 5
+    assert all(copy.key is signer.key for copy in copies)
+    messages = []
+    for i in range(20):
+        zahtjev = create_zahtjev("RacunZahtjev", context)
+        messages.append((FiskSOAPMessage.serialize(zahtjev), zahtjev.getElementName()))
+    expected = [signer.signMessage(*message) for message in messages]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        signed = list(executor.map(
+            lambda index: copies[index % 4].signMessage(*messages[index]), range(20)))
+
+    assert signed == expected
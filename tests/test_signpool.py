@@ -0,0 +1,49 @@
+import pytest
+from lxml import etree as et
+
+from fisk import FiskSOAPMessage, signpool
+from fisk.context import FiskContext
+from fisk.request import RacunZahtjev
+from fisk.signer import Signer
+
+from fixtures import create_racun
+
+
+@pytest.fixture(scope="module")
+def context(credentials, key_password):
+    """Return (FiskContext): context with generated key and certificate."""
+    signpool.init_worker(credentials["key.pem"], key_password, credentials["cert.pem"])
+    return FiskContext(credentials["key.pem"], key_password, credentials["cert.pem"])
+
+
+def test_worker_sign(context):
+    """Message signed by worker is same as message signed by Signer."""
+    zahtjev = RacunZahtjev(create_racun(None, context=context), context)
+    message = FiskSOAPMessage.serialize(zahtjev)
+
+    assert signpool.worker_sign(message, zahtjev.getElementName()) == \
+        context.signer.signMessage(message, zahtjev.getElementName())
+
+
+def test_worker_does_not_expand_entities(context):
+    """Worker parses messages with hardened parser (entities are not expanded)."""
+    message = (
+        b'<!DOCTYPE Envelope [<!ENTITY e "expanded">]>'
+        b'<Envelope><Body><Zahtjev Id="z">&e;</Zahtjev></Body></Envelope>'
+    )
+    with pytest.raises(et.XMLSyntaxError):
+        signpool.worker_sign(message, "Zahtjev")
+
+
+def test_process_signer(context, credentials, key_password):
+    """Messages are signed by ProcessSigner in worker process."""
+    pool = signpool.ProcessSigner(
+        credentials["key.pem"], key_password, credentials["cert.pem"], processes=1)
+    try:
+        zahtjev = RacunZahtjev(create_racun(None, context=context), context)
+        message = FiskSOAPMessage.serialize(zahtjev)
+        signer = Signer(credentials["key.pem"], key_password, credentials["cert.pem"])
+        assert pool.signMessage(message, zahtjev.getElementName()) == \
+            signer.signMessage(message, zahtjev.getElementName())
+    finally:
+        pool.close()
@@ -0,0 +1,124 @@
+import os
+import shutil
+
+import pytest
+
+from fisk.utils import (
+    PrivateKey, PrivateKeyCache, load_private_key, zastitni_kod, zastitni_kod_many
+)
+
+
+@pytest.fixture
+def key_files(credentials, tmp_path):
+    """Return (list): paths of three copies of generated key.pem."""
+    paths = []
+    for i in range(3):
+        path = str(tmp_path / "key{}.pem".format(i))
+        shutil.copy(credentials["key.pem"], path)
+        paths.append(path)
+    return paths
+
+
+def test_key_cached(key_files, key_password):
+    """Key is loaded once and returned from cache later."""
+    cache = PrivateKeyCache()
+    key = cache.get(key_files[0], key_password)
+    assert isinstance(key, PrivateKey)
+    assert cache.get(key_files[0], key_password) is key
+    assert cache.get(os.path.relpath(key_files[0]), key_password) is key
+    assert len(cache.keys) == 1
+
+
+def test_key_reloaded_after_change(key_files, key_password):
+    """Key is loaded again if file modification time is changed."""
+    cache = PrivateKeyCache()
+    key = cache.get(key_files[0], key_password)
+    mtime = os.stat(key_files[0]).st_mtime_ns
+    os.utime(key_files[0], ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+
+    new_key = cache.get(key_files[0], key_password)
+    assert new_key is not key
+    assert new_key.mtime == mtime + 10 ** 9
+    assert len(cache.keys) == 1
+    assert cache.get(key_files[0], key_password) is new_key
+
+
+def test_key_cache_eviction(key_files, key_password):
+    """Least recently used key is removed when cache is full."""
+    cache = PrivateKeyCache(maxsize=2)
+    first = cache.get(key_files[0], key_password)
+    second = cache.get(key_files[1], key_password)
+    assert cache.get(key_files[0], key_password) is first
+
+    cache.get(key_files[2], key_password)
+    assert len(cache.keys) == 2
+    assert cache.get(key_files[0], key_password) is first
+    assert cache.get(key_files[1], key_password) is not second
+
+    cache.clear()
+    assert len(cache.keys) == 0
+
+
+def create_columns(count):
+    """Return (tuple): zastitni kod input columns of count racuni."""
+    return (
+        ["1234567890{}".format(i % 10) for i in range(count)],
+        ["26.10.2013T23:50:{:02d}".format(i % 60) for i in range(count)],
+        [str(i + 1) for i in range(count)],
+        ["POS{}".format(i % 3) for i in range(count)],
+        ["1"] * count,
+        ["{}.00".format(100 + i) for i in range(count)],
+    )
+
+
+def expected_values(columns, key):
+    """Return (list): zastitni kod values calculated one by one."""
+    return [zastitni_kod(*row, key) for row in zip(*columns)]
+
+
+def test_zastitni_kod_many(credentials, key_password):
+    """Values are same as values calculated by zastitni_kod (key given as path or PrivateKey)."""
+    columns = create_columns(10)
+    key = load_private_key(credentials["key.pem"], key_password)
+    expected = expected_values(columns, key)
+    assert zastitni_kod_many(*columns, credentials["key.pem"], key_password) == expected
+    assert zastitni_kod_many(*columns, key) == expected
+    assert zastitni_kod_many(*[[] for i in range(6)], key) == []
+
+
+def test_zastitni_kod_many_processes(credentials, key_password):
+    """Values calculated in worker processes are same and in input order."""
+    columns = create_columns(9)
+    key = load_private_key(credentials["key.pem"], key_password)
+    expected = expected_values(columns, key)
+    assert zastitni_kod_many(
+        *columns, credentials["key.pem"], key_password, processes=2, chunksize=2) == expected
+    assert zastitni_kod_many(*columns, key, processes=2, chunksize=4) == expected
+
+
+def test_zastitni_kod_many_column_length(credentials, key_password):
+    """Columns of different length are rejected."""
+    columns = list(create_columns(3))
+    columns[2] = columns[2][:2]
+    with pytest.raises(ValueError):
+        zastitni_kod_many(*columns, credentials["key.pem"], key_password)
+
+
+class WrappedKey(object):
+    """Key object (not PrivateKey) which signs with wrapped key."""
+
+    def __init__(self, key):
+        self.key = key
+
+    def sign(self, data):
+        return self.key.sign(data)
+
+
+def test_zastitni_kod_many_key_object(credentials, key_password):
+    """Other key objects are used serially and rejected by worker processes."""
+    columns = create_columns(3)
+    key = load_private_key(credentials["key.pem"], key_password)
+    wrapped = WrappedKey(key)
+    assert zastitni_kod_many(*columns, wrapped) == expected_values(columns, key)
+    with pytest.raises(TypeError, match="WrappedKey"):
+        zastitni_kod_many(*columns, wrapped, processes=2)
@@ -0,0 +1,91 @@
+import pytest
+
+from fisk.elements import BrRac, Racun
+from fisk.validation import SchemaValidator
+
+from fixtures import create_racun_columns, create_racun_rows
+
+
+@pytest.fixture(scope="module")
+def validator():
+    """Return (SchemaValidator): validator of Racun data."""
+    return SchemaValidator.for_class(Racun)
+
+
+def violations(errors):
+    """Return (set): (row, field, code) of every violation."""
+    return {(row, field, code) for row, field, code, message in errors}
+
+
+def test_valid_data(validator):
+    """Valid rows and columns have no violations."""
+    rows = create_racun_rows(5)
+    assert len(validator.validate_rows(rows)) == 0
+    assert len(validator.validate_columns(create_racun_columns(5))) == 0
+    assert SchemaValidator.for_class(Racun) is validator
+
+
+def test_all_row_violations_reported(validator):
+    """Every violation of every row is reported, also in nested elements and lists."""
+    rows = create_racun_rows(3)
+    rows[0]["Oib"] = "123"
+    rows[0]["Nepoznato"] = "x"
+    del rows[0]["IznosUkupno"]
+    rows[2]["BrRac"]["OznPosPr"] = "POS 1"
+    rows[2]["Pdv"] = [{"Stopa": "25.00", "Osnovica": "100.00", "Iznos": "25.00"},
+                      {"Stopa": "x", "Osnovica": "100.00"}]
+    rows[2]["NacinPlac"] = "Z"
+
+    errors = validator.validate_rows(rows)
+
+    assert violations(errors) == {
+        (0, "Oib", "invalid"),
+        (0, "Nepoznato", "unknown"),
+        (0, "IznosUkupno", "required"),
+        (2, "BrRac.OznPosPr", "invalid"),
+        (2, "Pdv[1].Stopa", "invalid"),
+        (2, "Pdv[1].Iznos", "required"),
+        (2, "NacinPlac", "invalid"),
+    }
+    assert errors.invalid_rows() == [0, 2]
+    assert {field for field, code, message in errors.by_row()[2]} == {
+        "BrRac.OznPosPr", "Pdv[1].Stopa", "Pdv[1].Iznos", "NacinPlac"}
+
+
+def test_element_values(validator):
+    """Nested elements can be given as already created elements."""
+    rows = create_racun_rows(2)
+    rows[0]["BrRac"] = BrRac({"BrOznRac": "2", "OznPosPr": "POS2", "OznNapUr": "1"})
+    rows[1]["BrRac"] = "2/POS2/1"
+    assert violations(validator.validate_rows(rows)) == {(1, "BrRac", "invalid")}
+
+
+def test_all_column_violations_reported(validator):
+    """Every violation in columns (also dotted nested columns) is reported."""
+    columns = create_racun_columns(4)
+    columns["Oib"][1] = "123"
+    columns["BrRac.BrOznRac"][2] = "x"
+    columns["BrRac.OznNapUr"][3] = None
+    columns["NakDost"][0] = None
+    columns["Nepoznato"] = ["x"] * 4
+    del columns["NacinPlac"]
+
+    errors = validator.validate_columns(columns)
+
+    assert violations(errors) == {
+        (1, "Oib", "invalid"),
+        (2, "BrRac.BrOznRac", "invalid"),
+        (3, "BrRac.OznNapUr", "required"),
+        (0, "NakDost", "required"),
+        (None, "Nepoznato", "unknown"),
+        (None, "NacinPlac", "required"),
+    }
+    assert errors.invalid_rows() == [0, 1, 2, 3]
+
+
+def test_column_length(validator):
+    """Columns of different length are rejected."""
+    columns = create_racun_columns(3)
+    columns["Oib"] = columns["Oib"][:2]
+    with pytest.raises(ValueError):
+        validator.validate_columns(columns)
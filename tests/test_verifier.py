@@ -0,0 +1,119 @@
+import time
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from lxml import etree as et
+from signxml.exceptions import InvalidCertificate
+from signxml.util import X509CertChainVerifier
+
+from fisk.response import FiskResponse
+from fisk.verifier import Verifier
+
+from stub_server import create_reply
+
+
+class Clock(object):
+    """Replacement of time module with wall clock moved by test."""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Return (Clock): clock used by chain validation cache."""
+    clock = Clock()
+    monkeypatch.setattr("fisk.verifier.time", clock)
+    return clock
+
+
+@pytest.fixture
+def chain_validations(monkeypatch):
+    """Return (list): certificate chains validated by signxml (not taken from cache)."""
+    validations = []
+    verify = X509CertChainVerifier.verify
+
+    def counted_verify(chain_verifier, cert_chain):
+        validations.append(cert_chain)
+        return verify(chain_verifier, cert_chain)
+
+    monkeypatch.setattr(X509CertChainVerifier, "verify", counted_verify)
+    return validations
+
+
+@pytest.fixture(scope="module")
+def signed_reply(credentials):
+    """Return (bytes): reply signed with CIS certificate (issued by generated CA)."""
+    with open(credentials["cis.key"], "rb") as f:
+        key = load_pem_private_key(f.read(), None)
+    with open(credentials["cis.pem"], "rb") as f:
+        certificate = x509.load_pem_x509_certificate(f.read())
+    return create_reply(b"<IdPoruke>verifier-test</IdPoruke>", (key, certificate))
+
+
+def create_verifier(credentials, cache_ttl=3600):
+    """Return (Verifier): verifier which trusts generated CA."""
+    Verifier.clear_trust_stores()
+    verifier = Verifier(cache_ttl=cache_ttl)
+    verifier.CAs = credentials["ca.pem"]
+    return verifier
+
+
+def verify(verifier, reply):
+    """Return (FiskResponse): verified part of reply."""
+    verified = verifier.verifiyXML(et.fromstring(reply))
+    assert verified is not None
+    return FiskResponse.fromElement(verified)
+
+
+def test_chain_validation_cached(credentials, signed_reply, clock, chain_validations):
+    """Validated chain is reused until cache_ttl passes."""
+    verifier = create_verifier(credentials, cache_ttl=60)
+    assert verify(verifier, signed_reply).id_poruke == "verifier-test"
+    assert verify(verifier, signed_reply).id_poruke == "verifier-test"
+    assert verify(verifier, signed_reply).jir == "11111111-2222-3333-4444-555555555555"
+    assert len(chain_validations) == 1
+
+    clock.now += 59
+    verify(verifier, signed_reply)
+    assert len(chain_validations) == 1
+    clock.now += 1
+    verify(verifier, signed_reply)
+    assert len(chain_validations) == 2
+    verify(verifier, signed_reply)
+    assert len(chain_validations) == 2
+
+
+def test_cache_shared_by_verifiers(credentials, signed_reply, chain_validations):
+    """Verifiers of same CA file share trust store and its cache."""
+    verifier = create_verifier(credentials)
+    verify(verifier, signed_reply)
+    other = Verifier()
+    other.CAs = credentials["ca.pem"]
+    verify(other, signed_reply)
+    assert other.get_trust_store() is verifier.get_trust_store()
+    assert len(chain_validations) == 1
+
+
+def test_cache_disabled(credentials, signed_reply, chain_validations):
+    """Chain is validated for every reply if cache_ttl is 0."""
+    verifier = create_verifier(credentials, cache_ttl=0)
+    verify(verifier, signed_reply)
+    verify(verifier, signed_reply)
+    assert len(chain_validations) == 2
+    assert verifier.get_trust_store().validated == {}
+
+
+def test_failure_not_cached(credentials, signed_reply, chain_validations):
+    """Chain which can not be validated is not cached and is rejected every time."""
+    Verifier.clear_trust_stores()
+    verifier = Verifier()  # demo CA file does not contain generated CA
+    for i in range(2):
+        with pytest.raises(InvalidCertificate):
+            verifier.verifiyXML(et.fromstring(signed_reply))
+    assert len(chain_validations) == 2
+    assert verifier.get_trust_store().validated == {}
@@ -0,0 +1,84 @@
+from datetime import date, timedelta
+
+import pytest
+from lxml import etree as et
+
+from fisk import FiskSOAPMessage
+from fisk.context import FiskContext
+from fisk.elements import Adresa, AdresniPodatak, PoslovniProstor, Zaglavlje
+from fisk.request import EchoRequest, PoslovniProstorZahtjev, ProvjeraZahtjev, RacunZahtjev
+from fisk.xml import XMLSerializer
+
+from fixtures import create_racun
+
+
+@pytest.fixture(scope="module")
+def context(credentials, key_password):
+    """Return (FiskContext): context with generated key and certificate."""
+    return FiskContext(credentials["key.pem"], key_password, credentials["cert.pem"])
+
+
+@pytest.fixture(autouse=True)
+def fixed_zaglavlje(monkeypatch):
+    """Keep same IdPoruke and DatumVrijeme (they are regenerated for every message)."""
+    def before_generate(zaglavlje):
+        zaglavlje.IdPoruke = "11111111-2222-3333-4444-555555555555"
+        zaglavlje.DatumVrijeme = "01.01.2020T10:00:00"
+
+    monkeypatch.setattr(Zaglavlje, "beforeGenerate", before_generate)
+
+
+def create_poslovni_prostor(ulica="Proba"):
+    """Return (PoslovniProstor): poslovni prostor with adresa in given street."""
+    adresa = Adresa(data={"Ulica": ulica, "KucniBroj": "1", "BrojPoste": "54321"})
+    return PoslovniProstor(data={
+        "Oib": "12345678901",
+        "OznPoslProstora": "POS1",
+        "AdresniPodatak": AdresniPodatak(adresa),
+        "RadnoVrijeme": "PON-PET 9:00-17:00",
+        "DatumPocetkaPrimjene": (date.today() + timedelta(days=1)).strftime("%d.%m.%Y")
+    })
+
+
+def create_requests(context):
+    """Return (list): requests of every type with non-ASCII and escaped text."""
+    racun = create_racun(None, 2, 2, 2, 2, context)
+    racun.Naknade[0].NazivN = "Povratna naknada čćžšđ ČĆŽŠĐ €"
+    racun.OstaliPor[1].Naziv = "Porez <na> potrošnju & \"ostalo\"\r"
+    provjera = create_racun(None, context=context)
+    return [
+        RacunZahtjev(racun, context),
+        ProvjeraZahtjev(provjera, context),
+        PoslovniProstorZahtjev(create_poslovni_prostor("Šetalište & <Ulica> 'Đ'"), context),
+        EchoRequest("Proba čćž & <echo>"),
+    ]
+
+
+def test_serialize_same_as_element_tree(context):
+    """Output of XMLSerializer is same as serialized ElementTree of every request type."""
+    for zahtjev in create_requests(context):
+        assert XMLSerializer.serialize(zahtjev) == et.tostring(zahtjev.generate())
+        assert FiskSOAPMessage.serialize(zahtjev) == et.tostring(
+            FiskSOAPMessage(zahtjev).getSOAPMessage())
+
+
+def test_serialize_elements_same_as_element_tree(context):
+    """Child elements serialized alone are same as serialized ElementTree."""
+    racun = create_racun(None, 1, 1, 1, 1, context)
+    for element in (racun, racun.BrRac, racun.Pdv[0], racun.Naknade[0],
+                    create_poslovni_prostor("Ulica čćž")):
+        assert XMLSerializer.serialize(element) == et.tostring(element.generate())
+
+
+def test_missing_required_value(context):
+    """Missing required value is reported by XMLSerializer same as by generate."""
+    poslovni_prostor = create_poslovni_prostor()
+    poslovni_prostor.RadnoVrijeme = None
+    zahtjev = PoslovniProstorZahtjev(poslovni_prostor, context)
+
+    with pytest.raises(ValueError) as expected:
+        zahtjev.generate()
+    with pytest.raises(ValueError) as raised:
+        FiskSOAPMessage.serialize(zahtjev)
+    assert "RadnoVrijeme" in str(expected.value)
+    assert str(raised.value) == str(expected.value)